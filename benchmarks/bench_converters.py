@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Measure the time spent on sparse annotations with and without converters.
+
+The vcf has a population frequency and an allele count where most values
+are missing, '.'. Without converters each missing value is converted with
+float or int and the ValueError is caught.
+
+    python benchmarks/bench_converters.py --variants 50000 --missing 0.9
+"""
+
+from __future__ import print_function
+
+import argparse
+from timeit import default_timer
+
+from extract_vcf import Plugin, Engine
+
+
+def get_plugins():
+    """Return a dictionary with a float and an integer plugin"""
+    return {
+        'AF': Plugin(
+            name='AF', field='INFO', info_key='AF', data_type='float',
+            separators=[','], record_rule='max'),
+        'AC': Plugin(
+            name='AC', field='INFO', info_key='AC', data_type='integer',
+            separators=[','], record_rule='max'),
+    }
+
+
+def get_vcf_lines(variants, missing):
+    """Return vcf lines where a fraction of the values are missing"""
+    lines = [
+        '##fileformat=VCFv4.1\n',
+        '##INFO=<ID=AF,Number=1,Type=Float,Description="Frequency">\n',
+        '##INFO=<ID=AC,Number=A,Type=Integer,Description="Allele count">\n',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    ]
+    present = int(1 / (1 - missing)) if missing < 1 else variants + 1
+    for i in range(variants):
+        if i % present == 0:
+            info = 'AF=0.{0};AC={1}'.format(i % 97, i % 13)
+        else:
+            info = 'AF=.;AC=.'
+        lines.append('1\t{0}\t.\tT\tC\t100\tPASS\t{1}\n'.format(1000 + i, info))
+    return lines
+
+
+def run(lines, converters):
+    """Return the seconds to extract the lines"""
+    engine = Engine(get_plugins())
+    if not converters:
+        def no_converters():
+            engine.converters = {}
+            engine.converter_info_size = len(engine.header.info_dict)
+        engine.build_converters = no_converters
+    start = default_timer()
+    for variant in engine.extract(lines):
+        pass
+    return default_timer() - start
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--variants', type=int, default=50000)
+    parser.add_argument('--missing', type=float, default=0.9,
+                        help="The fraction of missing values")
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args(args)
+
+    lines = get_vcf_lines(options.variants, options.missing)
+    for label, converters in [('try/except', False), ('converters', True)]:
+        elapsed = min(run(lines, converters) for i in range(options.repeat))
+        print("{0:<12} {1:>8.3f} s {2:>10.0f} variants/s".format(
+            label, elapsed, options.variants / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Measure the memory used by plugins, reducers and extracted variants.
+
+The memory is measured with tracemalloc. Variants are measured both as the
+(variant_dict, values) pairs from Engine.extract and as the tuple rows from
+Engine.extract_rows, and scaled to one million variants.
+
+    python benchmarks/bench_memory.py --plugins 10000 --variants 20000
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import tracemalloc
+
+from extract_vcf import Plugin, Engine
+from extract_vcf.reducers import get_reducer
+
+
+def get_plugins(suffix=''):
+    """Return a dictionary with a numeric, a csq and a string plugin"""
+    return {
+        '1000G' + suffix: Plugin(
+            name='1000G', field='INFO', info_key='1000G', data_type='float',
+            separators=[','], record_rule='max'),
+        'SIFT' + suffix: Plugin(
+            name='SIFT', field='INFO', info_key='CSQ', csq_key='SIFT',
+            data_type='float', separators=[','], record_rule='min'),
+        'Filter' + suffix: Plugin(
+            name='Filter', field='FILTER', data_type='string',
+            separators=[';'], record_rule='max',
+            string_rules={'PASS': 2, 'LowQual': 1}),
+    }
+
+
+def get_vcf_lines(variants):
+    """Return vcf lines with a number of variants"""
+    lines = [
+        '##fileformat=VCFv4.1\n',
+        '##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence type '
+        'as predicted by VEP. Format: Allele|Gene|Consequence|SIFT">\n',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    ]
+    for i in range(variants):
+        lines.append(
+            '1\t{0}\t.\tT\tC\t100\tPASS\tMQ=1;1000G=0.{1};'
+            'CSQ=C|ADK|missense|0.{2},C|ADK|intron|0.{3}\n'.format(
+                1000 + i, i % 97, i % 13, i % 7))
+    return lines
+
+
+def measure(make):
+    """
+    Return the bytes allocated by make and still in use
+
+    The result of make is kept alive while the memory is measured.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = make()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--plugins', type=int, default=10000)
+    parser.add_argument('--variants', type=int, default=20000)
+    options = parser.parse_args(args)
+
+    configs = options.plugins // 3
+    size = measure(lambda: [get_plugins(str(i)) for i in range(configs)])
+    print("{0:<24} {1:>10.0f} bytes".format(
+        "per plugin", size / float(configs * 3)))
+
+    size = measure(lambda: [get_reducer('max') for i in range(options.plugins)])
+    print("{0:<24} {1:>10.0f} bytes".format(
+        "per reducer", size / float(options.plugins)))
+
+    lines = get_vcf_lines(options.variants)
+    scale = 1000000.0 / options.variants
+    size = measure(lambda: list(Engine(get_plugins()).extract(lines)))
+    print("{0:<24} {1:>10.1f} MB per million variants".format(
+        "variant dicts", size * scale / 1e6))
+    size = measure(lambda: list(Engine(get_plugins()).extract_rows(lines)))
+    print("{0:<24} {1:>10.1f} MB per million variants".format(
+        "tuple rows", size * scale / 1e6))
+
+
+if __name__ == '__main__':
+    main()
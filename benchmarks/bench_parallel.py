@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Compare the thread pool and the process pool of extract_parallel.
+
+A vcf with CSQ annotations is generated and extracted in a single thread,
+with threads, with processes and with processes that write to shared
+memory (if numpy is installed). Threads only give a speedup on a
+free-threaded python (3.13t and later).
+
+    python benchmarks/bench_parallel.py --variants 50000 --workers 4
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import tempfile
+from timeit import default_timer
+
+from extract_vcf import Plugin, Engine
+from extract_vcf.parallel import extract_parallel, gil_enabled
+
+try:
+    from extract_vcf.shared_buffers import extract_shared, check_dependencies
+    check_dependencies()
+except ImportError:
+    extract_shared = None
+
+CSQ_FORMAT = ['Allele', 'Consequence', 'SIFT', 'PolyPhen', 'GMAF']
+
+
+def get_plugins():
+    """Return a dictionary with plugins"""
+    return {
+        '1000G': Plugin(name='1000G', field='INFO', info_key='1000G',
+                        data_type='float', separators=[','], record_rule='min'),
+        'MQ': Plugin(name='MQ', field='INFO', info_key='MQ',
+                     data_type='integer', separators=[','], record_rule='max'),
+        'GMAF': Plugin(name='GMAF', field='INFO', info_key='CSQ',
+                       csq_key='GMAF', data_type='float', separators=['&', ':'],
+                       record_rule='max'),
+        'Consequence': Plugin(name='Consequence', field='INFO', info_key='CSQ',
+                              csq_key='Consequence', data_type='string',
+                              separators=['&'], record_rule='max',
+                              string_rules={'missense_variant': 3,
+                                            'synonymous_variant': 2,
+                                            'intron_variant': 1}),
+        'Filter': Plugin(name='Filter', field='FILTER', data_type='string',
+                         separators=[';'], record_rule='max',
+                         string_rules={'PASS': 2, 'LowQual': 1}),
+    }
+
+
+def write_vcf(path, variants, transcripts=5):
+    """Write a vcf with CSQ annotations"""
+    consequences = ['missense_variant', 'synonymous_variant', 'intron_variant']
+    with open(path, 'w') as vcf_file:
+        vcf_file.write('##fileformat=VCFv4.1\n')
+        vcf_file.write('##INFO=<ID=CSQ,Number=.,Type=String,Description="'
+                       'Consequence annotations from Ensembl VEP. '
+                       'Format: {0}">\n'.format('|'.join(CSQ_FORMAT)))
+        vcf_file.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n')
+        for i in range(variants):
+            csq = ','.join(
+                'C|{0}|tolerated(0.{1})|benign(0.{1})|C:0.{2}'.format(
+                    consequences[(i + j) % 3], j, (i + j) % 100)
+                for j in range(transcripts))
+            vcf_file.write(
+                '1\t{0}\t.\tT\tC\t100\tPASS\tMQ={1};1000G=0.{2},0.{3};'
+                'CSQ={4}\n'.format(1000 + i, i % 60, i % 97, i % 89, csq))
+
+
+def run(name, function, count=None):
+    """Run a function and print the time"""
+    start = default_timer()
+    if count is None:
+        count = lambda variant: 1
+    variants = sum(count(variant) for variant in function())
+    elapsed = default_timer() - start
+    print("{0:<10} {1:>8} variants {2:>8.2f} s {3:>10.0f} variants/s".format(
+        name, variants, elapsed, variants / elapsed))
+    return elapsed
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--variants', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    options = parser.parse_args(args)
+
+    print("python {0}, GIL {1}".format(
+        sys.version.split()[0], 'enabled' if gil_enabled() else 'disabled'))
+
+    plugins = get_plugins()
+    handle, path = tempfile.mkstemp(suffix='.vcf')
+    os.close(handle)
+    try:
+        write_vcf(path, options.variants)
+
+        def single():
+            with open(path) as vcf_file:
+                for variant in Engine(plugins).extract_rows(vcf_file):
+                    yield variant
+
+        def pool(mode):
+            return lambda: extract_parallel(
+                path, plugins, workers=options.workers, mode=mode,
+                chunk_size=options.chunk_size)
+
+        baseline = run('single', single)
+        runs = [(mode, pool(mode), None) for mode in ['thread', 'process']]
+        if extract_shared is not None:
+            runs.append(('shared', lambda: extract_shared(
+                path, plugins, workers=options.workers,
+                chunk_size=options.chunk_size), lambda chunk: chunk.size))
+        for name, function, count in runs:
+            elapsed = run(name, function, count)
+            print("{0:<10} speedup {1:.2f}x with {2} workers".format(
+                '', baseline / elapsed, options.workers))
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Measure ExtractionPlan.run_chunk with and without vectorized plugins.
+
+The vcf has per allele frequencies and counts in INFO and a per transcript
+score in CSQ, with some missing values. The min and max plugins on them are
+reduced with numpy when the plan is vectorized.
+
+    python benchmarks/bench_vectorized.py --variants 10000 --values 6
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+from timeit import default_timer
+
+from extract_vcf import Plugin
+from extract_vcf.plan import ExtractionPlan
+
+VCF_HEADER = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+CSQ_FORMAT = ['Allele', 'Gene', 'SIFT']
+
+
+def get_plugins():
+    """Return a dictionary with a float, an integer and a csq plugin"""
+    return {
+        'AF': Plugin(
+            name='AF', field='INFO', info_key='AF', data_type='float',
+            separators=[','], record_rule='max'),
+        'AC': Plugin(
+            name='AC', field='INFO', info_key='AC', data_type='integer',
+            separators=[','], record_rule='min'),
+        'SIFT': Plugin(
+            name='SIFT', field='INFO', info_key='CSQ', csq_key='SIFT',
+            data_type='float', separators=[','], record_rule='min'),
+    }
+
+
+def get_vcf_lines(variants, values):
+    """Return vcf variant lines with a number of values per annotation"""
+    random.seed(variants)
+    lines = []
+    for i in range(variants):
+        frequencies = ','.join(
+            random.choice(['.', '0.{0}'.format(random.randint(0, 999))])
+            for j in range(values))
+        counts = ','.join(str(random.randint(0, 50)) for j in range(values))
+        csq = ','.join('C|ADK|0.{0}'.format(random.randint(0, 99))
+                       for j in range(values))
+        lines.append('1\t{0}\t.\tT\tC\t100\tPASS\tAF={1};AC={2};CSQ={3}\n'.format(
+            1000 + i, frequencies, counts, csq))
+    return lines
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--variants', type=int, default=10000)
+    parser.add_argument('--values', type=int, default=6,
+                        help="Number of values in each annotation")
+    parser.add_argument('--repeat', type=int, default=3)
+    options = parser.parse_args(args)
+
+    lines = get_vcf_lines(options.variants, options.values)
+    columns = {}
+    for label, vectorize in [('per value', False), ('vectorized', True)]:
+        plan = ExtractionPlan(get_plugins(), vcf_header=VCF_HEADER,
+                              csq_format=CSQ_FORMAT, vectorize=vectorize)
+        times = []
+        for i in range(options.repeat):
+            start = default_timer()
+            columns[vectorize] = plan.run_chunk(lines)
+            times.append(default_timer() - start)
+        elapsed = min(times)
+        print("{0:<12} {1:>8.3f} s {2:>10.0f} variants/s".format(
+            label, elapsed, options.variants / elapsed))
+    if columns[False] != columns[True]:
+        print("The vectorized values differ")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,28 @@
 from __future__ import absolute_import
 
 import logging
+import sys
 logger = logging.getLogger(__name__)
 
 from .get_annotations import *
 
 from .plugin import Plugin
 from .config_parser import ConfigParser
+from .header_parser import HeaderParser
+from .filters import Predicate, parse_filter
+from .engine import Engine
+from .arrow_writer import ArrowWriter
+from .column_store import ColumnStoreWriter, ColumnStore, update_column_store
+from .fingerprint import diff_plugins
+from .cache import ExtractionCache
+from .reloadable_config import ReloadableConfig
+if sys.version_info >= (3, 6):
+    # Async generators are a syntax error in older pythons
+    from .async_extract import aextract
+from .pipeline import Pipeline
+from .plan import ExtractionPlan
+from .parallel import extract_parallel
+from .shards import ShardedExtractor
+from .checkpoint import CheckpointedExtractor
+from .follow import VcfFollower
 from .log import init_log
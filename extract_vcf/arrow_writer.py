@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+arrow_writer.py
+
+Write the values that the plugins extract to an Apache Arrow IPC file or a
+Parquet file, one column per plugin together with CHROM and POS.
+
+The rows are collected in record batches of batch_size variants, each
+batch is written when it is full, so the memory use is bounded by the batch
+size and not by the size of the vcf.
+
+    configs = ConfigParser("config.ini")
+    engine = Engine(configs.plugins)
+    with ArrowWriter("values.parquet", configs.plugins) as writer:
+        writer.write_variants(engine.extract(vcf_file))
+
+This module requires pyarrow, install with 'pip install extract_vcf[arrow]'.
+"""
+
+from __future__ import print_function
+
+import logging
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+def convert_value(value, data_type):
+    """
+    Convert a plugin value to the type of its column
+
+    Plugins without record rule can return the raw entry, values that can
+    not be converted are stored as missing.
+
+    Arguments:
+        value: A value returned by a plugin
+        data_type (str): The data type of the plugin
+
+    Returns:
+        The converted value or None
+    """
+    if value is None:
+        return None
+    try:
+        if data_type == 'float':
+            return float(value)
+        if data_type == 'integer':
+            return int(value)
+    except (TypeError, ValueError):
+        return None
+    if data_type == 'flag':
+        return bool(value)
+    return str(value)
+
+
+def get_arrow_type(plugin):
+    """
+    Return the arrow type of the column for a plugin
+
+    Plugins with string rules only returns one of the strings in the rules,
+    these are dictionary encoded.
+
+    Arguments:
+        plugin (Plugin): A plugin
+
+    Returns:
+        arrow_type (pyarrow.DataType)
+    """
+    if plugin.data_type == 'float':
+        return pyarrow.float64()
+    if plugin.data_type == 'integer':
+        return pyarrow.int64()
+    if plugin.data_type == 'flag':
+        return pyarrow.bool_()
+    if plugin.data_type == 'string' and plugin.string_rules:
+        return pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.string()
+
+
+def get_schema(plugins, plugin_names=None):
+    """
+    Return the arrow schema for a set of plugins
+
+    The data type and category of each plugin is stored as field metadata.
+
+    Arguments:
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        plugin_names (list): The order of the plugin columns
+
+    Returns:
+        schema (pyarrow.Schema)
+    """
+    if plugin_names is None:
+        plugin_names = list(plugins.keys())
+
+    fields = [
+        pyarrow.field('CHROM', pyarrow.string()),
+        pyarrow.field('POS', pyarrow.int64()),
+    ]
+    for name in plugin_names:
+        plugin = plugins[name]
+        metadata = {'data_type': str(plugin.data_type)}
+        if plugin.category:
+            metadata['category'] = str(plugin.category)
+        fields.append(pyarrow.field(
+            name, get_arrow_type(plugin), metadata=metadata))
+
+    return pyarrow.schema(fields)
+
+
+class ArrowWriter(object):
+    """Class for writing plugin values to Arrow IPC or Parquet files"""
+    def __init__(self, path, plugins, plugin_names=None, file_format='parquet',
+                 batch_size=10000):
+        """
+        Arguments:
+            path (str): The output file
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            plugin_names (list): The order of the plugin columns
+            file_format (str): 'parquet' or 'arrow'
+            batch_size (int): Number of variants in each record batch
+        """
+        super(ArrowWriter, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        if pyarrow is None:
+            raise ImportError(
+                "pyarrow is needed to write arrow files, "
+                "install with 'pip install extract_vcf[arrow]'")
+        if file_format not in ['parquet', 'arrow']:
+            raise ValueError("file_format has to be 'parquet' or 'arrow'")
+
+        self.path = path
+        self.plugins = plugins
+        self.plugin_names = plugin_names or list(plugins.keys())
+        self.data_types = [
+            self.plugins[name].data_type for name in self.plugin_names]
+        self.file_format = file_format
+        self.batch_size = batch_size
+        self.schema = get_schema(self.plugins, self.plugin_names)
+
+        if file_format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.sink = pyarrow.OSFile(path, 'wb')
+            self.writer = pyarrow.ipc.new_file(self.sink, self.schema)
+
+        # String rule columns use the same dictionary for all batches, the
+        # column holds the index of the string in the dictionary
+        self.dictionaries = {}
+        self.dictionary_indexes = {}
+        for i, name in enumerate(self.plugin_names):
+            if pyarrow.types.is_dictionary(self.schema.field(i + 2).type):
+                strings = sorted(self.plugins[name].string_rules)
+                self.dictionaries[i] = pyarrow.array(strings, type=pyarrow.string())
+                self.dictionary_indexes[i] = {
+                    string: index for index, string in enumerate(strings)}
+
+        self.columns = [[] for field in self.schema]
+        self.rows = 0
+        self.batches = 0
+
+    def write(self, variant_dict, values):
+        """
+        Add the values of one variant
+
+        Arguments:
+            variant_dict (dict): A variant dictionary
+            values (dict): A dictionary with plugin names as keys and the
+                           plugin values as values
+        """
+        self.columns[0].append(variant_dict['CHROM'])
+        self.columns[1].append(int(variant_dict['POS']))
+        for i, name in enumerate(self.plugin_names):
+            value = convert_value(values.get(name), self.data_types[i])
+            if i in self.dictionary_indexes:
+                value = self.dictionary_indexes[i].get(value)
+            self.columns[i + 2].append(value)
+
+        self.rows += 1
+        if len(self.columns[0]) >= self.batch_size:
+            self.flush()
+
+    def write_variants(self, variants):
+        """
+        Add all variants from an iterable, like Engine.extract
+
+        Arguments:
+            variants (iterable): An iterable with (variant_dict, values)
+        """
+        for variant_dict, values in variants:
+            self.write(variant_dict, values)
+
+    def flush(self):
+        """Write the collected values as one record batch"""
+        if not self.columns[0]:
+            return
+        arrays = []
+        for i, field in enumerate(self.schema):
+            if i - 2 in self.dictionaries:
+                arrays.append(pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(self.columns[i], type=pyarrow.int32()),
+                    self.dictionaries[i - 2]
+                ))
+            else:
+                arrays.append(pyarrow.array(self.columns[i], type=field.type))
+        batch = pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema)
+        self.writer.write_batch(batch)
+        self.batches += 1
+        self.columns = [[] for field in self.schema]
+
+    def close(self):
+        """Write the last batch and close the file"""
+        self.flush()
+        self.writer.close()
+        if self.file_format == 'arrow':
+            self.sink.close()
+        self.logger.info("Wrote {0} variants in {1} batches to {2}".format(
+            self.rows, self.batches, self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
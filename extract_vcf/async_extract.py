@@ -0,0 +1,151 @@
+"""
+An asyncio interface for running plugins on a vcf.
+
+The vcf is read and decompressed in a thread, the variant lines are
+collected in chunks and each chunk is extracted in an executor. The results
+are yielded as batches, one batch per chunk, in the order of the vcf:
+
+    async for batch in aextract("file.vcf.gz", configs.plugins):
+        for variant_dict, values in batch:
+            print(values)
+
+At most max_pending chunks are read ahead of the consumer, so a slow
+consumer stops the reading instead of filling the memory. Since nothing
+blocks the event loop, several files can be extracted at the same time on
+one loop.
+"""
+
+import asyncio
+import itertools
+import logging
+
+from extract_vcf.engine import Engine
+from extract_vcf.header_parser import HeaderParser
+from extract_vcf.reader import open_vcf
+
+logger = logging.getLogger(__name__)
+
+
+def extract_chunk(plugins, vcf_header, csq_format, lines, filters=None,
+                  dict_key=None, individual_id=None, info_dict=None):
+    """
+    Run plugins on a chunk of variant lines
+
+    This is a module level function so that it can be sent to a process pool.
+
+    Arguments:
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        vcf_header (list): The vcf header line
+        csq_format (list): The CSQ format
+        lines (list): Vcf variant lines
+        filters (str or list): A filter expression, see Engine
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+        info_dict (dict): The INFO declarations of the vcf header, as in
+                          HeaderParser.info_dict
+
+    Returns:
+        batch (list): A list of (variant_dict, values) for the variants that
+                      pass the filter
+    """
+    header = HeaderParser()
+    header.header = vcf_header
+    header.csq_format = csq_format
+    header.info_dict = dict(info_dict or {})
+    engine = Engine(plugins, filters=filters, header=header)
+    return list(engine.extract(
+        lines, dict_key=dict_key, individual_id=individual_id))
+
+
+def read_chunk(vcf_handle, header, chunk_size):
+    """
+    Read the next chunk of lines, header lines are parsed
+
+    Arguments:
+        vcf_handle (iterable): An iterator over vcf lines
+        header (HeaderParser): Collects the header lines
+        chunk_size (int): Number of lines to read
+
+    Returns:
+        (lines, finished): The variant lines of the chunk and if the end of
+                           the file was reached
+    """
+    lines = []
+    read_lines = 0
+    for line in itertools.islice(vcf_handle, chunk_size):
+        read_lines += 1
+        if line.startswith('#'):
+            header.parse_line(line)
+        elif line.strip():
+            lines.append(line)
+    return lines, read_lines < chunk_size
+
+
+async def aextract(source, plugins, filters=None, chunk_size=1000,
+                   max_pending=2, executor=None, dict_key=None,
+                   individual_id=None):
+    """
+    Yield batches of extracted values from a vcf
+
+    Arguments:
+        source (str or iterable): Path to a vcf or an iterable with vcf lines
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        filters (str or list): A filter expression, see Engine
+        chunk_size (int): Number of vcf lines in each chunk
+        max_pending (int): Number of chunks that can be read ahead
+        executor (concurrent.futures.Executor): Where the chunks are
+                        extracted, the default executor of the loop if None
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+
+    Yields:
+        batch (list): A list of (variant_dict, values)
+    """
+    loop = asyncio.get_running_loop()
+    if isinstance(source, str):
+        vcf_handle = await loop.run_in_executor(None, open_vcf, source)
+    else:
+        vcf_handle = iter(source)
+
+    header = HeaderParser()
+    pending = asyncio.Queue(maxsize=max_pending)
+    end = object()
+    # The read that is running in the executor, a thread can not be
+    # cancelled so it is awaited before the handle is closed
+    reading = [None]
+
+    async def produce():
+        try:
+            finished = False
+            while not finished:
+                reading[0] = loop.run_in_executor(
+                    None, read_chunk, vcf_handle, header, chunk_size)
+                lines, finished = await asyncio.shield(reading[0])
+                if not lines:
+                    continue
+                future = loop.run_in_executor(
+                    executor, extract_chunk, plugins, list(header.header),
+                    list(header.csq_format), lines, filters, dict_key,
+                    individual_id, dict(header.info_dict))
+                await pending.put(future)
+        except Exception as error:
+            await pending.put(error)
+        await pending.put(end)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            item = await pending.get()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield await item
+    finally:
+        producer.cancel()
+        if reading[0] is not None and not reading[0].done():
+            await asyncio.wait([reading[0]])
+        if hasattr(vcf_handle, 'close'):
+            vcf_handle.close()
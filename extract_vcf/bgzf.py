@@ -0,0 +1,203 @@
+"""
+Read and write BGZF, the blocked gzip format of bgzip and tabix.
+
+A BGZF file is a series of gzip members of at most 64 kb each. A position
+in the file is a virtual offset, the offset of a block in the compressed
+file shifted 16 bits to the left plus the offset in the uncompressed block.
+A virtual offset can be used to seek straight to a line without
+decompressing what comes before it.
+"""
+
+import struct
+import zlib
+
+BGZF_MAGIC = b'\x1f\x8b\x08\x04'
+# Uncompressed bytes in a block, the same as bgzip
+BLOCK_SIZE = 0xff00
+# The empty block that ends a BGZF file
+EOF_BLOCK = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43'
+             b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+
+def is_bgzf(path):
+    """Return True if a file starts with a BGZF block"""
+    with open(path, 'rb') as handle:
+        header = handle.read(18)
+    return (len(header) == 18 and header[:4] == BGZF_MAGIC and
+            header[12:14] == b'BC')
+
+
+class BgzfReader(object):
+    """Class for reading lines from a BGZF file with virtual offsets"""
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str): Path to a BGZF file
+        """
+        super(BgzfReader, self).__init__()
+        self.handle = open(path, 'rb')
+        self.block_start = 0
+        self.next_block_start = 0
+        self.block = b''
+        self.within = 0
+        self.load_block(0)
+
+    def load_block(self, start):
+        """
+        Read and decompress the block that starts at an offset
+
+        Arguments:
+            start (int): The offset of the block in the compressed file
+
+        Returns:
+            bool: False if there is no complete block at the offset
+        """
+        self.handle.seek(start)
+        header = self.handle.read(12)
+        if len(header) < 12:
+            self.block_start = start
+            self.next_block_start = start
+            self.block = b''
+            self.within = 0
+            return False
+        if header[:4] != BGZF_MAGIC:
+            raise IOError("Not a BGZF block at offset {0}".format(start))
+        extra_length = struct.unpack('<H', header[10:12])[0]
+        extra = self.handle.read(extra_length)
+
+        block_size = None
+        i = 0
+        while i + 4 <= len(extra):
+            field_length = struct.unpack('<H', extra[i + 2:i + 4])[0]
+            if extra[i:i + 2] == b'BC' and field_length == 2:
+                block_size = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+            i += 4 + field_length
+        if block_size is None:
+            raise IOError("Missing BGZF block size at offset {0}".format(start))
+
+        data = self.handle.read(block_size - 12 - extra_length)
+        if len(data) < block_size - 12 - extra_length:
+            # A block that is still being written
+            self.block_start = start
+            self.next_block_start = start
+            self.block = b''
+            self.within = 0
+            return False
+
+        self.block = zlib.decompress(data[:-8], -15)
+        self.block_start = start
+        self.next_block_start = start + block_size
+        self.within = 0
+        return True
+
+    def tell(self):
+        """Return the virtual offset of the next byte"""
+        return (self.block_start << 16) | self.within
+
+    def seek(self, virtual_offset):
+        """
+        Move to a virtual offset from tell
+
+        Arguments:
+            virtual_offset (int)
+        """
+        self.load_block(virtual_offset >> 16)
+        self.within = virtual_offset & 0xffff
+
+    def readline(self):
+        """
+        Read the next line
+
+        Returns:
+            line (bytes): The line with its newline. At the end of the file
+                          the last part of a line without newline is
+                          returned, and then b''
+        """
+        parts = []
+        while True:
+            if self.within >= len(self.block):
+                if not self.load_block(self.next_block_start):
+                    break
+                continue
+            end = self.block.find(b'\n', self.within)
+            if end >= 0:
+                parts.append(self.block[self.within:end + 1])
+                self.within = end + 1
+                break
+            parts.append(self.block[self.within:])
+            self.within = len(self.block)
+        return b''.join(parts)
+
+    def close(self):
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def compress_block(data):
+    """
+    Return the BGZF block of up to BLOCK_SIZE bytes of data
+
+    Arguments:
+        data (bytes)
+
+    Returns:
+        block (bytes)
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    block_size = len(compressed) + 25
+    return (BGZF_MAGIC + b'\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00' +
+            struct.pack('<H', block_size) + compressed +
+            struct.pack('<I', zlib.crc32(data) & 0xffffffff) +
+            struct.pack('<I', len(data)))
+
+
+class BgzfWriter(object):
+    """Class for writing a BGZF file"""
+    def __init__(self, path, mode='wb'):
+        """
+        Arguments:
+            path (str): Path to the file
+            mode (str): 'wb' to write a new file or 'ab' to add blocks to
+                        the end of a file without an end block
+        """
+        super(BgzfWriter, self).__init__()
+        self.handle = open(path, mode)
+        self.buffer = b''
+
+    def write(self, data):
+        """Add bytes, full blocks are written"""
+        self.buffer += data
+        while len(self.buffer) >= BLOCK_SIZE:
+            self.handle.write(compress_block(self.buffer[:BLOCK_SIZE]))
+            self.buffer = self.buffer[BLOCK_SIZE:]
+
+    def flush(self):
+        """Write the buffered bytes as a block"""
+        if self.buffer:
+            self.handle.write(compress_block(self.buffer))
+            self.buffer = b''
+        self.handle.flush()
+
+    def close(self, end=True):
+        """
+        Write the buffered bytes and close the file
+
+        Arguments:
+            end (bool): If the end block should be written
+        """
+        self.flush()
+        if end:
+            self.handle.write(EOF_BLOCK)
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
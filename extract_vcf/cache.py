@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+cache.py
+
+A local cache for extracted values, stored in a SQLite database in a cache
+directory.
+
+The values are stored as one column per plugin, keyed by the fingerprint of
+the content of the vcf and the fingerprint of the plugin definition. When
+the same plugins are run on the same vcf the stored columns are returned
+instead of extracting the values again. If one plugin is added or changed
+only the column for that plugin is extracted.
+
+    cache = ExtractionCache("~/.cache/extract_vcf")
+    for variant, values in cache.extract("file.vcf.gz", configs.plugins):
+        print(variant['CHROM'], variant['POS'], values)
+"""
+
+from __future__ import print_function
+
+import json
+import logging
+import os
+import sqlite3
+
+from extract_vcf.engine import Engine
+from extract_vcf.fingerprint import get_file_fingerprint, get_plugin_fingerprint
+from extract_vcf.reader import open_vcf
+
+CACHE_FILE = 'extract_vcf_cache.sqlite'
+
+
+class ExtractionCache(object):
+    """Class for storing extracted plugin values between runs"""
+    def __init__(self, cache_dir):
+        """
+        Arguments:
+            cache_dir (str): The directory of the cache
+        """
+        super(ExtractionCache, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        cache_dir = os.path.expanduser(cache_dir)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        self.path = os.path.join(cache_dir, CACHE_FILE)
+
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS variants ("
+            "vcf TEXT PRIMARY KEY, chroms TEXT, positions TEXT)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS columns ("
+            "vcf TEXT, plugin TEXT, plugin_name TEXT, vals TEXT, "
+            "PRIMARY KEY (vcf, plugin))")
+        self.connection.commit()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get_variants(self, vcf_fingerprint):
+        """
+        Return the stored CHROM and POS of the variants in a vcf
+
+        Arguments:
+            vcf_fingerprint (str): The fingerprint of the vcf
+
+        Returns:
+            (chroms, positions) or None if the vcf is not stored
+        """
+        row = self.connection.execute(
+            "SELECT chroms, positions FROM variants WHERE vcf = ?",
+            (vcf_fingerprint,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def get_column(self, vcf_fingerprint, plugin_fingerprint):
+        """
+        Return the stored values of a plugin for a vcf
+
+        Arguments:
+            vcf_fingerprint (str): The fingerprint of the vcf
+            plugin_fingerprint (str): The fingerprint of the plugin
+
+        Returns:
+            values (list) or None if the column is not stored
+        """
+        row = self.connection.execute(
+            "SELECT vals FROM columns WHERE vcf = ? AND plugin = ?",
+            (vcf_fingerprint, plugin_fingerprint)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def store(self, vcf_fingerprint, chroms, positions, columns, fingerprints):
+        """
+        Store extracted columns
+
+        Arguments:
+            vcf_fingerprint (str): The fingerprint of the vcf
+            chroms (list): The CHROM of each variant
+            positions (list): The POS of each variant
+            columns (dict): Plugin names as keys and lists of values as values
+            fingerprints (dict): Plugin names as keys and fingerprints as values
+        """
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO variants VALUES (?, ?, ?)",
+                (vcf_fingerprint, json.dumps(chroms), json.dumps(positions)))
+            for name in columns:
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO columns VALUES (?, ?, ?, ?)",
+                    (vcf_fingerprint, fingerprints[name], name,
+                     json.dumps(columns[name])))
+
+    def get_columns(self, vcf_path, plugins, dict_key=None, individual_id=None):
+        """
+        Return the values of all plugins for all variants in a vcf
+
+        Columns that are not in the cache are extracted and stored.
+
+        Arguments:
+            vcf_path (str): Path to a vcf file
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Returns:
+            (chroms, positions, columns): columns is a dictionary with plugin
+                                          names as keys and lists of values
+        """
+        vcf_fingerprint = get_file_fingerprint(vcf_path)
+        fingerprints = {
+            name: get_plugin_fingerprint(
+                plugins[name], dict_key=dict_key, individual_id=individual_id)
+            for name in plugins
+        }
+
+        columns = {}
+        missing_plugins = {}
+        for name in plugins:
+            column = self.get_column(vcf_fingerprint, fingerprints[name])
+            if column is None:
+                missing_plugins[name] = plugins[name]
+            else:
+                columns[name] = column
+
+        variants = self.get_variants(vcf_fingerprint)
+        self.hits += len(columns)
+        self.misses += len(missing_plugins)
+
+        if missing_plugins or variants is None:
+            self.logger.info("Extracting {0} plugins from {1}: {2}".format(
+                len(missing_plugins), vcf_path, ', '.join(missing_plugins)))
+            chroms, positions, new_columns = self.extract_columns(
+                vcf_path, missing_plugins, dict_key, individual_id)
+            self.store(
+                vcf_fingerprint, chroms, positions, new_columns, fingerprints)
+            columns.update(new_columns)
+        else:
+            self.logger.info("All plugins for {0} found in cache".format(
+                vcf_path))
+            chroms, positions = variants
+
+        return chroms, positions, columns
+
+    def extract_columns(self, vcf_path, plugins, dict_key=None,
+                        individual_id=None):
+        """
+        Extract the values of plugins from a vcf as columns
+
+        Arguments:
+            vcf_path (str): Path to a vcf file
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Returns:
+            (chroms, positions, columns)
+        """
+        chroms = []
+        positions = []
+        columns = {name: [] for name in plugins}
+        engine = Engine(plugins)
+        with open_vcf(vcf_path) as vcf_handle:
+            for variant_dict, values in engine.extract(
+                    vcf_handle, dict_key=dict_key, individual_id=individual_id):
+                chroms.append(variant_dict['CHROM'])
+                positions.append(int(variant_dict['POS']))
+                for name in columns:
+                    columns[name].append(values[name])
+
+        return chroms, positions, columns
+
+    def extract(self, vcf_path, plugins, dict_key=None, individual_id=None):
+        """
+        Yield the values of all plugins for all variants in a vcf
+
+        Takes the same arguments as get_columns.
+
+        Yields:
+            (variant, values): variant is a dictionary with CHROM and POS
+        """
+        chroms, positions, columns = self.get_columns(
+            vcf_path, plugins, dict_key, individual_id)
+        for i in range(len(positions)):
+            variant = {'CHROM': chroms[i], 'POS': positions[i]}
+            yield variant, {name: columns[name][i] for name in plugins}
+
+    def close(self):
+        """Close the database"""
+        self.connection.close()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+checkpoint.py
+
+Write the values of a long extraction to a tab separated file and save
+checkpoints, so that a run that dies can continue where it stopped:
+
+    extractor = CheckpointedExtractor(configs.plugins, interval=100000)
+    extractor.run("file.vcf.gz", "values.tsv")
+
+Every interval variants the output is flushed to the disk and a checkpoint
+is written next to the output, in 'values.tsv.checkpoint'. It holds
+
+    virtual_offset: Where the next variant starts in the vcf, a virtual
+                    offset for BGZF files and a byte offset otherwise
+    records: The number of variants processed
+    output_position: The size of the output at the checkpoint
+    config_fingerprint: A hash of the plugins and the run arguments
+
+When run is called again the output is cut at output_position and the
+extraction continues from virtual_offset, so the output is the same as from
+a run that never stopped. A checkpoint from another config is refused.
+"""
+
+from __future__ import print_function
+
+import io
+import json
+import logging
+import os
+from timeit import default_timer
+
+from six import string_types
+
+from extract_vcf.engine import Engine
+from extract_vcf.fingerprint import get_config_fingerprint
+from extract_vcf.formatting import format_value
+from extract_vcf.get_annotations import get_variant_dict
+from extract_vcf.reader import open_vcf, open_vcf_offsets, read_header
+
+CHECKPOINT_VERSION = 1
+
+
+def read_checkpoint(checkpoint_path):
+    """
+    Read a checkpoint
+
+    Arguments:
+        checkpoint_path (str): Path to the checkpoint
+
+    Returns:
+        checkpoint (dict): Or None if there is no checkpoint
+    """
+    if not os.path.exists(checkpoint_path):
+        return None
+    with io.open(checkpoint_path, 'r', encoding='utf-8') as checkpoint_file:
+        checkpoint = json.loads(checkpoint_file.read())
+    if checkpoint.get('checkpoint_version') != CHECKPOINT_VERSION:
+        raise ValueError("Unknown checkpoint version in {0}: {1}".format(
+            checkpoint_path, checkpoint.get('checkpoint_version')))
+    return checkpoint
+
+
+def write_checkpoint(checkpoint_path, checkpoint):
+    """
+    Write a checkpoint, the old checkpoint is replaced in one rename
+
+    Arguments:
+        checkpoint_path (str): Path to the checkpoint
+        checkpoint (dict)
+    """
+    with io.open(checkpoint_path + '.tmp', 'w', encoding='utf-8') as checkpoint_file:
+        checkpoint_file.write(json.dumps(checkpoint, indent=2))
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.rename(checkpoint_path + '.tmp', checkpoint_path)
+
+
+class CheckpointedExtractor(object):
+    """Class for running plugins on a vcf with checkpoints"""
+    def __init__(self, plugins, filters=None, interval=100000, dict_key=None,
+                 individual_id=None):
+        """
+        Arguments:
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            filters (str or list): A filter expression, see Engine
+            interval (int): Number of variants between checkpoints
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+        """
+        super(CheckpointedExtractor, self).__init__()
+        self.logger = logging.getLogger(__name__)
+        self.plugins = plugins
+        self.filters = filters
+        self.interval = interval
+        self.dict_key = dict_key
+        self.individual_id = individual_id
+
+        filters = self.filters
+        if filters and not isinstance(filters, string_types):
+            filters = [repr(predicate) for predicate in filters]
+        self.fingerprint = get_config_fingerprint(
+            plugins, filters=filters, dict_key=dict_key,
+            individual_id=individual_id)
+
+    def get_checkpoint(self, vcf_path, reader, output, records, passed_variants,
+                       fields, done=False):
+        """Return a checkpoint of the current position"""
+        return {
+            'checkpoint_version': CHECKPOINT_VERSION,
+            'vcf': os.path.abspath(vcf_path),
+            'virtual_offset': reader.tell(),
+            'records': records,
+            'passed_variants': passed_variants,
+            'output_position': output.tell(),
+            'config_fingerprint': self.fingerprint,
+            'fields': fields,
+            'done': done,
+        }
+
+    def save(self, checkpoint_path, output, checkpoint):
+        """Flush the output to the disk and write a checkpoint"""
+        output.flush()
+        os.fsync(output.fileno())
+        write_checkpoint(checkpoint_path, checkpoint)
+        self.logger.debug("Checkpoint at {0} variants".format(
+            checkpoint['records']))
+
+    def check(self, checkpoint, vcf_path, output_path):
+        """Raise a ValueError if a checkpoint is not from this run"""
+        if checkpoint['config_fingerprint'] != self.fingerprint:
+            raise ValueError(
+                "The checkpoint was written with another config or other "
+                "arguments, remove it to start over")
+        if checkpoint['vcf'] != os.path.abspath(vcf_path):
+            raise ValueError("The checkpoint is for another vcf: {0}".format(
+                checkpoint['vcf']))
+        if not os.path.exists(output_path) or \
+                os.path.getsize(output_path) < checkpoint['output_position']:
+            raise ValueError(
+                "The output {0} is shorter than at the checkpoint".format(
+                    output_path))
+
+    def run(self, vcf_path, output_path, checkpoint_path=None, resume=True):
+        """
+        Run the plugins on all variants in a vcf and write the values
+
+        Arguments:
+            vcf_path (str): Path to the vcf
+            output_path (str): Path to the tab separated output
+            checkpoint_path (str): Path to the checkpoint, the output path
+                                   with '.checkpoint' added if None
+            resume (bool): Continue from the checkpoint if there is one
+
+        Returns:
+            report (dict): The 'records' and 'passed_variants' of the whole
+                           run, 'resumed_from' the records at the checkpoint
+                           that was used and the 'elapsed' seconds
+        """
+        start = default_timer()
+        if checkpoint_path is None:
+            checkpoint_path = output_path + '.checkpoint'
+
+        with open_vcf(vcf_path) as vcf_handle:
+            header, variant_lines = read_header(vcf_handle)
+        engine = Engine(self.plugins, filters=self.filters, header=header)
+        fields = ['CHROM', 'POS'] + list(engine.plugin_names)
+
+        checkpoint = None
+        if resume:
+            checkpoint = read_checkpoint(checkpoint_path)
+        if checkpoint is not None:
+            self.check(checkpoint, vcf_path, output_path)
+            if checkpoint['done']:
+                self.logger.info("{0} is already done".format(output_path))
+                return {
+                    'records': checkpoint['records'],
+                    'passed_variants': checkpoint['passed_variants'],
+                    'resumed_from': checkpoint['records'],
+                    'elapsed': default_timer() - start,
+                }
+            fields = checkpoint['fields']
+
+        records = 0
+        passed_variants = 0
+        resumed_from = 0
+        reader = open_vcf_offsets(vcf_path)
+        try:
+            if checkpoint is not None:
+                reader.seek(checkpoint['virtual_offset'])
+                records = resumed_from = checkpoint['records']
+                passed_variants = checkpoint['passed_variants']
+                output = io.open(output_path, 'r+b')
+                output.seek(checkpoint['output_position'])
+                output.truncate()
+                self.logger.info("Resuming {0} from variant {1}".format(
+                    output_path, records))
+            else:
+                output = io.open(output_path, 'wb')
+                output.write(('\t'.join(fields) + '\n').encode('utf-8'))
+
+            with output:
+                while True:
+                    line = reader.readline()
+                    if not line:
+                        break
+                    if line.startswith(b'#') or not line.strip():
+                        continue
+                    variant_dict = get_variant_dict(
+                        line.decode('utf-8'), header.header)
+                    values = engine.get_values(
+                        variant_dict=variant_dict,
+                        dict_key=self.dict_key,
+                        individual_id=self.individual_id
+                    )
+                    records += 1
+                    if values is not None:
+                        passed_variants += 1
+                        row = [variant_dict['CHROM'], variant_dict['POS']]
+                        row.extend(values[name] for name in fields[2:])
+                        output.write(('\t'.join(
+                            format_value(value) for value in row) + '\n'
+                        ).encode('utf-8'))
+
+                    if records % self.interval == 0:
+                        self.save(checkpoint_path, output, self.get_checkpoint(
+                            vcf_path, reader, output, records,
+                            passed_variants, fields))
+
+                self.save(checkpoint_path, output, self.get_checkpoint(
+                    vcf_path, reader, output, records, passed_variants,
+                    fields, done=True))
+        finally:
+            reader.close()
+
+        self.logger.info("{0} of {1} variants written to {2}".format(
+            passed_variants, records, output_path))
+        return {
+            'records': records,
+            'passed_variants': passed_variants,
+            'resumed_from': resumed_from,
+            'elapsed': default_timer() - start,
+        }
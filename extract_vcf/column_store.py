@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+column_store.py
+
+Store the values that the plugins extract on disk as one .npy file per
+plugin, together with CHROM and POS index arrays and a manifest. Other
+processes can then read the columns with np.load(mmap_mode='r') without
+any parsing or copying.
+
+A store is a directory like:
+
+    manifest.json
+    CHROM.npy       # int32 index into manifest['contigs']
+    POS.npy         # int64
+    plugin_1000G.npy
+    plugin_Filter.npy
+
+The columns have fixed width types so they can be memory mapped:
+
+    float: float64, missing values are NaN
+    integer: int64, missing values are the 'missing' value in the manifest
+    flag: bool, missing values are False
+    string: int32 index into the 'strings' of the column, missing is -1
+
+The values are written to the disk in chunks so the memory use does not
+grow with the size of the vcf.
+
+The manifest holds a fingerprint of each plugin. When the config changes
+update_column_store only extracts the plugins that are added or changed and
+replaces their columns in the store.
+
+This module requires numpy, install with 'pip install extract_vcf[numpy]'.
+"""
+
+from __future__ import print_function
+
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from extract_vcf.engine import Engine
+from extract_vcf.fingerprint import get_plugin_fingerprint, diff_fingerprints
+from extract_vcf.reader import open_vcf
+
+MANIFEST = 'manifest.json'
+STORE_VERSION = 1
+
+
+def get_column_file(plugin_name, taken=()):
+    """
+    Return the file name for the column of a plugin
+
+    Characters that are not safe in file names are replaced with '_', so
+    different plugin names can give the same name, like 'A B' and 'A_B'. A
+    number is added to names that are already taken.
+
+    Arguments:
+        plugin_name (str): The name of the plugin
+        taken (iterable): File names used by other columns
+
+    Returns:
+        file_name (str)
+    """
+    base = "plugin_{0}".format(re.sub(r'[^A-Za-z0-9_.-]', '_', plugin_name))
+    # Case insensitive file systems can not hold 'a' and 'A'
+    taken = set(file_name.lower() for file_name in taken)
+    file_name = "{0}.npy".format(base)
+    number = 1
+    while file_name.lower() in taken:
+        number += 1
+        file_name = "{0}_{1}.npy".format(base, number)
+    return file_name
+
+
+def get_dtype(data_type):
+    """
+    Return the numpy type used to store a plugin data type
+
+    Arguments:
+        data_type (str): The data type of a plugin
+
+    Returns:
+        dtype (numpy.dtype)
+    """
+    if data_type == 'float':
+        return np.dtype('float64')
+    if data_type == 'integer':
+        return np.dtype('int64')
+    if data_type == 'flag':
+        return np.dtype('bool')
+    return np.dtype('int32')
+
+
+class StringTable(object):
+    """Class for giving strings an index"""
+    def __init__(self, strings=None):
+        super(StringTable, self).__init__()
+        self.strings = []
+        self.indexes = {}
+        for string in strings or []:
+            self.get_index(string)
+
+    def get_index(self, string):
+        """Return the index of a string, add the string if it is new"""
+        if string not in self.indexes:
+            self.indexes[string] = len(self.strings)
+            self.strings.append(string)
+        return self.indexes[string]
+
+
+class ColumnStoreWriter(object):
+    """Class for writing plugin values to a directory of .npy files"""
+    def __init__(self, path, plugins, plugin_names=None, name=None,
+                 version=None, chunk_size=100000):
+        """
+        Arguments:
+            path (str): The directory of the store
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            plugin_names (list): The plugins to store
+            name (str): The name of the config, like ConfigParser.name
+            version (float): The version of the config, like ConfigParser.version
+            chunk_size (int): Number of variants to collect before writing
+        """
+        super(ColumnStoreWriter, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        if np is None:
+            raise ImportError(
+                "numpy is needed to write a column store, "
+                "install with 'pip install extract_vcf[numpy]'")
+
+        self.path = path
+        self.plugins = plugins
+        self.plugin_names = plugin_names or list(plugins.keys())
+        self.name = name
+        self.version = version
+        self.chunk_size = chunk_size
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        self.contigs = StringTable()
+        self.string_tables = {}
+        self.columns = {}
+        for plugin_name in self.plugin_names:
+            plugin = self.plugins[plugin_name]
+            dtype = get_dtype(plugin.data_type)
+            if plugin.data_type in ['float', 'integer', 'flag']:
+                missing = {
+                    'float': float('nan'),
+                    'integer': int(np.iinfo(np.int64).min),
+                    'flag': False,
+                }[plugin.data_type]
+            else:
+                missing = -1
+                # Strings from the rules get the same index in all stores
+                self.string_tables[plugin_name] = StringTable(
+                    sorted(plugin.string_rules))
+            self.columns[plugin_name] = {
+                'file': get_column_file(
+                    plugin_name,
+                    [column['file'] for column in self.columns.values()]),
+                'dtype': dtype,
+                'missing': missing,
+            }
+
+        self.buffers = {column: [] for column in ['CHROM', 'POS'] + self.plugin_names}
+        self.raw_files = {}
+        for column in self.buffers:
+            self.raw_files[column] = open(
+                os.path.join(path, self.get_file(column) + '.tmp'), 'wb')
+
+        self.variants = 0
+
+    def get_file(self, column):
+        """Return the file name of a column"""
+        if column in ['CHROM', 'POS']:
+            return "{0}.npy".format(column)
+        return self.columns[column]['file']
+
+    def get_column_dtype(self, column):
+        """Return the numpy type of a column"""
+        if column == 'CHROM':
+            return np.dtype('int32')
+        if column == 'POS':
+            return np.dtype('int64')
+        return self.columns[column]['dtype']
+
+    def convert_value(self, plugin_name, value):
+        """
+        Convert a plugin value to the value that is stored
+
+        Arguments:
+            plugin_name (str): The name of the plugin
+            value: The value returned by the plugin
+
+        Returns:
+            The value to store
+        """
+        column = self.columns[plugin_name]
+        if value is None:
+            return column['missing']
+
+        data_type = self.plugins[plugin_name].data_type
+        try:
+            if data_type == 'float':
+                return float(value)
+            if data_type == 'integer':
+                return int(value)
+        except (TypeError, ValueError):
+            return column['missing']
+        if data_type == 'flag':
+            return bool(value)
+        return self.string_tables[plugin_name].get_index(str(value))
+
+    def write(self, variant_dict, values):
+        """
+        Add the values of one variant
+
+        Arguments:
+            variant_dict (dict): A variant dictionary
+            values (dict): A dictionary with plugin names as keys and the
+                           plugin values as values
+        """
+        self.buffers['CHROM'].append(self.contigs.get_index(variant_dict['CHROM']))
+        self.buffers['POS'].append(int(variant_dict['POS']))
+        for plugin_name in self.plugin_names:
+            self.buffers[plugin_name].append(
+                self.convert_value(plugin_name, values.get(plugin_name)))
+
+        self.variants += 1
+        if len(self.buffers['POS']) >= self.chunk_size:
+            self.flush()
+
+    def write_variants(self, variants):
+        """
+        Add all variants from an iterable, like Engine.extract
+
+        Arguments:
+            variants (iterable): An iterable with (variant_dict, values)
+        """
+        for variant_dict, values in variants:
+            self.write(variant_dict, values)
+
+    def flush(self):
+        """Write the collected values to the raw column files"""
+        for column in self.buffers:
+            if self.buffers[column]:
+                np.array(
+                    self.buffers[column], dtype=self.get_column_dtype(column)
+                ).tofile(self.raw_files[column])
+            self.buffers[column] = []
+
+    def get_manifest(self):
+        """Return the manifest of the store"""
+        columns = {}
+        for plugin_name in self.plugin_names:
+            plugin = self.plugins[plugin_name]
+            column = self.columns[plugin_name]
+            missing = column['missing']
+            if missing != missing:
+                # NaN is not valid json
+                missing = 'nan'
+            columns[plugin_name] = {
+                'file': column['file'],
+                'dtype': column['dtype'].str,
+                'data_type': plugin.data_type,
+                'category': plugin.category,
+                'missing': missing,
+            }
+            if plugin_name in self.string_tables:
+                columns[plugin_name]['strings'] = self.string_tables[plugin_name].strings
+
+        return {
+            'store_version': STORE_VERSION,
+            'name': self.name,
+            'version': self.version,
+            'variants': self.variants,
+            'contigs': self.contigs.strings,
+            'plugins': self.plugin_names,
+            'fingerprints': {
+                name: get_plugin_fingerprint(self.plugins[name])
+                for name in self.plugin_names
+            },
+            'columns': columns,
+        }
+
+    def close(self):
+        """
+        Write the .npy files and the manifest
+
+        The .npy header needs the number of variants so the raw files are
+        copied to the .npy files after the header.
+        """
+        self.flush()
+        for column in self.raw_files:
+            self.raw_files[column].close()
+            raw_path = self.raw_files[column].name
+            npy_path = os.path.join(self.path, self.get_file(column))
+            with open(npy_path, 'wb') as npy_file:
+                np.lib.format.write_array_header_1_0(npy_file, {
+                    'descr': np.lib.format.dtype_to_descr(
+                        self.get_column_dtype(column)),
+                    'fortran_order': False,
+                    'shape': (self.variants,),
+                })
+                with open(raw_path, 'rb') as raw_file:
+                    shutil.copyfileobj(raw_file, npy_file)
+            os.remove(raw_path)
+
+        write_manifest(self.path, self.get_manifest())
+
+        self.logger.info("Wrote {0} variants to {1}".format(
+            self.variants, self.path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def write_manifest(path, manifest):
+    """
+    Write the manifest of a store
+
+    The manifest is written to a temporary file that replaces the old one,
+    so readers never see a half written manifest.
+
+    Arguments:
+        path (str): The directory of the store
+        manifest (dict): The manifest
+    """
+    manifest_path = os.path.join(path, MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.rename(manifest_path + '.tmp', manifest_path)
+
+
+class ColumnStore(object):
+    """Class for reading a column store with memory mapped columns"""
+    def __init__(self, path):
+        """
+        Arguments:
+            path (str): The directory of the store
+        """
+        super(ColumnStore, self).__init__()
+        if np is None:
+            raise ImportError(
+                "numpy is needed to read a column store, "
+                "install with 'pip install extract_vcf[numpy]'")
+
+        self.path = path
+        with open(os.path.join(path, MANIFEST), 'r') as manifest_file:
+            self.manifest = json.load(manifest_file)
+
+        self.name = self.manifest['name']
+        self.version = self.manifest['version']
+        self.contigs = self.manifest['contigs']
+        self.plugins = self.manifest['plugins']
+
+    def load(self, file_name):
+        """Memory map a .npy file of the store"""
+        return np.load(os.path.join(self.path, file_name), mmap_mode='r')
+
+    @property
+    def chrom(self):
+        """The CHROM index array, an index into self.contigs"""
+        return self.load('CHROM.npy')
+
+    @property
+    def pos(self):
+        """The POS array"""
+        return self.load('POS.npy')
+
+    def column(self, plugin_name):
+        """
+        Return the memory mapped column of a plugin
+
+        Arguments:
+            plugin_name (str): The name of the plugin
+
+        Returns:
+            column (numpy.memmap)
+        """
+        return self.load(self.manifest['columns'][plugin_name]['file'])
+
+    def strings(self, plugin_name):
+        """Return the strings that the indexes of a string column refers to"""
+        return self.manifest['columns'][plugin_name].get('strings', [])
+
+
+def update_column_store(path, vcf_path, plugins, name=None, version=None,
+                        dict_key=None, individual_id=None):
+    """
+    Update a column store to a new set of plugins
+
+    The plugins are compared to the fingerprints in the manifest. Only the
+    plugins that are added or changed are extracted from the vcf, columns of
+    removed plugins are deleted and the other columns are kept.
+
+    Arguments:
+        path (str): The directory of the store
+        vcf_path (str): Path to the vcf that the store was written from
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values, like ConfigParser.plugins
+        name (str): The name of the new config
+        version (float): The version of the new config
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+
+    Returns:
+        diff (dict): The diff from diff_fingerprints
+    """
+    logger = logging.getLogger(__name__)
+    store = ColumnStore(path)
+    manifest = store.manifest
+    manifest.setdefault('fingerprints', {})
+
+    diff = diff_fingerprints(
+        manifest.get('fingerprints', {}),
+        {plugin_name: get_plugin_fingerprint(plugins[plugin_name])
+         for plugin_name in plugins}
+    )
+    logger.info("Plugins added: {0}, changed: {1}, removed: {2}".format(
+        diff['added'], diff['changed'], diff['removed']))
+
+    new_plugins = {
+        plugin_name: plugins[plugin_name]
+        for plugin_name in diff['added'] + diff['changed']
+    }
+
+    if new_plugins:
+        tmp_dir = tempfile.mkdtemp(dir=path)
+        try:
+            engine = Engine(new_plugins)
+            with ColumnStoreWriter(tmp_dir, new_plugins) as writer:
+                with open_vcf(vcf_path) as vcf_handle:
+                    writer.write_variants(engine.extract(
+                        vcf_handle, dict_key=dict_key, individual_id=individual_id))
+
+            new_store = ColumnStore(tmp_dir)
+            if not (new_store.contigs == store.contigs and
+                    np.array_equal(new_store.chrom, store.chrom) and
+                    np.array_equal(new_store.pos, store.pos)):
+                raise ValueError(
+                    "The column store at {0} was not written from {1}".format(
+                        path, vcf_path))
+
+            for plugin_name in new_plugins:
+                column = new_store.manifest['columns'][plugin_name]
+                tmp_file = column['file']
+                column['file'] = get_column_file(plugin_name, [
+                    manifest['columns'][other]['file']
+                    for other in manifest['columns'] if other != plugin_name])
+                os.rename(
+                    os.path.join(tmp_dir, tmp_file),
+                    os.path.join(path, column['file']))
+                manifest['columns'][plugin_name] = column
+                manifest['fingerprints'][plugin_name] = \
+                    new_store.manifest['fingerprints'][plugin_name]
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    for plugin_name in diff['removed']:
+        column = manifest['columns'].pop(plugin_name)
+        manifest['fingerprints'].pop(plugin_name, None)
+        if column['file'] not in [
+                manifest['columns'][kept]['file'] for kept in manifest['columns']]:
+            os.remove(os.path.join(path, column['file']))
+
+    manifest['plugins'] = list(plugins.keys())
+    if name is not None:
+        manifest['name'] = name
+    if version is not None:
+        manifest['version'] = version
+    write_manifest(path, manifest)
+
+    return diff
@@ -26,7 +26,14 @@ Each plugin section will look like:
   section = section_name # str in ['CHROM','POS','ID','REF','ALT', 'FILTER',
                           'QUAL', 'FILTER','INFO','FORMAT','sample_id']
   data_type = data_type # str in ['integer','float','flag','string']
-  record_rule = record_rule # str in ['min', 'max']
+  record_rule = record_rule # str in ['min', 'max', 'first', 'sum', 'mean',
+                              'count', 'any']
+
+Numeric plugins can declare the bounds of their values, a 'max' rule stops
+looking when upper_bound is found and a 'min' rule when lower_bound is found:
+
+  upper_bound = 1.0 # float
+  lower_bound = 0.0 # float
 
 
 Created by Måns Magnusson on 2015-04-16.
@@ -61,6 +68,9 @@ class ConfigParser(configobj.ConfigObj):
                             'FILTER','INFO','FORMAT','sample_id']
         
         self.data_types = ['integer','float','flag','character','string']
+        self.record_rules = ['min', 'max', 'first', 'sum', 'mean', 'count', 'any']
+        # String values are compared on the priorities of the string rules
+        self.string_record_rules = ['min', 'max']
         # self.data_numbers = ['A','G','.','R']
         
         self.logger.info("Checking version and name")
@@ -108,7 +118,9 @@ class ConfigParser(configobj.ConfigObj):
                     category=category,
                     csq_key=plugin_info.get('csq_key', None),
                     record_rule=plugin_info.get('record_rule', 'max'),
-                    string_rules=string_rules
+                    string_rules=string_rules,
+                    lower_bound=self.get_bound(plugin_info, 'lower_bound'),
+                    upper_bound=self.get_bound(plugin_info, 'upper_bound')
                 )
                 
                 if category:
@@ -172,6 +184,24 @@ class ConfigParser(configobj.ConfigObj):
             
     
     
+    def get_bound(self, plugin_info, bound):
+        """
+        Return a bound of the values for a plugin
+        
+        Arguments:
+            plugin_info (dict): A dictionary with plugin information
+            bound (str): 'lower_bound' or 'upper_bound'
+        
+        Return:
+            The bound with the data type of the plugin or None
+        """
+        raw_bound = plugin_info.get(bound, None)
+        if raw_bound is None:
+            return None
+        if plugin_info['data_type'] == 'integer':
+            return int(raw_bound)
+        return float(raw_bound)
+    
     def version_check(self):
         """
         Check if the version entry is in the proper format
@@ -278,14 +308,38 @@ class ConfigParser(configobj.ConfigObj):
         record_rule = vcf_section.get('record_rule', None)
         
         if record_rule:
-            if not record_rule in ['min', 'max']:
+            if not record_rule in self.record_rules:
                 raise ValidateError(
                     "Record rules have to be in {0}\n"
                     "Wrong record_rule in plugin: {1}".format(
-                        ['min', 'max'], plugin)
+                        self.record_rules, plugin)
+                )
+            if data_type == 'string' and not record_rule in self.string_record_rules:
+                raise ValidateError(
+                    "Record rules for strings have to be in {0}\n"
+                    "Wrong record_rule in plugin: {1}".format(
+                        self.string_record_rules, plugin)
                 )
         else:
             self.logger.info("Setting record rule to default: 'max'")
+        
+        for bound in ['lower_bound', 'upper_bound']:
+            if bound in vcf_section:
+                if not data_type in ['integer', 'float']:
+                    raise ValidateError(
+                        "Only integer and float plugins can have a {0}\n"
+                        "Wrong {0} in plugin: {1}".format(bound, plugin)
+                    )
+                try:
+                    if data_type == 'integer':
+                        int(vcf_section[bound])
+                    else:
+                        float(vcf_section[bound])
+                except ValueError:
+                    raise ValidateError(
+                        "{0} has to be a {1}\n"
+                        "Wrong {0} in plugin: {2}".format(bound, data_type, plugin)
+                    )
                 
         return True
 
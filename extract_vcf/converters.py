@@ -0,0 +1,129 @@
+"""
+Converters turn the raw values of float and integer plugins into numbers.
+
+Missing values, '.' or empty, are common in sparse annotations like
+population frequencies. A converter checks for them before converting, so
+an exception is only raised and caught for values that are malformed. The
+malformed values are counted.
+
+The converter of a plugin is picked once, from the data type of the plugin
+and, for INFO plugins, the Type of the '##INFO' line in the vcf header.
+A plugin that is declared with another type in the header is logged, since
+many of its values will be counted as malformed. An annotation that is
+declared with Number=1 usually holds one value, so it is first converted
+without being splitted on the separators of the plugin. If that fails, like
+for '0.1,0.2', it is splitted and reduced as any other annotation, so the
+values are the same as without the header.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MISSING_VALUES = frozenset(['', '.'])
+
+# Characters that can be part of a number that float or int accepts. If a
+# separator has none of them a raw entry that converts as a whole holds no
+# separator.
+NUMBER_CHARACTERS = frozenset('0123456789+-._eEinfatyINFATY \t\n')
+
+# The header Types whose values can be converted by a plugin data type
+CONVERTIBLE_TYPES = {
+    'float': frozenset(['Float', 'Integer']),
+    'integer': frozenset(['Integer']),
+}
+
+
+class Converter(object):
+    """Class for converting raw values to numbers and counting bad values"""
+    __slots__ = ('convert', 'single', 'malformed')
+
+    def __init__(self, convert, single=False):
+        """
+        Arguments:
+            convert (callable): float or int
+            single (bool): If the raw entries usually hold one value that
+                           can be converted without splitting, see
+                           convert_whole
+        """
+        super(Converter, self).__init__()
+        self.convert = convert
+        self.single = single
+        self.malformed = 0
+
+    def __call__(self, raw_value):
+        """
+        Convert a raw value
+
+        Arguments:
+            raw_value (str)
+
+        Returns:
+            value: The number or None if the value is missing or malformed
+        """
+        if raw_value in MISSING_VALUES:
+            return None
+        try:
+            return self.convert(raw_value)
+        except ValueError:
+            self.malformed += 1
+            return None
+
+
+    def convert_whole(self, raw_entry):
+        """
+        Convert a raw entry that is not splitted
+
+        Nothing is counted, an entry that can not be converted is splitted
+        and converted as usual by the plugin.
+
+        Arguments:
+            raw_entry (str)
+
+        Returns:
+            value: The number or None if the entry is missing or is not one
+                   number
+        """
+        if raw_entry in MISSING_VALUES:
+            return None
+        try:
+            return self.convert(raw_entry)
+        except ValueError:
+            return None
+
+
+def get_converter(plugin, info_dict=None):
+    """
+    Return a converter for a plugin
+
+    Arguments:
+        plugin (Plugin): A plugin
+        info_dict (dict): The INFO declarations of the vcf header, as in
+                          HeaderParser.info_dict
+
+    Returns:
+        converter (Converter): Or None if the plugin is not a float or
+                               integer plugin
+    """
+    if plugin.data_type == 'float':
+        convert = float
+    elif plugin.data_type == 'integer':
+        convert = int
+    else:
+        return None
+
+    single = False
+    if info_dict and plugin.field == 'INFO' and plugin.info_key != 'CSQ':
+        declaration = info_dict.get(plugin.info_key)
+        if declaration:
+            if declaration['Type'] not in CONVERTIBLE_TYPES[plugin.data_type]:
+                logger.warning(
+                    "Plugin {0} has data type {1} but {2} is declared as {3} "
+                    "in the vcf header".format(
+                        plugin.name, plugin.data_type, plugin.info_key,
+                        declaration['Type']))
+            single = (
+                declaration['Number'] == '1' and not plugin.dict_entry and
+                not any(NUMBER_CHARACTERS.intersection(separator)
+                        for separator in plugin.separators))
+    return Converter(convert, single=single)
@@ -0,0 +1,338 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+distributed.py
+
+Spread the extraction of one sorted vcf over several machines without a
+cluster framework. The work is split in three commands:
+
+    python -m extract_vcf.distributed plan file.vcf.gz manifest.json \\
+        --shard-length 10000000
+    python -m extract_vcf.distributed worker manifest.json config.ini out/ \\
+        --shard 0 --shard 1
+    python -m extract_vcf.distributed merge manifest.json out/ values.tsv
+
+'plan' reads the header and writes a manifest with one entry per region,
+see shards.py. 'worker' runs a config on some of the regions and writes one
+tab separated file per shard to a shared output directory, together with a
+small json file that marks the shard as done. 'merge' checks that every
+shard in the manifest is done with the same config and concatenates the
+shard files in manifest order.
+
+A shard file is written under a temporary name and renamed when it is
+complete, so a worker that dies never leaves a shard that looks done.
+"""
+
+from __future__ import print_function
+
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from validate import ValidateError
+
+from extract_vcf.config_parser import ConfigParser
+from extract_vcf.fingerprint import get_config_fingerprint
+from extract_vcf.formatting import format_value
+from extract_vcf.plan import ExtractionPlan
+from extract_vcf.reader import open_vcf, read_header
+from extract_vcf.shards import Shard, get_shards, run_shard
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+
+
+def write_manifest(vcf_path, manifest_path, shard_length=None, contigs=None):
+    """
+    Write a manifest with the shards of a sorted vcf
+
+    Arguments:
+        vcf_path (str): Path to a sorted vcf
+        manifest_path (str): Where to write the manifest
+        shard_length (int): The largest number of bases in a shard
+        contigs (list): Only use these contigs
+
+    Returns:
+        manifest (dict)
+    """
+    with open_vcf(vcf_path) as vcf_handle:
+        header, variant_lines = read_header(vcf_handle)
+    shards = get_shards(header, shard_length, contigs)
+    manifest = {
+        'manifest_version': MANIFEST_VERSION,
+        'vcf': os.path.abspath(vcf_path),
+        'vcf_size': os.path.getsize(vcf_path),
+        'vcf_mtime': int(os.path.getmtime(vcf_path)),
+        'shard_length': shard_length,
+        'shards': [
+            {
+                'index': shard.index,
+                'contig': shard.contig,
+                'start': shard.start,
+                'end': shard.end,
+                'region': shard.region,
+            }
+            for shard in shards
+        ],
+    }
+    with io.open(manifest_path, 'w', encoding='utf-8') as manifest_file:
+        manifest_file.write(json.dumps(manifest, indent=2))
+    logger.info("Wrote manifest with {0} shards to {1}".format(
+        len(shards), manifest_path))
+    return manifest
+
+
+def read_manifest(manifest_path):
+    """
+    Read a manifest written by write_manifest
+
+    Arguments:
+        manifest_path (str): Path to the manifest
+
+    Returns:
+        manifest (dict)
+    """
+    with io.open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+        manifest = json.loads(manifest_file.read())
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        raise ValueError("Unknown manifest version in {0}: {1}".format(
+            manifest_path, manifest.get('manifest_version')))
+    return manifest
+
+
+def get_shard_files(out_dir, index):
+    """Return the paths to the values and the done marker of a shard"""
+    name = "shard_{0:05d}".format(index)
+    return (os.path.join(out_dir, name + '.tsv'),
+            os.path.join(out_dir, name + '.json'))
+
+
+def run_worker(manifest, config_file, out_dir, index, filters=None,
+               dict_key=None, individual_id=None):
+    """
+    Run a config on one shard of a manifest and write the shard files
+
+    Arguments:
+        manifest (dict): From read_manifest
+        config_file (str): Path to a config file
+        out_dir (str): The shared output directory
+        index (int): The index of the shard in the manifest
+        filters (str): A filter expression, see Engine
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+
+    Returns:
+        done (dict): The content of the done marker
+    """
+    entry = manifest['shards'][index]
+    shard = Shard(entry['index'], entry['contig'], entry['start'], entry['end'])
+    vcf_path = manifest['vcf']
+    # A vcf that is rewritten with the same size gets a new mtime
+    if (os.path.getsize(vcf_path) != manifest['vcf_size'] or
+            int(os.path.getmtime(vcf_path)) != manifest['vcf_mtime']):
+        raise ValueError("The vcf {0} has changed since the manifest was "
+                         "written".format(vcf_path))
+
+    config = ConfigParser(config_file)
+    with open_vcf(vcf_path) as vcf_handle:
+        header, variant_lines = read_header(vcf_handle)
+    plan = ExtractionPlan.from_config(
+        config,
+        filters=filters,
+        vcf_header=header.header,
+        csq_format=header.csq_format,
+        info_dict=header.info_dict,
+        dict_key=dict_key,
+        individual_id=individual_id
+    )
+    columns, stats = run_shard(plan, vcf_path, shard)
+
+    # Workers on other processes or nodes may create the directory too
+    try:
+        os.makedirs(out_dir)
+    except OSError:
+        if not os.path.isdir(out_dir):
+            raise
+    values_path, done_path = get_shard_files(out_dir, shard.index)
+    with io.open(values_path + '.tmp', 'w', encoding='utf-8') as values_file:
+        values_file.write('\t'.join(plan.row_fields) + '\n')
+        for row in zip(*columns):
+            values_file.write('\t'.join(format_value(value) for value in row))
+            values_file.write('\n')
+    os.rename(values_path + '.tmp', values_path)
+
+    done = {
+        'index': shard.index,
+        'region': shard.region,
+        'fields': list(plan.row_fields),
+        'config_name': config.name,
+        'config_version': config.version,
+        'config_fingerprint': get_config_fingerprint(
+            config.plugins, filters=filters, dict_key=dict_key,
+            individual_id=individual_id),
+    }
+    done.update(stats)
+    with io.open(done_path + '.tmp', 'w', encoding='utf-8') as done_file:
+        done_file.write(json.dumps(done, indent=2))
+    os.rename(done_path + '.tmp', done_path)
+    logger.info("Shard {0} done: {1} of {2} variants passed in {3:.2f} s".format(
+        shard.region, stats['passed_variants'], stats['variants'],
+        stats['elapsed']))
+    return done
+
+
+def check_shards(manifest, out_dir):
+    """
+    Check that all shards of a manifest are done with the same config
+
+    Arguments:
+        manifest (dict): From read_manifest
+        out_dir (str): The shared output directory
+
+    Returns:
+        done_markers (list): The done marker of each shard, in manifest order
+    """
+    done_markers = []
+    missing = []
+    for entry in manifest['shards']:
+        values_path, done_path = get_shard_files(out_dir, entry['index'])
+        if not (os.path.exists(done_path) and os.path.exists(values_path)):
+            missing.append(entry['region'])
+            continue
+        with io.open(done_path, 'r', encoding='utf-8') as done_file:
+            done_markers.append(json.loads(done_file.read()))
+    if missing:
+        raise ValueError("{0} of {1} shards are not done: {2}".format(
+            len(missing), len(manifest['shards']), ', '.join(missing)))
+
+    for done in done_markers:
+        for key in ['config_fingerprint', 'fields']:
+            if done[key] != done_markers[0][key]:
+                raise ValueError(
+                    "Shard {0} was run with another config than shard "
+                    "{1}".format(done['region'], done_markers[0]['region']))
+    return done_markers
+
+
+def merge_shards(manifest, out_dir, output_path):
+    """
+    Concatenate the shard files in manifest order
+
+    Arguments:
+        manifest (dict): From read_manifest
+        out_dir (str): The shared output directory
+        output_path (str): Where to write the merged values
+
+    Returns:
+        variants (int): The number of variants in the merged file
+    """
+    done_markers = check_shards(manifest, out_dir)
+    variants = 0
+    with io.open(output_path + '.tmp', 'w', encoding='utf-8') as output:
+        if done_markers:
+            output.write('\t'.join(done_markers[0]['fields']) + '\n')
+        for entry, done in zip(manifest['shards'], done_markers):
+            values_path = get_shard_files(out_dir, entry['index'])[0]
+            with io.open(values_path, 'r', encoding='utf-8') as values_file:
+                # Skip the header line of the shard
+                values_file.readline()
+                shutil.copyfileobj(values_file, output)
+            variants += done['passed_variants']
+    os.rename(output_path + '.tmp', output_path)
+    logger.info("Merged {0} shards with {1} variants to {2}".format(
+        len(done_markers), variants, output_path))
+    return variants
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Extract a sorted vcf in shards on several machines")
+    commands = parser.add_subparsers(dest='command')
+
+    plan = commands.add_parser('plan', help="Write a manifest of the shards")
+    plan.add_argument('vcf', help="Path to a sorted vcf")
+    plan.add_argument('manifest', help="Where to write the manifest")
+    plan.add_argument('--shard-length', type=int,
+                      help="The largest number of bases in a shard")
+    plan.add_argument('--contig', action='append', dest='contigs',
+                      help="Only use this contig, can be repeated")
+
+    worker = commands.add_parser('worker', help="Run a config on shards")
+    worker.add_argument('manifest')
+    worker.add_argument('config')
+    worker.add_argument('out_dir', help="The shared output directory")
+    worker.add_argument('--shard', type=int, action='append', dest='shards',
+                        help="Index of a shard to run, can be repeated. "
+                        "All shards that are not done if not given")
+    worker.add_argument('--processes', type=int, default=1)
+    worker.add_argument('--filter', dest='filters')
+    worker.add_argument('--dict-key')
+    worker.add_argument('--individual-id')
+
+    merge = commands.add_parser('merge', help="Check and merge the shards")
+    merge.add_argument('manifest')
+    merge.add_argument('out_dir')
+    merge.add_argument('output', help="Where to write the merged values")
+    return parser
+
+
+def main(args=None):
+    parser = get_parser()
+    options = parser.parse_args(args)
+    if options.command is None:
+        parser.error("A command is required")
+
+    try:
+        if options.command == 'plan':
+            manifest = write_manifest(options.vcf, options.manifest,
+                                      options.shard_length, options.contigs)
+            print("Wrote {0} shards to {1}".format(
+                len(manifest['shards']), options.manifest))
+
+        elif options.command == 'worker':
+            manifest = read_manifest(options.manifest)
+            indexes = options.shards
+            if indexes is None:
+                indexes = [
+                    entry['index'] for entry in manifest['shards']
+                    if not os.path.exists(get_shard_files(
+                        options.out_dir, entry['index'])[1])
+                ]
+            arguments = (manifest, options.config, options.out_dir)
+            keywords = {
+                'filters': options.filters,
+                'dict_key': options.dict_key,
+                'individual_id': options.individual_id,
+            }
+            if options.processes > 1:
+                with ProcessPoolExecutor(options.processes) as executor:
+                    futures = [
+                        executor.submit(run_worker, *(arguments + (index,)),
+                                        **keywords)
+                        for index in indexes
+                    ]
+                    for future in futures:
+                        future.result()
+            else:
+                for index in indexes:
+                    run_worker(*(arguments + (index,)), **keywords)
+            print("Ran {0} shards".format(len(indexes)))
+
+        elif options.command == 'merge':
+            manifest = read_manifest(options.manifest)
+            variants = merge_shards(manifest, options.out_dir, options.output)
+            print("Merged {0} variants to {1}".format(variants, options.output))
+    except (IOError, OSError, ValueError, ValidateError) as error:
+        print("Error: {0}".format(error), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,562 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+engine.py
+
+The engine runs a set of plugins, usually the plugins from a ConfigParser,
+on vcf variants.
+
+If a filter is given the plugins that the filter depends on are evaluated
+first, cheapest first, and the remaining plugins are only evaluated for
+variants that pass the filter.
+
+With sample_size the engine measures the time spent in each plugin and how
+many variants that pass each predicate on the first variants of a run. The
+predicates are then reordered so that the ones that are cheap and remove
+many variants are evaluated first.
+
+Plugins that read the same vcf field and INFO key are grouped when the
+engine is created. The CSQ annotation is splitted once per variant and the
+result is shared by all plugins in the CSQ group. In the same way a
+dict_entry annotation is parsed once per variant for all plugins that read
+it. The engine keeps the last splitted annotations, so nothing is added to
+the variant dictionaries.
+
+Float and integer plugins get a converter from converters.py when the
+header is known. Missing values are skipped without raising an exception,
+and malformed values are counted, see malformed_values.
+
+An engine keeps counters and statistics so it should only be used by one
+thread. The plugins can not be changed, so engines in different threads can
+share the same plugins.
+
+    configs = ConfigParser("config.ini")
+    engine = Engine(configs.plugins, filters="1000G <= 0.01 and Filter == PASS")
+    for variant_dict, values in engine.extract(vcf_file):
+        print(values)
+    engine.log_summary()
+"""
+
+from __future__ import print_function
+
+import logging
+from timeit import default_timer
+
+from six import string_types
+from validate import ValidateError
+
+from extract_vcf.converters import get_converter
+from extract_vcf.get_annotations import get_variant_dict, split_csq
+from extract_vcf.header_parser import HeaderParser
+from extract_vcf.filters import parse_filter
+
+# Rough relative cost of getting a value from the different vcf fields
+FIELD_COSTS = {
+    'CHROM': 1,
+    'POS': 1,
+    'ID': 1,
+    'REF': 1,
+    'ALT': 1,
+    'QUAL': 1,
+    'FILTER': 1,
+    'FORMAT': 1,
+    'INFO': 3,
+    'sample_id': 4,
+}
+
+
+def estimate_cost(plugin):
+    """
+    Estimate the relative cost of running a plugin on one variant
+
+    Arguments:
+        plugin (Plugin): A plugin
+
+    Returns:
+        cost (int): A relative cost, higher is more expensive
+    """
+    cost = FIELD_COSTS.get(plugin.field, 3)
+    if plugin.info_key == 'CSQ':
+        # Vep annotations are splitted per transcript
+        cost += 3
+    if plugin.data_type == 'string':
+        cost += 1
+    return cost
+
+
+def group_plugins(plugins):
+    """
+    Group plugins that read the same entry of a variant
+
+    Arguments:
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+
+    Returns:
+        groups (dict): A dictionary with (field, info_key) as keys and a list
+                       of plugin names as values
+    """
+    groups = {}
+    for name in plugins:
+        plugin = plugins[name]
+        group = (plugin.field, plugin.info_key)
+        if group in groups:
+            groups[group].append(name)
+        else:
+            groups[group] = [name]
+    return groups
+
+
+class Engine(object):
+    """Class for running plugins on vcf variants"""
+    def __init__(self, plugins, filters=None, header=None, sample_size=None):
+        """
+        Arguments:
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values, like ConfigParser.plugins
+            filters (str or list): A filter expression or a list of Predicates
+            header (HeaderParser): The header of the vcf file. If None it will
+                                   be collected when using extract
+            sample_size (int): Number of variants to measure plugin cost and
+                               predicate selectivity on before reordering the
+                               predicates. If None the estimated costs are used
+        """
+        super(Engine, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        self.plugins = plugins
+        self.plugin_names = list(plugins.keys())
+        # The columns of the rows from extract_rows
+        self.row_fields = ('CHROM', 'POS') + tuple(self.plugin_names)
+        self.header = header or HeaderParser()
+
+        if not filters:
+            filters = []
+        elif isinstance(filters, string_types):
+            filters = parse_filter(filters)
+
+        for predicate in filters:
+            if predicate.plugin_name not in self.plugins:
+                raise ValidateError(
+                    "Filter refers to a plugin that does not exist: {0}".format(
+                        predicate.plugin_name))
+
+        # The predicates are evaluated cheapest first
+        self.predicates = sorted(
+            filters,
+            key=lambda predicate: estimate_cost(self.plugins[predicate.plugin_name])
+        )
+        filter_plugins = set(
+            predicate.plugin_name for predicate in self.predicates)
+        self.remaining_plugins = [
+            name for name in self.plugin_names if name not in filter_plugins]
+
+        self.logger.info("Filter order: {0}".format(
+            ', '.join(predicate.plugin_name for predicate in self.predicates)))
+
+        self.plugin_groups = group_plugins(self.plugins)
+        self.csq_plugins = set(self.plugin_groups.get(('INFO', 'CSQ'), []))
+        for group in self.plugin_groups:
+            self.logger.debug("Plugins reading {0}: {1}".format(
+                group, ', '.join(self.plugin_groups[group])))
+
+        # Built from the header when the first variant is seen
+        self.converters = None
+        self.converter_info_size = None
+        # The last raw CSQ annotation and the splitted annotation
+        self.last_csq = (None, None)
+        # The last raw and parsed annotation of each dict_entry annotation,
+        # by info_key and separators
+        self.dict_entry_plugins = set(
+            name for name in self.plugin_names
+            if self.plugins[name].dict_entry
+            and self.plugins[name].field == 'INFO')
+        self.last_dict_entries = {}
+
+        self.variants = 0
+        self.passed_variants = 0
+
+        self.sample_size = sample_size
+        self.sampling = bool(sample_size)
+        self.plugin_stats = {
+            name: {'calls': 0, 'time': 0.0} for name in self.plugin_names}
+        self.predicate_stats = [
+            {'evaluated': 0, 'passed': 0} for predicate in self.predicates]
+
+    def get_plugin_value(self, plugin_name, variant_dict, dict_key=None,
+                         individual_id=None):
+        """
+        Return the value of one plugin for a variant
+
+        Arguments:
+            plugin_name (str): The name of the plugin
+            variant_dict (dict): A variant dictionary
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Returns:
+            The value from Plugin.get_value
+        """
+        csq_entries = None
+        if plugin_name in self.csq_plugins:
+            csq_entries = self.get_csq_entries(variant_dict)
+        parsed_dict_entry = None
+        if plugin_name in self.dict_entry_plugins:
+            parsed_dict_entry = self.get_dict_entries(plugin_name, variant_dict)
+
+        return self.plugins[plugin_name].get_value(
+            variant_dict=variant_dict,
+            vcf_header=self.header.header,
+            csq_format=self.header.csq_format,
+            dict_key=dict_key,
+            individual_id=individual_id,
+            csq_entries=csq_entries,
+            converter=self.get_converter(plugin_name),
+            parsed_dict_entry=parsed_dict_entry
+        )
+
+    def get_converter(self, plugin_name):
+        """
+        Return the converter of a plugin
+
+        The converters are built again if more INFO lines have been parsed.
+
+        Arguments:
+            plugin_name (str): The name of the plugin
+
+        Returns:
+            converter (Converter): Or None for plugins that are not numbers
+        """
+        if self.converter_info_size != len(self.header.info_dict):
+            self.build_converters()
+        return self.converters.get(plugin_name)
+
+    def build_converters(self):
+        """
+        Pick the converter of each plugin from the INFO lines of the header
+
+        The malformed counts are kept if the converters are built again.
+        """
+        old_converters = self.converters or {}
+        self.converters = {}
+        for name in self.plugin_names:
+            converter = get_converter(self.plugins[name], self.header.info_dict)
+            if converter is None:
+                continue
+            if name in old_converters:
+                converter.malformed = old_converters[name].malformed
+            self.converters[name] = converter
+        self.converter_info_size = len(self.header.info_dict)
+
+    def malformed_values(self):
+        """
+        Return the number of malformed values of each plugin
+
+        A value is malformed if a float or integer plugin can not convert it
+        and it is not missing, like 'abc' for a float.
+
+        Returns:
+            malformed (dict): Plugin names as keys and counts as values, only
+                              plugins with malformed values are included
+        """
+        malformed = {}
+        for name, converter in (self.converters or {}).items():
+            if converter.malformed:
+                malformed[name] = converter.malformed
+        return malformed
+
+    def get_csq_entries(self, variant_dict):
+        """
+        Return the splitted CSQ annotation of a variant
+
+        The annotation is splitted the first time it is asked for and then
+        kept by the engine until another annotation is asked for, so all CSQ
+        plugins of a variant share the result.
+
+        Arguments:
+            variant_dict (dict): A variant dictionary
+
+        Returns:
+            csq_entries (list): The CSQ annotation splitted on ',' and '|' or
+                                None if the variant has no CSQ annotation
+        """
+        raw_entry = variant_dict.get('info_dict', {}).get('CSQ')
+        if not raw_entry:
+            return None
+        last_raw_entry, csq_entries = self.last_csq
+        if raw_entry is not last_raw_entry and raw_entry != last_raw_entry:
+            csq_entries = split_csq(raw_entry)
+            self.last_csq = (raw_entry, csq_entries)
+        return csq_entries
+
+    def get_dict_entries(self, plugin_name, variant_dict):
+        """
+        Return the parsed annotation of a dict_entry plugin for a variant
+
+        The annotation is parsed the first time it is asked for and then
+        kept by the engine until another annotation is asked for, so all
+        plugins that read the annotation with the same separators share the
+        result.
+
+        Arguments:
+            plugin_name (str): The name of a dict_entry plugin
+            variant_dict (dict): A variant dictionary
+
+        Returns:
+            parsed_dict_entry (tuple): See Plugin.parse_dict_entry, or None if
+                                       the variant has no annotation
+        """
+        plugin = self.plugins[plugin_name]
+        raw_entry = variant_dict.get('info_dict', {}).get(plugin.info_key)
+        if not raw_entry:
+            return None
+        key = (plugin.info_key,) + tuple(plugin.separators[:2])
+        last_raw_entry, parsed_dict_entry = self.last_dict_entries.get(
+            key, (None, None))
+        if raw_entry is not last_raw_entry and raw_entry != last_raw_entry:
+            parsed_dict_entry = plugin.parse_dict_entry(raw_entry)
+            self.last_dict_entries[key] = (raw_entry, parsed_dict_entry)
+        return parsed_dict_entry
+
+    def get_values(self, variant_line=None, variant_dict=None, dict_key=None,
+                   individual_id=None, known_values=None):
+        """
+        Return the values of all plugins for a variant
+
+        If the variant does not pass the filter None is returned and the
+        remaining plugins are never evaluated.
+
+        Arguments:
+            variant_line (str): A vcf variant line
+            variant_dict (dict): A variant dictionary
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+            known_values (dict): Values of plugins that are already known,
+                                 like from vectorized.py, these plugins are
+                                 not evaluated
+
+        Returns:
+            values (dict): A dictionary with plugin names as keys and the
+                           plugin values as values or None
+        """
+        if variant_dict is None:
+            variant_dict = get_variant_dict(variant_line, self.header.header)
+
+        if self.sampling:
+            return self.sample_values(
+                variant_dict, dict_key, individual_id, known_values)
+
+        self.variants += 1
+        values = dict(known_values) if known_values else {}
+
+        for predicate in self.predicates:
+            name = predicate.plugin_name
+            if name not in values:
+                values[name] = self.get_plugin_value(
+                    name, variant_dict, dict_key, individual_id)
+            if not predicate.evaluate(values[name]):
+                return None
+
+        self.passed_variants += 1
+
+        for name in self.remaining_plugins:
+            if name not in values:
+                values[name] = self.get_plugin_value(
+                    name, variant_dict, dict_key, individual_id)
+
+        return values
+
+    def sample_values(self, variant_dict, dict_key=None, individual_id=None,
+                      known_values=None):
+        """
+        Return the values of all plugins for a variant while measuring cost
+        and selectivity
+
+        All predicates are evaluated so that the selectivity of each one is
+        known. When sample_size variants are seen the predicates are reordered.
+
+        Arguments:
+            variant_dict (dict): A variant dictionary
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+            known_values (dict): Values of plugins that are already known
+
+        Returns:
+            values (dict): Same as get_values
+        """
+        self.variants += 1
+        values = dict(known_values) if known_values else {}
+
+        def timed_value(name):
+            start = default_timer()
+            value = self.get_plugin_value(
+                name, variant_dict, dict_key, individual_id)
+            self.plugin_stats[name]['time'] += default_timer() - start
+            self.plugin_stats[name]['calls'] += 1
+            return value
+
+        passed = True
+        for predicate, stats in zip(self.predicates, self.predicate_stats):
+            name = predicate.plugin_name
+            if name not in values:
+                values[name] = timed_value(name)
+            stats['evaluated'] += 1
+            if predicate.evaluate(values[name]):
+                stats['passed'] += 1
+            else:
+                passed = False
+
+        if passed:
+            self.passed_variants += 1
+            for name in self.remaining_plugins:
+                if name not in values:
+                    values[name] = timed_value(name)
+
+        if self.variants >= self.sample_size:
+            self.sampling = False
+            self.reorder()
+
+        if passed:
+            return values
+        return None
+
+    def get_rank(self, predicate_index):
+        """
+        Return the rank of a predicate, predicates with low rank are
+        evaluated first.
+
+        The rank is the cost of the predicate divided by the fraction of
+        variants that it removes.
+
+        Arguments:
+            predicate_index (int): The index of the predicate
+
+        Returns:
+            rank (float)
+        """
+        predicate = self.predicates[predicate_index]
+        stats = self.predicate_stats[predicate_index]
+        plugin_stats = self.plugin_stats[predicate.plugin_name]
+
+        if not plugin_stats['calls'] or not stats['evaluated']:
+            return float('inf')
+
+        cost = plugin_stats['time'] / plugin_stats['calls']
+        removed = 1 - float(stats['passed']) / stats['evaluated']
+        if removed == 0:
+            return float('inf')
+
+        return cost / removed
+
+    def reorder(self):
+        """
+        Sort the predicates on the cost and selectivity measured so far
+        """
+        order = sorted(range(len(self.predicates)), key=self.get_rank)
+        self.predicates = [self.predicates[i] for i in order]
+        self.predicate_stats = [self.predicate_stats[i] for i in order]
+
+        self.logger.info("Filter order after {0} variants: {1}".format(
+            self.variants,
+            ', '.join(predicate.plugin_name for predicate in self.predicates)))
+        for line in self.report():
+            self.logger.info(line)
+
+    def report(self):
+        """
+        Return the measured cost and selectivity, one line per plugin
+
+        Predicates are reported first in the order they are evaluated
+
+        Returns:
+            lines (list): A list with strings
+        """
+        lines = []
+        for predicate, stats in zip(self.predicates, self.predicate_stats):
+            plugin_stats = self.plugin_stats[predicate.plugin_name]
+            condition = predicate.plugin_name
+            if predicate.op:
+                condition = "{0} {1} {2}".format(
+                    predicate.plugin_name, predicate.op, predicate.value)
+            lines.append(
+                "filter {0}: calls={1} time={2:.6f}s passed={3}/{4}".format(
+                    condition, plugin_stats['calls'], plugin_stats['time'],
+                    stats['passed'], stats['evaluated']))
+        for name in self.remaining_plugins:
+            plugin_stats = self.plugin_stats[name]
+            lines.append("plugin {0}: calls={1} time={2:.6f}s".format(
+                name, plugin_stats['calls'], plugin_stats['time']))
+        return lines
+
+    def extract(self, vcf_lines, dict_key=None, individual_id=None):
+        """
+        Run the plugins on all variants in a vcf
+
+        Header lines are used to collect the vcf header and csq format.
+
+        Arguments:
+            vcf_lines (iterable): An iterable with vcf lines, like a file handle
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Yields:
+            (variant_dict, values): For each variant that passes the filter
+        """
+        for line in vcf_lines:
+            if line.startswith('#'):
+                self.header.parse_line(line)
+                continue
+            if not line.strip():
+                continue
+
+            variant_dict = get_variant_dict(line, self.header.header)
+            values = self.get_values(
+                variant_dict=variant_dict,
+                dict_key=dict_key,
+                individual_id=individual_id
+            )
+            if values is not None:
+                yield variant_dict, values
+
+        # extract is called once per chunk by Pipeline and aextract, the
+        # summary of the whole run is logged with log_summary
+        self.logger.debug("{0} of {1} variants passed the filter".format(
+            self.passed_variants, self.variants))
+
+    def log_summary(self):
+        """
+        Log the number of variants that passed the filter and the number of
+        malformed values of each plugin
+
+        Call this once at the end of a run.
+        """
+        self.logger.info("{0} of {1} variants passed the filter".format(
+            self.passed_variants, self.variants))
+        malformed = self.malformed_values()
+        for name in malformed:
+            self.logger.warning("{0} malformed values in plugin {1}".format(
+                malformed[name], name))
+
+    def extract_rows(self, vcf_lines, dict_key=None, individual_id=None):
+        """
+        Run the plugins on all variants in a vcf and yield compact rows
+
+        A row is a tuple with the chromosome, the position and the plugin
+        values in the order of row_fields. Rows use much less memory than a
+        variant dictionary and a dictionary of values, use them when many
+        variants are kept in memory.
+
+        Arguments:
+            vcf_lines (iterable): An iterable with vcf lines, like a file handle
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Yields:
+            row (tuple): (CHROM, POS, value, ...) for each variant that passes
+                         the filter
+        """
+        plugin_names = self.plugin_names
+        for variant_dict, values in self.extract(
+                vcf_lines, dict_key=dict_key, individual_id=individual_id):
+            yield (variant_dict['CHROM'], variant_dict['POS']) + tuple(
+                values[name] for name in plugin_names)
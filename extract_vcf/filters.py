@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+filters.py
+
+Filters are conditions on the values that the plugins return. A filter is a
+list of predicates that all have to be true for a variant to pass, like:
+
+    1000G <= 0.01 and Filter == PASS
+
+The engine evaluates the predicates before any other plugin, so a variant
+that fails a predicate will not be sent to the remaining plugins.
+"""
+
+from __future__ import print_function
+
+import logging
+import operator
+import re
+
+from validate import ValidateError
+
+logger = logging.getLogger(__name__)
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# Quoted values are matched as one token so an 'and' in them is kept
+token_pattern = re.compile(
+    r'''(?P<quoted>"[^"]*"|'[^']*')|(?P<and>\band\b)''', re.IGNORECASE)
+
+clause_pattern = re.compile(
+    r'^(?P<name>[^\s<>=!]+)\s*(?P<op><=|>=|==|!=|<|>)\s*(?P<value>.+)$')
+
+
+class Predicate(object):
+    """Class for holding a condition on the value of a plugin"""
+    __slots__ = ('plugin_name', 'op', 'value', 'keep_missing')
+
+    def __init__(self, plugin_name, op=None, value=None, keep_missing=False):
+        """
+        A predicate compares the value of a plugin with a given value.
+        If no operator is given the predicate is true if the plugin
+        returns a value, this is what one would use for flags.
+
+        Arguments:
+            plugin_name (str): The name of the plugin to check
+            op (str): Anyone of ['<', '<=', '>', '>=', '==', '!=']
+            value: The value to compare with
+            keep_missing (bool): If variants where the plugin returns None
+                                 should pass
+        """
+        super(Predicate, self).__init__()
+        if op is not None and op not in OPERATORS:
+            raise ValidateError(
+                "Filter operators have to be in {0}\n"
+                "Wrong operator for plugin: {1}".format(
+                    list(OPERATORS.keys()), plugin_name)
+            )
+        self.plugin_name = plugin_name
+        self.op = op
+        self.value = value
+        self.keep_missing = keep_missing
+
+    def evaluate(self, value):
+        """
+        Check if a plugin value fulfills the predicate
+
+        Arguments:
+            value: The value returned by the plugin
+
+        Returns:
+            bool: True if the value passes the predicate
+        """
+        if value is None:
+            return self.keep_missing
+
+        if self.op is None:
+            return bool(value)
+
+        try:
+            return OPERATORS[self.op](value, self.value)
+        except TypeError:
+            # Values of different types can not pass
+            return False
+
+    def __repr__(self):
+        return "Predicate(plugin_name={0},op={1},value={2},"\
+                "keep_missing={3})".format(self.plugin_name, self.op,
+                self.value, self.keep_missing)
+
+
+def convert_value(raw_value):
+    """
+    Convert a value from a filter expression to a number if possible
+
+    Arguments:
+        raw_value (str): ex. "0.01", "'PASS'"
+
+    Returns:
+        value: ex. 0.01, 'PASS'
+    """
+    raw_value = raw_value.strip()
+    if len(raw_value) > 1 and raw_value[0] == raw_value[-1] and raw_value[0] in '\'"':
+        return raw_value[1:-1]
+    try:
+        return int(raw_value)
+    except ValueError:
+        pass
+    try:
+        return float(raw_value)
+    except ValueError:
+        return raw_value
+
+
+def split_clauses(expression):
+    """
+    Split a filter expression on the 'and' words that are not quoted
+
+    Arguments:
+        expression (str): ex. 'Consequence == "splice and intron" and DB'
+
+    Returns:
+        clauses (list): ex. ['Consequence == "splice and intron"', 'DB']
+    """
+    clauses = []
+    start = 0
+    for match in token_pattern.finditer(expression):
+        if match.group('and'):
+            clauses.append(expression[start:match.start()].strip())
+            start = match.end()
+    clauses.append(expression[start:].strip())
+    return clauses
+
+
+def parse_filter(expression, keep_missing=None):
+    """
+    Parse a filter expression to a list of predicates
+
+    The expression is a number of clauses joined by 'and'. A clause is
+    either a comparison like "1000G <= 0.01" or a plugin name, like "DB",
+    that is true if the plugin returns a value.
+
+    Arguments:
+        expression (str): ex. "1000G <= 0.01 and Filter == PASS"
+        keep_missing (list): Names of plugins where variants without a
+                             value should pass
+
+    Returns:
+        predicates (list): A list with Predicate objects
+    """
+    if keep_missing is None:
+        keep_missing = []
+    predicates = []
+    for clause in split_clauses(expression):
+        if not clause:
+            raise ValidateError("Empty clause in filter: {0}".format(expression))
+
+        match = clause_pattern.match(clause)
+        if match:
+            name = match.group('name')
+            predicate = Predicate(
+                plugin_name=name,
+                op=match.group('op'),
+                value=convert_value(match.group('value')),
+                keep_missing=name in keep_missing
+            )
+        elif re.match(r'^[^\s<>=!]+$', clause):
+            predicate = Predicate(
+                plugin_name=clause,
+                keep_missing=clause in keep_missing
+            )
+        else:
+            raise ValidateError("Malformed filter clause: {0}".format(clause))
+
+        logger.debug("Adding predicate {0}".format(predicate))
+        predicates.append(predicate)
+
+    return predicates
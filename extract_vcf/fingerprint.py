@@ -0,0 +1,138 @@
+"""
+Fingerprints are short hashes that identify a vcf file or the definition of
+a plugin. Two plugins with the same fingerprint will return the same values
+for the same variants.
+"""
+
+import hashlib
+import json
+
+# The plugin attributes that decide what value a plugin returns
+PLUGIN_ATTRIBUTES = ['field', 'data_type', 'separators', 'info_key', 'csq_key',
+                     'record_rule', 'gt_key', 'string_rules', 'dict_entry',
+                     'lower_bound', 'upper_bound']
+
+
+def get_plugin_definition(plugin):
+    """
+    Return the attributes that define a plugin
+
+    Arguments:
+        plugin (Plugin): A plugin
+
+    Returns:
+        definition (dict)
+    """
+    definition = {}
+    for attribute in PLUGIN_ATTRIBUTES:
+        value = getattr(plugin, attribute, None)
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+        elif isinstance(value, dict):
+            value = dict(value)
+        definition[attribute] = value
+    return definition
+
+
+def get_plugin_fingerprint(plugin, **options):
+    """
+    Return a fingerprint of the definition of a plugin
+
+    The name of the plugin is not part of the fingerprint.
+
+    Arguments:
+        plugin (Plugin): A plugin
+        options: Arguments that change the values, like individual_id
+
+    Returns:
+        fingerprint (str): A hex digest
+    """
+    definition = get_plugin_definition(plugin)
+    definition['options'] = options
+    return hashlib.sha1(
+        json.dumps(definition, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def get_config_fingerprint(plugins, **options):
+    """
+    Return a fingerprint of a set of plugins, like ConfigParser.plugins
+
+    Arguments:
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        options: Arguments that change the values, like individual_id
+
+    Returns:
+        fingerprint (str): A hex digest
+    """
+    fingerprints = [
+        [name, get_plugin_fingerprint(plugins[name], **options)]
+        for name in sorted(plugins)
+    ]
+    return hashlib.sha1(
+        json.dumps(fingerprints).encode('utf-8')).hexdigest()
+
+
+def get_file_fingerprint(path, block_size=1 << 20):
+    """
+    Return a fingerprint of the content of a file
+
+    Arguments:
+        path (str): Path to a file
+        block_size (int): Number of bytes to read at a time
+
+    Returns:
+        fingerprint (str): A hex digest
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as handle:
+        block = handle.read(block_size)
+        while block:
+            digest.update(block)
+            block = handle.read(block_size)
+    return digest.hexdigest()
+
+
+def diff_fingerprints(old_fingerprints, new_fingerprints):
+    """
+    Compare two sets of plugin fingerprints
+
+    Arguments:
+        old_fingerprints (dict): Plugin names as keys and fingerprints as values
+        new_fingerprints (dict): Plugin names as keys and fingerprints as values
+
+    Returns:
+        diff (dict): A dictionary with the plugin names that are 'added',
+                     'changed', 'removed' and 'unchanged'
+    """
+    diff = {'added': [], 'changed': [], 'removed': [], 'unchanged': []}
+    for name in new_fingerprints:
+        if name not in old_fingerprints:
+            diff['added'].append(name)
+        elif old_fingerprints[name] != new_fingerprints[name]:
+            diff['changed'].append(name)
+        else:
+            diff['unchanged'].append(name)
+    for name in old_fingerprints:
+        if name not in new_fingerprints:
+            diff['removed'].append(name)
+    return diff
+
+
+def diff_plugins(old_plugins, new_plugins):
+    """
+    Compare two sets of plugins, like the plugins of two ConfigParsers
+
+    A plugin is changed if anything that decides its values has changed.
+
+    Arguments:
+        old_plugins (dict): Plugin names as keys and Plugin objects as values
+        new_plugins (dict): Plugin names as keys and Plugin objects as values
+
+    Returns:
+        diff (dict): Same as diff_fingerprints
+    """
+    return diff_fingerprints(
+        {name: get_plugin_fingerprint(old_plugins[name]) for name in old_plugins},
+        {name: get_plugin_fingerprint(new_plugins[name]) for name in new_plugins},
+    )
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+follow.py
+
+Follow a vcf that a variant caller is still writing, like 'tail -f'.
+
+Only complete lines are processed, a line that is still being written is
+left until its newline has arrived. The engine, the plugins and the header
+are kept between polls, so new variants are extracted as soon as they are
+seen:
+
+    follower = VcfFollower("calls.vcf", configs.plugins)
+    for variant_dict, values in follower.follow():
+        print(values)
+
+A poll reads at most batch_size lines. The offset after a batch is saved in
+'calls.vcf.offset' when the batch has been delivered, that is when follow
+has yielded all of its variants, at the next poll or when the follower is
+closed. A new follower on the same file starts from the saved offset, so
+variants are not extracted twice after a restart, and a batch that was
+never delivered is extracted again.
+
+Plain text and bgzipped files can be followed, a bgzipped file is read block
+by block as the blocks are written. Files compressed with plain gzip can not
+be followed.
+"""
+
+from __future__ import print_function
+
+import io
+import logging
+import os
+import threading
+import time
+
+from extract_vcf.bgzf import BgzfReader, is_bgzf
+from extract_vcf.checkpoint import (CHECKPOINT_VERSION, read_checkpoint,
+                                    write_checkpoint)
+from extract_vcf.engine import Engine
+from extract_vcf.get_annotations import get_variant_dict
+from extract_vcf.header_parser import HeaderParser
+
+
+def open_follow_reader(path):
+    """
+    Open a vcf for following
+
+    Arguments:
+        path (str): Path to a plain or bgzipped vcf
+
+    Returns:
+        reader: A handle with readline, tell, seek and close or None if a
+                bgzipped file does not have a complete first block yet
+    """
+    if path.endswith('.gz'):
+        if os.path.getsize(path) < 18:
+            return None
+        if not is_bgzf(path):
+            raise ValueError("Only plain and bgzipped vcfs can be followed, "
+                             "{0} is compressed with gzip".format(path))
+        return BgzfReader(path)
+    return io.open(path, 'rb')
+
+
+def iter_complete_lines(reader):
+    """
+    Yield the complete lines from the current position of a reader
+
+    A line without newline is not read, the reader is left at its start.
+
+    Arguments:
+        reader: From open_follow_reader
+
+    Yields:
+        (line, offset): The line and the offset after it
+    """
+    while True:
+        position = reader.tell()
+        line = reader.readline()
+        if not line.endswith(b'\n'):
+            reader.seek(position)
+            return
+        yield line, reader.tell()
+
+
+class VcfFollower(object):
+    """Class for extracting values from a growing vcf"""
+    def __init__(self, path, plugins, filters=None, offset_path=None,
+                 poll_interval=0.5, dict_key=None, individual_id=None,
+                 batch_size=10000):
+        """
+        Arguments:
+            path (str): Path to a plain or bgzipped vcf
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            filters (str or list): A filter expression, see Engine
+            offset_path (str): Where the offset is saved, the vcf path with
+                               '.offset' added if None
+            poll_interval (float): Seconds to wait when there are no new lines
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+            batch_size (int): The largest number of lines read in a poll
+        """
+        super(VcfFollower, self).__init__()
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self.offset_path = offset_path or path + '.offset'
+        self.poll_interval = poll_interval
+        self.dict_key = dict_key
+        self.individual_id = individual_id
+        self.batch_size = batch_size
+
+        self.header = HeaderParser()
+        self.engine = Engine(plugins, filters=filters, header=self.header)
+
+        self.reader = None
+        self.offset = 0
+        self.records = 0
+        self.load_offset()
+        self.saved_offset = self.offset
+        self.saved_records = self.records
+
+    def load_offset(self):
+        """Start from the saved offset, if there is one"""
+        saved = read_checkpoint(self.offset_path)
+        if saved is None:
+            return
+        if saved.get('vcf') != os.path.abspath(self.path):
+            raise ValueError("The offset in {0} is for another vcf: {1}".format(
+                self.offset_path, saved.get('vcf')))
+        self.offset = saved['offset']
+        self.records = saved['records']
+        self.logger.info("Following {0} from variant {1}".format(
+            self.path, self.records))
+
+    def save_offset(self):
+        """Save the offset after the last delivered batch, if it has moved"""
+        if self.offset == self.saved_offset:
+            return
+        write_checkpoint(self.offset_path, {
+            'checkpoint_version': CHECKPOINT_VERSION,
+            'vcf': os.path.abspath(self.path),
+            'offset': self.offset,
+            'records': self.records,
+        })
+        self.saved_offset = self.offset
+        self.saved_records = self.records
+
+    def rewind(self):
+        """Go back to the saved offset, the batch after it is read again"""
+        self.offset = self.saved_offset
+        self.records = self.saved_records
+        if self.reader is not None:
+            self.reader.seek(self.offset)
+
+    def open(self):
+        """
+        Open the vcf and move to the saved offset
+
+        Returns:
+            bool: False if the vcf can not be read yet
+        """
+        if not os.path.exists(self.path):
+            return False
+        reader = open_follow_reader(self.path)
+        if reader is None:
+            return False
+        if isinstance(reader, io.BufferedReader) and \
+                os.path.getsize(self.path) < self.offset:
+            reader.close()
+            raise ValueError("{0} is shorter than the saved offset, remove {1} "
+                             "to start over".format(self.path, self.offset_path))
+        if self.offset:
+            # The header lines before the offset are parsed again
+            for line, offset in iter_complete_lines(reader):
+                if offset > self.offset or not line.startswith(b'#'):
+                    break
+                self.header.parse_line(line.decode('utf-8'))
+            reader.seek(self.offset)
+        self.reader = reader
+        return True
+
+    def poll(self):
+        """
+        Extract the variants that were added since the last poll
+
+        At most batch_size lines are read. The previous batch counts as
+        delivered, so its offset is saved first.
+
+        Returns:
+            variants (list): A list of (variant_dict, values) for the new
+                             variants that pass the filter
+        """
+        self.save_offset()
+        variants = []
+        if self.reader is None and not self.open():
+            return variants
+
+        lines = 0
+        for line, offset in iter_complete_lines(self.reader):
+            self.offset = offset
+            lines += 1
+            if line.startswith(b'#'):
+                self.header.parse_line(line.decode('utf-8'))
+            elif line.strip():
+                variant_dict = get_variant_dict(line.decode('utf-8'),
+                                                self.header.header)
+                values = self.engine.get_values(
+                    variant_dict=variant_dict,
+                    dict_key=self.dict_key,
+                    individual_id=self.individual_id
+                )
+                self.records += 1
+                if values is not None:
+                    variants.append((variant_dict, values))
+            if lines >= self.batch_size:
+                break
+        return variants
+
+    def follow(self, stop_event=None, idle_timeout=None):
+        """
+        Yield new variants as they are written
+
+        Arguments:
+            stop_event (threading.Event): Stop when the event is set
+            idle_timeout (float): Stop after this many seconds without new
+                                  lines, follow forever if None
+
+        Yields:
+            (variant_dict, values): For each new variant that passes the
+                                    filter
+        """
+        if stop_event is None:
+            stop_event = threading.Event()
+        last_change = time.time()
+        while not stop_event.is_set():
+            offset = self.offset
+            try:
+                for variant in self.poll():
+                    yield variant
+            except GeneratorExit:
+                # The consumer stopped in the middle of a batch
+                self.rewind()
+                raise
+            # All variants of the batch have been taken by the consumer
+            self.save_offset()
+            if self.offset != offset:
+                last_change = time.time()
+                continue
+            if idle_timeout is not None and \
+                    time.time() - last_change >= idle_timeout:
+                break
+            stop_event.wait(self.poll_interval)
+
+    def close(self, save=True):
+        """
+        Close the vcf
+
+        Arguments:
+            save (bool): Save the offset of the last batch, False if the batch
+                         was not delivered
+        """
+        if save:
+            self.save_offset()
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The last batch is extracted again if it could not be handled
+        self.close(save=exc_type is None)
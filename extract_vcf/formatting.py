@@ -0,0 +1,24 @@
+"""
+Functions for writing plugin values as text, shared by the tab separated
+outputs of distributed.py and checkpoint.py.
+"""
+
+# Written for values that are None
+MISSING = '.'
+
+
+def format_value(value):
+    """
+    Return a plugin value as a string for a tab separated file
+
+    Arguments:
+        value: A value returned by a plugin
+
+    Returns:
+        text (str): MISSING for None and '1' for a flag that is set
+    """
+    if value is None:
+        return MISSING
+    if value is True:
+        return '1'
+    return str(value)
@@ -2,6 +2,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+VCF_COLUMNS = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO',
+               'FORMAT']
+
 
 def split_strings(string, separators):
     """
@@ -46,3 +49,85 @@ def split_strings(string, separators):
         results = [string]
     
     return results
+
+def iter_split_strings(string, separators):
+    """
+    Split a string with arbitrary number of separators.
+    Same as split_strings but the values are yielded one at a time
+    
+    Arguments:
+        string (str): ex. "a:1|2,b:2"
+        separators (list): ex. [',',':','|']
+    
+    Yields:
+         value (str) : ex. 'a', '1', '2', 'b', '2'
+    """
+    if len(separators) == 0:
+        yield string
+    elif len(separators) == 1:
+        for value in string.split(separators[0]):
+            yield value
+    else:
+        for splitted_string in string.split(separators[0]):
+            for value in iter_split_strings(splitted_string, separators[1:]):
+                yield value
+
+def split_csq(raw_entry):
+    """
+    Split a vep CSQ annotation into transcripts and columns.
+    CSQ entries are allways splitted on ',' and the columns on '|'
+    
+    Arguments:
+        raw_entry (str): ex. "G|ADK|intron,G|ADK|missense"
+    
+    Returns:
+        csq_entries (list): ex. [['G','ADK','intron'],['G','ADK','missense']]
+    """
+    return [csq_entry.split('|') for csq_entry in raw_entry.split(',')]
+
+def get_info_dict(info_string):
+    """
+    Convert the INFO field of a vcf line to a dictionary.
+    Flags will get an empty list as value.
+    
+    Arguments:
+        info_string (str): ex. "MQ=1;DB;CADD=12.5"
+    
+    Returns:
+        info_dict (dict): ex. {'MQ': '1', 'DB': [], 'CADD': '12.5'}
+    """
+    info_dict = {}
+    for info_entry in info_string.split(';'):
+        splitted_info = info_entry.split('=', 1)
+        if len(splitted_info) > 1:
+            info_dict[splitted_info[0]] = splitted_info[1]
+        else:
+            info_dict[splitted_info[0]] = []
+    
+    return info_dict
+
+def get_variant_dict(variant_line, header_line):
+    """
+    Build a variant dictionary from a vcf variant line. 
+    The dictionary has the same format as the plugins expect, that is the 
+    vcf columns, the genotype calls for each sample and the 'info_dict'.
+    
+    Arguments:
+        variant_line (str): A vcf formated variant line
+        header_line (list): A list with the vcf header line. If empty the
+                            nine standard vcf columns are assumed
+    
+    Returns:
+        variant_dict (dict): A dictionary with the variant information
+    """
+    if not header_line:
+        header_line = VCF_COLUMNS
+    
+    splitted_line = variant_line.rstrip().split('\t')
+    if len(splitted_line) < 8:
+        splitted_line = variant_line.rstrip().split()
+    
+    variant_dict = dict(zip(header_line, splitted_line))
+    variant_dict['info_dict'] = get_info_dict(variant_dict.get('INFO', '.'))
+    
+    return variant_dict
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+header_parser.py
+
+Collect the information from the header of a vcf file that the plugins need
+to extract values, that is the sample ids from the '#CHROM' line and the
+CSQ format from the vep annotation.
+"""
+
+from __future__ import print_function
+
+import logging
+import re
+
+
+# A key and a value in a structured metadata line, the value is quoted, with
+# escaped characters, or ends at the next comma
+attribute_pattern = re.compile(r'''
+    \s*(?P<key>[^=,\s]+)\s*=\s*
+    (?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<value>[^,]*))
+    \s*(?:,|$)
+    ''', re.VERBOSE)
+
+
+def parse_structured_line(line):
+    """
+    Parse the attributes of a line like '##INFO=<ID=DP,Number=1,...>'
+
+    The attributes can come in any order and quoted values can hold commas
+    and escaped quotes.
+
+    Arguments:
+        line (str): A metadata line
+
+    Returns:
+        attributes (dict): The attributes with quotes and escapes removed, or
+                           None if the line is malformed
+    """
+    start = line.find('=<')
+    if start == -1 or not line.endswith('>'):
+        return None
+    content = line[start + 2:-1]
+    attributes = {}
+    position = 0
+    while position < len(content):
+        match = attribute_pattern.match(content, position)
+        if not match or match.end() == position:
+            return None
+        value = match.group('value')
+        if match.group('quoted') is not None:
+            value = re.sub(r'\\(.)', r'\1', match.group('quoted'))
+        else:
+            value = value.strip()
+        attributes[match.group('key')] = value
+        position = match.end()
+    return attributes
+
+
+class HeaderParser(object):
+    """Class for holding information from the header of a vcf file"""
+    def __init__(self):
+        super(HeaderParser, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        self.metadata_lines = []
+        self.info_lines = []
+        self.info_dict = {}
+        self.contig_lines = []
+        self.contig_dict = {}
+        self.header = []
+        self.individuals = []
+        self.csq_format = []
+
+    def parse_meta_data(self, line):
+        """
+        Parse a vcf metadata line
+
+        INFO and contig lines that can not be parsed are logged and skipped.
+
+        Arguments:
+            line (str): A line that starts with '##'
+        """
+        line = line.rstrip()
+        self.metadata_lines.append(line)
+
+        if line.startswith('##INFO='):
+            attributes = parse_structured_line(line)
+            if attributes is None or not all(
+                    key in attributes for key in ['ID', 'Number', 'Type']):
+                self.logger.warning(
+                    "Skipping a malformed INFO line: {0}".format(line))
+                return
+
+            self.info_lines.append(line)
+            self.info_dict[attributes['ID']] = {
+                'Number': attributes['Number'],
+                'Type': attributes['Type'],
+                'Description': attributes.get('Description', ''),
+            }
+
+            if attributes['ID'] == 'CSQ':
+                # The vep annotation is described as "... Format: A|B|C"
+                self.csq_format = attributes.get('Description', '').split(
+                    'Format:')[-1].strip().split('|')
+                self.logger.debug("Found csq format: {0}".format(
+                    self.csq_format))
+
+        elif line.startswith('##contig='):
+            attributes = parse_structured_line(line)
+            if attributes is None or 'ID' not in attributes:
+                self.logger.warning(
+                    "Skipping a malformed contig line: {0}".format(line))
+                return
+
+            length = attributes.get('length')
+            if length is not None and not re.match(r'^-?\d+$', length):
+                length = None
+            self.contig_lines.append(line)
+            self.contig_dict[attributes['ID']] = length
+
+    def parse_header_line(self, line):
+        """
+        Parse the vcf header line that starts with '#CHROM'
+
+        Arguments:
+            line (str): The header line
+        """
+        self.header = line[1:].rstrip().split('\t')
+        if len(self.header) < 9:
+            self.header = line[1:].rstrip().split()
+        self.individuals = self.header[9:]
+        self.logger.debug("Found individuals: {0}".format(
+            ', '.join(self.individuals)))
+
+    def parse_line(self, line):
+        """
+        Parse any header line, metadata or the '#CHROM' line
+
+        Arguments:
+            line (str): A line that starts with '#'
+        """
+        if line.startswith('##'):
+            self.parse_meta_data(line)
+        elif line.startswith('#'):
+            self.parse_header_line(line)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+parallel.py
+
+Run plugins on chunks of a vcf in a pool of threads or processes.
+
+Plugins can not be changed after they are created and keep no state between
+calls, so all threads share the same plugins. Each thread has its own
+Engine, since an engine keeps counters and is meant for one thread.
+
+The header is read first and compiled together with the plugins into an
+ExtractionPlan. Worker processes get the plan once, when the pool starts,
+so a task only carries a chunk of lines and returns the value columns.
+
+On a free-threaded python (3.13t and later, where sys._is_gil_enabled()
+is False) the threads run the plugins in parallel without the cost of
+sending lines and results between processes. With the GIL the process
+pool is usually faster:
+
+    for row in extract_parallel("file.vcf.gz", configs.plugins, workers=8,
+                                mode='thread'):
+        print(row)
+
+The rows are tuples like the ones from Engine.extract_rows and they are
+yielded in the order of the vcf.
+"""
+
+from __future__ import print_function
+
+import itertools
+import logging
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from six import string_types
+
+from extract_vcf.plan import ExtractionPlan, init_worker, run_worker_chunk
+from extract_vcf.reader import open_vcf, read_header
+
+logger = logging.getLogger(__name__)
+
+MODES = ['process', 'thread']
+
+
+def gil_enabled():
+    """Return True if the python interpreter runs with the GIL"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    if is_gil_enabled is None:
+        return True
+    return is_gil_enabled()
+
+
+def iter_chunks(vcf_lines, chunk_size):
+    """
+    Yield chunks of variant lines, empty lines are skipped
+
+    Arguments:
+        vcf_lines (iterable): An iterable with vcf variant lines
+        chunk_size (int): Number of lines in each chunk
+
+    Yields:
+        chunk (list): Vcf variant lines
+    """
+    vcf_lines = iter(vcf_lines)
+    while True:
+        chunk = list(itertools.islice(vcf_lines, chunk_size))
+        if not chunk:
+            return
+        chunk = [line for line in chunk if line.strip()]
+        if chunk:
+            yield chunk
+
+
+def extract_parallel_columns(source, plugins, filters=None, workers=4,
+                             mode='thread', chunk_size=1000, max_pending=None,
+                             dict_key=None, individual_id=None):
+    """
+    Run plugins on all variants in a vcf with a pool of workers
+
+    Arguments:
+        source (str or iterable): Path to a vcf or an iterable with vcf lines
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        filters (str or list): A filter expression, see Engine
+        workers (int): Number of threads or processes
+        mode (str): 'thread' or 'process'
+        chunk_size (int): Number of vcf lines in each chunk
+        max_pending (int): Number of chunks that are submitted ahead of the
+                           consumer, 2 * workers if None
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+
+    Yields:
+        (row_fields, columns): The fields and one list of values per field,
+                               for each chunk
+    """
+    if mode not in MODES:
+        raise ValueError("Unknown mode {0}, use one of {1}".format(
+            mode, ', '.join(MODES)))
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    if mode == 'thread' and gil_enabled():
+        logger.debug("Running threads with the GIL enabled")
+
+    vcf_handle = source
+    if isinstance(source, string_types):
+        vcf_handle = open_vcf(source)
+
+    try:
+        header, variant_lines = read_header(vcf_handle)
+        plan = ExtractionPlan(
+            plugins,
+            filters=filters,
+            vcf_header=header.header,
+            csq_format=header.csq_format,
+            info_dict=header.info_dict,
+            dict_key=dict_key,
+            individual_id=individual_id
+        )
+        if mode == 'process':
+            executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=init_worker, initargs=(plan,))
+            run_chunk = run_worker_chunk
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+            run_chunk = plan.run_chunk
+
+        chunks = iter_chunks(variant_lines, chunk_size)
+        pending = deque()
+        try:
+            for chunk in itertools.islice(chunks, max_pending):
+                pending.append(executor.submit(run_chunk, chunk))
+            while pending:
+                columns = pending.popleft().result()
+                for chunk in itertools.islice(chunks, 1):
+                    pending.append(executor.submit(run_chunk, chunk))
+                yield plan.row_fields, columns
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown()
+    finally:
+        if vcf_handle is not source:
+            vcf_handle.close()
+
+
+def extract_parallel(source, plugins, **kwargs):
+    """
+    Run plugins on all variants in a vcf with a pool of workers
+
+    Arguments:
+        source (str or iterable): Path to a vcf or an iterable with vcf lines
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        kwargs: See extract_parallel_columns
+
+    Yields:
+        row (tuple): (CHROM, POS, value, ...) for each variant that passes
+                     the filter
+    """
+    for row_fields, columns in extract_parallel_columns(
+            source, plugins, **kwargs):
+        for row in zip(*columns):
+            yield row
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+pipeline.py
+
+A staged pipeline that overlaps reading, extraction and writing.
+
+The vcf is read and decompressed in a reader thread (zlib releases the GIL
+while it inflates), the plugins are run in the calling thread and the
+results are written in a writer thread. The stages are connected by
+bounded queues of chunks of lines, so a slow stage makes the others wait
+instead of filling the memory:
+
+    reader -> [line chunks] -> extraction -> [batches] -> writer
+
+    pipeline = Pipeline(configs.plugins, chunk_size=1000, queue_size=4)
+    with ArrowWriter("values.parquet", configs.plugins) as writer:
+        pipeline.run("file.vcf.gz", writer.write_variants)
+    print(pipeline.report())
+
+The report shows how much of the time each stage was busy, waiting for
+input and blocked on output. The stage that is busy most of the time is the
+bottleneck.
+"""
+
+from __future__ import print_function
+
+import itertools
+import logging
+import threading
+from timeit import default_timer
+
+from six import string_types
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from extract_vcf.engine import Engine
+from extract_vcf.reader import open_vcf
+
+# Marks the end of a queue
+END = object()
+
+
+class StageStats(object):
+    """Class for keeping the time a pipeline stage spends in each state"""
+    def __init__(self, name):
+        super(StageStats, self).__init__()
+        self.name = name
+        self.chunks = 0
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.blocked = 0.0
+
+    def get_occupancy(self, elapsed):
+        """
+        Return the fraction of the time the stage was busy
+
+        Arguments:
+            elapsed (float): The total run time in seconds
+
+        Returns:
+            occupancy (float)
+        """
+        if not elapsed:
+            return 0.0
+        return min(self.busy / elapsed, 1.0)
+
+    def report(self, elapsed):
+        """Return the statistics of the stage as a dictionary"""
+        return {
+            'chunks': self.chunks,
+            'busy': self.busy,
+            'waiting': self.waiting,
+            'blocked': self.blocked,
+            'occupancy': self.get_occupancy(elapsed),
+        }
+
+
+class Pipeline(object):
+    """Class for running plugins on a vcf with overlapped stages"""
+    def __init__(self, plugins, filters=None, chunk_size=1000, queue_size=4,
+                 dict_key=None, individual_id=None):
+        """
+        Arguments:
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            filters (str or list): A filter expression, see Engine
+            chunk_size (int): Number of vcf lines in each chunk
+            queue_size (int): Number of chunks that each queue can hold
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+        """
+        super(Pipeline, self).__init__()
+        self.logger = logging.getLogger(__name__)
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1")
+
+        self.plugins = plugins
+        self.filters = filters
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+        self.dict_key = dict_key
+        self.individual_id = individual_id
+
+        self.engine = None
+        self.elapsed = 0.0
+        self.stages = {}
+        self.queue_depths = {}
+        self.queue_stats = {}
+        self.stop_event = threading.Event()
+        self.errors = []
+
+    def put(self, chunk_queue, item, stats):
+        """
+        Put an item on a queue, wait while the queue is full
+
+        Returns:
+            bool: False if the pipeline was stopped before the item was put
+        """
+        start = default_timer()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.1)
+                except queue.Full:
+                    continue
+                depths = self.queue_depths[chunk_queue]
+                depths.append(chunk_queue.qsize())
+                return True
+            return False
+        finally:
+            stats.blocked += default_timer() - start
+
+    def get(self, chunk_queue, stats):
+        """
+        Get an item from a queue, wait while the queue is empty
+
+        Returns:
+            item: The item or END if the pipeline was stopped
+        """
+        start = default_timer()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    return chunk_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return END
+        finally:
+            stats.waiting += default_timer() - start
+
+    def fail(self, error):
+        """Keep an error from a stage and stop the other stages"""
+        self.errors.append(error)
+        self.stop_event.set()
+
+    def read(self, source, line_queue):
+        """Read chunks of lines from the source to the line queue"""
+        stats = self.stages['reader']
+        handle = None
+        try:
+            start = default_timer()
+            if isinstance(source, string_types):
+                handle = open_vcf(source)
+                lines = iter(handle)
+            else:
+                lines = iter(source)
+            while True:
+                chunk = list(itertools.islice(lines, self.chunk_size))
+                stats.busy += default_timer() - start
+                if not chunk:
+                    break
+                stats.chunks += 1
+                if not self.put(line_queue, chunk, stats):
+                    return
+                start = default_timer()
+        except Exception as error:
+            self.fail(error)
+        finally:
+            if handle is not None:
+                handle.close()
+        self.put(line_queue, END, stats)
+
+    def write(self, batch_queue, write):
+        """Pass the batches from the batch queue to write"""
+        stats = self.stages['writer']
+        while True:
+            batch = self.get(batch_queue, stats)
+            if batch is END:
+                break
+            start = default_timer()
+            try:
+                write(batch)
+            except Exception as error:
+                self.fail(error)
+                break
+            stats.busy += default_timer() - start
+            stats.chunks += 1
+
+    def run(self, source, write):
+        """
+        Run the plugins on all variants in a vcf
+
+        Arguments:
+            source (str or iterable): Path to a vcf or an iterable with vcf
+                                      lines
+            write (callable): Called in the writer thread with each batch, a
+                              list of (variant_dict, values), like
+                              ArrowWriter.write_variants
+
+        Returns:
+            report (dict): See report
+        """
+        self.engine = Engine(self.plugins, filters=self.filters)
+        self.stages = {
+            'reader': StageStats('reader'),
+            'extraction': StageStats('extraction'),
+            'writer': StageStats('writer'),
+        }
+        self.stop_event.clear()
+        self.errors = []
+
+        line_queue = queue.Queue(maxsize=self.queue_size)
+        batch_queue = queue.Queue(maxsize=self.queue_size)
+        self.queue_depths = {line_queue: [], batch_queue: []}
+
+        run_start = default_timer()
+        reader = threading.Thread(
+            target=self.read, args=(source, line_queue), name='vcf-reader')
+        writer = threading.Thread(
+            target=self.write, args=(batch_queue, write), name='vcf-writer')
+        reader.daemon = True
+        writer.daemon = True
+        reader.start()
+        writer.start()
+
+        stats = self.stages['extraction']
+        try:
+            while True:
+                chunk = self.get(line_queue, stats)
+                if chunk is END:
+                    break
+                start = default_timer()
+                batch = list(self.engine.extract(
+                    chunk,
+                    dict_key=self.dict_key,
+                    individual_id=self.individual_id
+                ))
+                stats.busy += default_timer() - start
+                stats.chunks += 1
+                if not self.put(batch_queue, batch, stats):
+                    break
+        except Exception as error:
+            self.fail(error)
+        self.put(batch_queue, END, stats)
+
+        reader.join()
+        writer.join()
+        self.elapsed = default_timer() - run_start
+        self.queue_stats = {
+            'lines': self.get_queue_stats(self.queue_depths[line_queue]),
+            'batches': self.get_queue_stats(self.queue_depths[batch_queue]),
+        }
+
+        if self.errors:
+            raise self.errors[0]
+
+        self.engine.log_summary()
+        report = self.report()
+        self.logger.info("Pipeline finished in {0:.2f} s, occupancy: {1}".format(
+            self.elapsed, ", ".join(
+                "{0} {1:.0%}".format(name, report['stages'][name]['occupancy'])
+                for name in ['reader', 'extraction', 'writer'])))
+        return report
+
+    def get_queue_stats(self, depths):
+        """Return the mean and max number of chunks in a queue"""
+        if not depths:
+            return {'mean': 0.0, 'max': 0}
+        return {
+            'mean': sum(depths) / float(len(depths)),
+            'max': max(depths),
+        }
+
+    def report(self):
+        """
+        Return the statistics of the last run
+
+        Returns:
+            report (dict): With the run time in 'elapsed', the variant counts,
+                           the 'stages' with the busy, waiting and blocked
+                           seconds and the occupancy of each stage, the
+                           'queues' with the mean and max number of chunks
+                           and the 'bottleneck', the stage that was busy most
+        """
+        stages = {
+            name: self.stages[name].report(self.elapsed)
+            for name in self.stages
+        }
+        bottleneck = None
+        if stages:
+            bottleneck = max(stages, key=lambda name: stages[name]['busy'])
+        return {
+            'elapsed': self.elapsed,
+            'variants': self.engine.variants if self.engine else 0,
+            'passed_variants': self.engine.passed_variants if self.engine else 0,
+            'chunk_size': self.chunk_size,
+            'queue_size': self.queue_size,
+            'stages': stages,
+            'queues': self.queue_stats,
+            'bottleneck': bottleneck,
+        }
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+plan.py
+
+A compiled plan is everything a worker needs to run a set of plugins on
+chunks of a vcf: the plugin definitions, the filter, the header with the
+INFO declarations and the dict_key and individual_id arguments.
+
+A ConfigParser holds the parsed config file, loggers and validators, so it
+is expensive to send to another process. A plan is pickled as plain
+definitions and the plugins are rebuilt on the other side:
+
+    plan = ExtractionPlan.from_config(configs, vcf_header=header.header,
+                                      csq_format=header.csq_format,
+                                      info_dict=header.info_dict)
+    pool = ProcessPoolExecutor(initializer=init_worker, initargs=(plan,))
+    columns = pool.submit(run_worker_chunk, lines).result()
+
+The plan is sent once to each worker through the pool initializer. After
+that a task only carries a chunk of lines and only returns the value
+columns, in the order of plan.row_fields.
+
+When numpy is installed the min and max plugins on numeric INFO and CSQ
+values are converted and reduced for the whole chunk at once, see
+vectorized.py.
+"""
+
+from __future__ import print_function
+
+import logging
+import threading
+
+from extract_vcf.engine import Engine
+from extract_vcf.fingerprint import get_plugin_definition
+from extract_vcf.get_annotations import get_variant_dict
+from extract_vcf.header_parser import HeaderParser
+from extract_vcf.plugin import Plugin
+from extract_vcf.vectorized import can_vectorize, get_vectorized_values
+
+logger = logging.getLogger(__name__)
+
+# The plan that a worker has received from init_worker
+worker_plan = None
+
+
+def build_plan(definitions, filters, vcf_header, csq_format, dict_key,
+               individual_id, vectorize=True, info_dict=None):
+    """
+    Build a plan from plugin definitions, used when a plan is unpickled
+
+    Arguments:
+        definitions (list): A list of (name, category, definition) from
+                            ExtractionPlan.get_definitions
+        See ExtractionPlan for the other arguments
+
+    Returns:
+        plan (ExtractionPlan)
+    """
+    plugins = {}
+    for name, category, definition in definitions:
+        plugins[name] = Plugin(name=name, category=category, **definition)
+    return ExtractionPlan(plugins, filters=filters, vcf_header=vcf_header,
+                          csq_format=csq_format, dict_key=dict_key,
+                          individual_id=individual_id, vectorize=vectorize,
+                          info_dict=info_dict)
+
+
+class ExtractionPlan(object):
+    """Class for holding a picklable set of plugins and run arguments"""
+    __slots__ = ('plugins', 'plugin_names', 'row_fields', 'filters',
+                 'vcf_header', 'csq_format', 'dict_key', 'individual_id',
+                 'vectorize', 'info_dict', 'local')
+
+    def __init__(self, plugins, filters=None, vcf_header=None, csq_format=None,
+                 dict_key=None, individual_id=None, vectorize=True,
+                 info_dict=None):
+        """
+        Arguments:
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            filters (str or list): A filter expression, see Engine
+            vcf_header (list): The vcf header line
+            csq_format (list): The CSQ format
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+            vectorize (bool): Reduce the plugins that can be vectorized with
+                              numpy, if it is installed
+            info_dict (dict): The INFO declarations of the vcf header, as in
+                              HeaderParser.info_dict, used to pick the
+                              converters like in a serial run
+        """
+        super(ExtractionPlan, self).__init__()
+        self.plugins = plugins
+        self.plugin_names = tuple(plugins.keys())
+        self.row_fields = ('CHROM', 'POS') + self.plugin_names
+        self.filters = filters
+        self.vcf_header = tuple(vcf_header or ())
+        self.csq_format = tuple(csq_format or ())
+        self.dict_key = dict_key
+        self.individual_id = individual_id
+        self.vectorize = vectorize
+        self.info_dict = dict(info_dict or {})
+        # Each thread gets its own engine since an engine keeps counters
+        self.local = threading.local()
+
+        # Check the filter before the plan is sent to any worker
+        Engine(plugins, filters=filters)
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """
+        Compile a plan from a ConfigParser
+
+        Arguments:
+            config (ConfigParser): A parsed config
+            kwargs: The other arguments of ExtractionPlan
+
+        Returns:
+            plan (ExtractionPlan)
+        """
+        return cls(config.plugins, **kwargs)
+
+    def get_definitions(self):
+        """
+        Return the definitions of the plugins
+
+        Returns:
+            definitions (list): A list of (name, category, definition)
+        """
+        return [
+            (name, self.plugins[name].category,
+             get_plugin_definition(self.plugins[name]))
+            for name in self.plugin_names
+        ]
+
+    def __reduce__(self):
+        return (build_plan, (
+            self.get_definitions(), self.filters, list(self.vcf_header),
+            list(self.csq_format), self.dict_key, self.individual_id,
+            self.vectorize, self.info_dict))
+
+    def get_engine(self):
+        """Return the engine of the current thread"""
+        engine = getattr(self.local, 'engine', None)
+        if engine is None:
+            header = HeaderParser()
+            header.header = list(self.vcf_header)
+            header.csq_format = list(self.csq_format)
+            header.info_dict = dict(self.info_dict)
+            engine = Engine(self.plugins, filters=self.filters, header=header)
+            self.local.engine = engine
+            self.local.vector_plugins = []
+            if self.vectorize:
+                self.local.vector_plugins = [
+                    name for name in self.plugin_names
+                    if can_vectorize(self.plugins[name], header.csq_format)
+                ]
+        return engine
+
+    def get_vectorized_columns(self, engine, plugin_names, variant_dicts):
+        """Return the values of vectorized plugins, one list per plugin"""
+        if not variant_dicts:
+            return [[] for name in plugin_names]
+        # The engine only keeps the CSQ of the last variant, the CSQ plugins
+        # share the splitted annotations of the chunk. The variant_dicts
+        # are alive during the call so their ids are unique.
+        csq_entries = {}
+        def get_csq_entries(variant_dict):
+            key = id(variant_dict)
+            if key not in csq_entries:
+                csq_entries[key] = engine.get_csq_entries(variant_dict)
+            return csq_entries[key]
+
+        return [
+            get_vectorized_values(
+                self.plugins[name],
+                variant_dicts,
+                csq_format=engine.header.csq_format,
+                get_csq_entries=get_csq_entries,
+                converter=engine.get_converter(name)
+            )
+            for name in plugin_names
+        ]
+
+    def run_chunk(self, lines):
+        """
+        Run the plugins on a chunk of variant lines
+
+        Arguments:
+            lines (list): Vcf variant lines
+
+        Returns:
+            columns (list): One list of values for each field in row_fields,
+                            for the variants that pass the filter
+        """
+        engine = self.get_engine()
+        columns = [[] for field in self.row_fields]
+        chrom_column, pos_column = columns[0], columns[1]
+        value_columns = list(zip(self.plugin_names, columns[2:]))
+
+        variant_dicts = [
+            get_variant_dict(line, engine.header.header) for line in lines]
+        # The filter plugins are vectorized for all variants and the other
+        # plugins only for the variants that pass the filter
+        filter_names = set(
+            predicate.plugin_name for predicate in engine.predicates)
+        first_plugins = [name for name in self.local.vector_plugins
+                         if name in filter_names]
+        last_plugins = [name for name in self.local.vector_plugins
+                        if name not in filter_names]
+
+        known_values = [dict.fromkeys(last_plugins)
+                        for variant_dict in variant_dicts]
+        for name, values in zip(first_plugins, self.get_vectorized_columns(
+                engine, first_plugins, variant_dicts)):
+            for known, value in zip(known_values, values):
+                known[name] = value
+
+        passed_variants = []
+        for variant_dict, known in zip(variant_dicts, known_values):
+            values = engine.get_values(
+                variant_dict=variant_dict,
+                dict_key=self.dict_key,
+                individual_id=self.individual_id,
+                known_values=known
+            )
+            if values is not None:
+                passed_variants.append((variant_dict, values))
+
+        passed_dicts = [variant_dict for variant_dict, values in passed_variants]
+        for name, column in zip(last_plugins, self.get_vectorized_columns(
+                engine, last_plugins, passed_dicts)):
+            for (variant_dict, values), value in zip(passed_variants, column):
+                values[name] = value
+
+        for variant_dict, values in passed_variants:
+            chrom_column.append(variant_dict['CHROM'])
+            pos_column.append(variant_dict['POS'])
+            for name, column in value_columns:
+                column.append(values[name])
+        return columns
+
+
+def init_worker(plan):
+    """
+    Keep a plan in a worker, use as initializer of a pool
+
+    Arguments:
+        plan (ExtractionPlan)
+    """
+    global worker_plan
+    worker_plan = plan
+    logger.debug("Worker got plan with plugins: {0}".format(
+        ', '.join(plan.plugin_names)))
+
+
+def run_worker_chunk(lines):
+    """
+    Run the plan of the worker on a chunk of variant lines
+
+    Arguments:
+        lines (list): Vcf variant lines
+
+    Returns:
+        columns (list): See ExtractionPlan.run_chunk
+    """
+    if worker_plan is None:
+        raise RuntimeError("The worker has no plan, use init_worker")
+    return worker_plan.run_chunk(lines)
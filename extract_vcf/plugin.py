@@ -1,13 +1,59 @@
 from logging import getLogger
 import operator
 
-from extract_vcf import split_strings
+from six import string_types
+
+from extract_vcf import split_strings, iter_split_strings, split_csq
+from extract_vcf.reducers import get_family_reducer, get_reducer
+
+logger = getLogger(__name__)
+
+# The attributes of a plugin, they can not be changed after it is created
+PLUGIN_SLOTS = (
+    'name', 'field', 'data_type', 'separators', 'info_key', 'category',
+    'csq_key', 'record_rule', 'gt_key', 'string_rules', 'dict_entry',
+    'lower_bound', 'upper_bound', 'sorted_strings',
+)
+FROZEN_ATTRIBUTES = frozenset(PLUGIN_SLOTS)
+
+class FrozenDict(dict):
+    """A dictionary that can not be changed after it is created"""
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("{0} can not be changed".format(
+            self.__class__.__name__))
+
+    __setitem__ = _immutable
+    __delitem__ = _immutable
+    clear = _immutable
+    pop = _immutable
+    popitem = _immutable
+    setdefault = _immutable
+    update = _immutable
+    # d |= other changes a dict in place since python 3.9
+    __ior__ = _immutable
+
+    def __reduce__(self):
+        return (self.__class__, (dict(self),))
+
+
+# Shared by all plugins without string rules
+NO_STRING_RULES = FrozenDict()
+
 
 class Plugin(object):
-    """Class for holding information about a plugin"""
-    def __init__(self, name, field, data_type=None, separators=[], info_key=None, 
+    """Class for holding information about a plugin
+    
+    A plugin can not be changed after it is created and it keeps no state
+    between calls, so one plugin can be used by many threads at the same time.
+    The attributes are kept in slots since a service can hold thousands of
+    plugins.
+    """
+    __slots__ = PLUGIN_SLOTS + ('_frozen',)
+    
+    def __init__(self, name, field, data_type=None, separators=None, info_key=None, 
                 category=None, csq_key=None, record_rule=None, gt_key=None,
-                string_rules={}, dict_entry=False):
+                string_rules=None, dict_entry=False, lower_bound=None,
+                upper_bound=None):
         """
         The plugin class hold plugin information. The main task for a plugin
         is to return the correct value from a vcf field based on a number of
@@ -27,72 +73,133 @@ class Plugin(object):
             data_type (str): the data type of the record. Anyone of
                 ['integer','float','flag','string']
             separators (list): A list of strings that describes how the record is
-                                separated
+                                separated, stored as a tuple
             info_key (str): The name of the INFO field
             csq_key (str): The name of the Vep entry
-            record_rule (str): Anyone of ['min', 'max']
-            string_rules (dict): A dictionary with priority order of string matches
+            record_rule (str): Anyone of ['min', 'max', 'first', 'sum', 'mean',
+                'count', 'any']
+            string_rules (dict): A dictionary with priority order of string
+                                 matches, stored as a FrozenDict
             dict_entry (bool): If the values are annotated as a dictionary. 
                          In that case the the annotattion after first splitter will
                          be used as key.
+            lower_bound (float): The smallest possible value. A 'min' record rule
+                                 stops looking when this value is found
+            upper_bound (float): The largest possible value. A 'max' record rule
+                                 stops looking when this value is found
         
         """
         super(Plugin, self).__init__()
-        self.logger = getLogger(__name__)
-        # For testing only
-        self.logger = getLogger('extract_vcf.plugin')
         
-        # These are the valid data types for a entry
-        self.data_types = ['integer','float','flag','string']
         self.name = name
-        self.logger.info("Initiating plugin with name: {0}".format(
+        logger.info("Initiating plugin with name: {0}".format(
             self.name
         ))
-        self.regex = None
         self.field = field
-        self.logger.info("Field: {0}".format(self.field))
+        logger.info("Field: {0}".format(self.field))
         
         self.data_type = data_type
-        self.logger.info("Data type: {0}".format(self.data_type))
+        logger.info("Data type: {0}".format(self.data_type))
         
-        self.separators = separators
-        self.logger.info("Separators: {0}".format(self.separators))
+        self.separators = tuple(separators or ())
+        logger.info("Separators: {0}".format(self.separators))
         
         self.record_rule = record_rule
-        self.logger.info("Record rule: {0}".format(self.record_rule))
+        logger.info("Record rule: {0}".format(self.record_rule))
         
         self.info_key = info_key
-        self.logger.info("Info key: {0}".format(self.info_key))
+        logger.info("Info key: {0}".format(self.info_key))
         
         self.csq_key = csq_key
-        self.logger.info("CSQ key: {0}".format(self.csq_key))
+        logger.info("CSQ key: {0}".format(self.csq_key))
         
         self.category = category
-        self.logger.info("Category: {0}".format(self.category))
-        
-        self.string_rules = string_rules
-        self.logger.info("String rules: {0}".format(self.string_rules))
+        logger.info("Category: {0}".format(self.category))
+        
+        if string_rules:
+            self.string_rules = FrozenDict(string_rules)
+        else:
+            self.string_rules = NO_STRING_RULES
+        logger.info("String rules: {0}".format(self.string_rules))
+        
+        # The strings are sorted once, in the order they are tested, together
+        # with their lower case
+        self.sorted_strings = tuple(
+            (string, string.lower()) for string, priority in sorted(
+                self.string_rules.items(), 
+                key=operator.itemgetter(1), 
+                reverse=(self.record_rule == 'max')
+            )
+        )
         
         self.gt_key = gt_key
-        self.logger.info("gt_key: {0}".format(self.gt_key))
+        logger.info("gt_key: {0}".format(self.gt_key))
         
         self.dict_entry = dict_entry
         
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        logger.info("Bounds: {0}, {1}".format(
+            self.lower_bound, self.upper_bound))
+        
+        self._frozen = True
+    
+    def __setattr__(self, name, value):
+        if name in FROZEN_ATTRIBUTES and getattr(self, '_frozen', False):
+            raise AttributeError(
+                "Can not set {0} of plugin {1}, plugins can not be changed "
+                "after they are created".format(name, self.name))
+        super(Plugin, self).__setattr__(name, value)
+    
+    def __getstate__(self):
+        state = {name: getattr(self, name) for name in PLUGIN_SLOTS}
+        # Subclasses without slots can have more attributes
+        state.update(getattr(self, '__dict__', {}))
+        return state
+    
+    def __setstate__(self, state):
+        for name in state:
+            object.__setattr__(self, name, state[name])
+        object.__setattr__(self, '_frozen', True)
     
     def get_entry(self, variant_line=None, variant_dict=None, raw_entry=None, 
-    vcf_header=None, csq_format=None, dict_key=None, individual_id=None):
+    vcf_header=None, csq_format=None, dict_key=None, individual_id=None,
+    csq_entries=None):
         """Return the splitted entry from variant information
             
             Args:
                 variant_line (str): A vcf formated variant line
                 vcf_header (list): A list with the vcf header line
                 csq_format (list): A list with the csq headers
+                csq_entries (list): The csq entry already splitted on ',' and
+                                    '|', to share between plugins
                 family_id (str): The family id that should be searched. If no id 
                                  the first family found will be used
             
             Returns:
                 entry (list): A list with the splitted entry
         """
+        return list(self.iter_entry(
+            variant_line=variant_line,
+            variant_dict=variant_dict,
+            raw_entry=raw_entry,
+            vcf_header=vcf_header,
+            csq_format=csq_format,
+            dict_key=dict_key,
+            individual_id=individual_id,
+            csq_entries=csq_entries
+        ))
+    
+    def iter_entry(self, variant_line=None, variant_dict=None, raw_entry=None, 
+    vcf_header=None, csq_format=None, dict_key=None, individual_id=None,
+    csq_entries=None):
+        """Yield the values of the splitted entry one at a time
+            
+            Takes the same arguments as get_entry
+            
+            Yields:
+                value (str): The values of the splitted entry
+        """
         if not raw_entry:
             raw_entry = self.get_raw_entry(
                 variant_line=variant_line, 
@@ -102,59 +209,142 @@ class Plugin(object):
                 dict_key=dict_key
             )
         
-        entry = []
-        if raw_entry:
+        if not raw_entry:
+            return
+        
+        if self.field in ['CHROM', 'POS', 'REF', 'QUAL']:
+            # We know these fields allways has one entry
+            yield raw_entry
+        
+        elif self.field in ['ID', 'FILTER']:
+            # We know ID is allways splitted on ';'
+            for value in raw_entry.split(';'):
+                yield value
+        
+        elif self.field == 'ALT':
+            # We know ALT is allways splitted on ','
+            for value in raw_entry.split(','):
+                yield value
+        
+        elif self.field == 'FORMAT':
+            for value in raw_entry.split(':'):
+                yield value
+        
+        elif self.field == 'INFO':
+            # We are going to treat csq fields separately
+            if self.info_key == 'CSQ':
+                if not csq_format:
+                    raise IOError("If CSQ the csq format must be provided")
+                if not self.csq_key:
+                    raise IOError("If CSQ a csq key must be provided")
+                for i, head in enumerate(csq_format):
+                    if head == self.csq_key:
+                        # This is the csq entry we are looking for
+                        csq_column = i
+                if csq_entries is None:
+                    csq_entries = split_csq(raw_entry)
+                for csq_entry in csq_entries:
+                    for value in iter_split_strings(
+                            csq_entry[csq_column], self.separators):
+                        yield value
+            else:
+                if self.dict_entry:
+                    separators = self.separators[2:]
+                else:
+                    separators = self.separators
+                
+                for value in iter_split_strings(raw_entry, separators):
+                    yield value
+        
+        elif self.field == 'sample_id':
+            if not self.separators:
+                entry = split_strings(raw_entry, '/')
+                #If variant calls are phased we need to split on '|'
+                if len(entry) == 1:
+                    entry = split_strings(raw_entry, '|')
+            else:
+                entry = split_strings(raw_entry, self.separators)
+            for value in entry:
+                yield value
+    
+    def parse_dict_entry(self, entry):
+        """Parse the dictionary of a dict_entry annotation
             
-            if self.field in ['CHROM', 'POS', 'REF', 'QUAL']:
-                # We know these fields allways has one entry
-                entry = [raw_entry]
+            The annotation is splitted on separators[0] and each part on
+            separators[1] into a key and a value. The engine parses the
+            annotation once per variant and passes the result to all plugins
+            with the same annotation, see Engine.get_dict_entries.
             
-            elif self.field in ['ID', 'FILTER']:
-                # We know ID is allways splitted on ';'
-                entry = raw_entry.split(';')
+            Args:
+                entry (str): The raw annotation, like '1:12,2:11'
             
-            elif self.field == 'ALT':
-                # We know ALT is allways splitted on ','
-                entry = raw_entry.split(',')
+            Returns:
+                (dict_entries, last_value): A FrozenDict with the value of
+                                            each key and the value of the
+                                            last part, or None
+        """
+        dict_entries = {}
+        last_value = None
+        for annotation in entry.split(self.separators[0]):
+            splitted_entry = annotation.split(self.separators[1])
+            if len(splitted_entry) < 2:
+                continue
+            # A key that is repeated gets its last value
+            dict_entries[splitted_entry[0]] = last_value = splitted_entry[1]
+        return (FrozenDict(dict_entries), last_value)
+    
+    def get_dict_entries(self, variant_line=None, variant_dict=None):
+        """Return all keys and values of a dict_entry annotation
             
-            elif self.field == 'FORMAT':
-                entry = raw_entry.split(':')
+            Keep the result to look up more keys, each call parses the
+            annotation again. Only the fields up to INFO are splitted from a
+            variant line.
             
-            elif self.field == 'INFO':
-                # We are going to treat csq fields separately
-                if self.info_key == 'CSQ':
-                    if not csq_format:
-                        raise IOError("If CSQ the csq format must be provided")
-                    if not self.csq_key:
-                        raise IOError("If CSQ a csq key must be provided")
-                    for i, head in enumerate(csq_format):
-                        if head == self.csq_key:
-                            # This is the csq entry we are looking for
-                            csq_column = i
-                    # CSQ entries are allways splitted on ','
-                    for csq_entry in raw_entry.split(','):
-                        entry += split_strings(csq_entry.split('|')[csq_column], self.separators)
-                else:
-                    if self.dict_entry:
-                        separators = self.separators[2:]
-                    else:
-                        separators = self.separators
-                    
-                    entry = split_strings(raw_entry, separators)
+            Args:
+                variant_line (str): A vcf formated variant line
+                variant_dict (dict): A variant dictionary
             
-            elif self.field == 'sample_id':
-                if not self.separators:
-                    entry = split_strings(raw_entry, '/')
-                    #If variant calls are phased we need to split on '|'
-                    if len(entry) == 1:
-                        entry = split_strings(raw_entry, '|')
-                else:
-                    entry = split_strings(raw_entry, self.separators)
+            Returns:
+                dict_entries (dict): A FrozenDict with the raw value of each
+                                     key, empty if the variant has no
+                                     annotation
+        """
+        if not self.dict_entry:
+            raise IOError("Only dict_entry plugins have dictionary entries")
+        if variant_line:
+            variant_line = variant_line.rstrip().split(None, 8)
+        raw_entry = self.get_info_entry(
+            variant_line=variant_line, variant_dict=variant_dict)
+        if not raw_entry:
+            return FrozenDict()
+        return self.parse_dict_entry(raw_entry)[0]
+    
+    def get_info_entry(self, variant_line=None, variant_dict=None):
+        """Return the raw INFO annotation of the info_key
+            
+            Args:
+                variant_line (list): A splitted vcf variant line
+                variant_dict (dict): A variant dictionary
+            
+            Returns:
+                entry (str): The annotation or None
+        """
+        entry = None
+        if variant_line:
+            for info_annotation in variant_line[7].split(';'):
+                splitted_annotation = info_annotation.split('=')
+                if self.info_key == splitted_annotation[0]:
+                    if len(splitted_annotation) == 2:
+                        entry = splitted_annotation[1]
+        
+        elif variant_dict:
+            entry = variant_dict.get('info_dict',{}).get(self.info_key)
         
         return entry
     
     def get_raw_entry(self, variant_line=None, variant_dict=None, 
-    vcf_header=None, individual_id=None, dict_key=None):
+    vcf_header=None, individual_id=None, dict_key=None,
+    parsed_dict_entry=None):
         """Return the raw entry from the vcf field
             
             If no entry was found return None
@@ -163,6 +353,9 @@ class Plugin(object):
                 variant_line (str): A vcf formated variant line
                 vcf_header (list): A list with the vcf header line
                 individual_id (str): The individual id to get gt call
+                parsed_dict_entry (tuple): The annotation of a dict_entry
+                                           plugin already parsed by
+                                           parse_dict_entry
             Returns:
                 The raw entry found in variant line
         """
@@ -214,30 +407,18 @@ class Plugin(object):
                 entry = variant_dict['FILTER']
         
         elif self.field == 'INFO':
-            if variant_line:
-                for info_annotation in variant_line[7].split(';'):
-                    splitted_annotation = info_annotation.split('=')
-                    if self.info_key == splitted_annotation[0]:
-                        if len(splitted_annotation) == 2:
-                            entry = splitted_annotation[1]
-                            
-            elif variant_dict:
-                entry = variant_dict.get('info_dict',{}).get(self.info_key)
+            entry = self.get_info_entry(
+                variant_line=variant_line, variant_dict=variant_dict)
             
             if self.dict_entry and entry:
-                #First we split the "dictionaries"
-                first_split = entry.split(self.separators[0])
-                for annotation in first_split:
-                    # Then we search for the dict key
-                    splitted_entry = annotation.split(self.separators[1])
-                    key = splitted_entry[0] 
-                    value = splitted_entry[1]
-                    if dict_key:
-                        if key == dict_key:
-                            entry = value
-                    #If no key we just return the last entry
-                    else:
-                        entry = value
+                if parsed_dict_entry is None:
+                    parsed_dict_entry = self.parse_dict_entry(entry)
+                dict_entries, last_value = parsed_dict_entry
+                if dict_key:
+                    entry = dict_entries.get(dict_key, entry)
+                #If no key we just return the last entry
+                elif last_value is not None:
+                    entry = last_value
             
         
         elif self.field == 'FORMAT':
@@ -275,7 +456,8 @@ class Plugin(object):
     
     def get_value(self, variant_line=None, variant_dict=None, entry=None, 
         raw_entry=None, vcf_header=None, csq_format=None, dict_key=None, 
-        individual_id=None):
+        individual_id=None, csq_entries=None, converter=None,
+        parsed_dict_entry=None):
         """
         Return the value as specified by plugin
         
@@ -290,6 +472,11 @@ class Plugin(object):
             csq_format (list): The CSQ format
             family_id (str): The family id
             individual_id (str): The individual id
+            csq_entries (list): The csq entry already splitted on ',' and '|'
+            converter (Converter): Converts the values of float and integer
+                                   plugins, see converters.py
+            parsed_dict_entry (tuple): The annotation of a dict_entry plugin
+                                       already parsed by parse_dict_entry
         
         Returns:
             value (str): A string that represents the correct value
@@ -302,7 +489,8 @@ class Plugin(object):
             variant_dict = variant_dict, 
             vcf_header=vcf_header, 
             individual_id=individual_id,
-            dict_key=dict_key
+            dict_key=dict_key,
+            parsed_dict_entry=parsed_dict_entry
         )
         # If data type is flag we only need to check if any entry exists
         if self.data_type == 'flag':
@@ -321,85 +509,296 @@ class Plugin(object):
         # If we have a record rule we need to return the correct value
         elif raw_entry:
         # If there was no raw entry we will return None
-            if self.record_rule:
-            
-                if self.data_type == 'string':
+            value = self.get_typed_value(
+                raw_entry=raw_entry,
+                vcf_header=vcf_header,
+                csq_format=csq_format,
+                dict_key=dict_key,
+                individual_id=individual_id,
+                csq_entries=csq_entries,
+                converter=converter
+            )
+        
+        return value
+    
+    def get_typed_value(self, raw_entry, vcf_header=None, csq_format=None,
+        dict_key=None, individual_id=None, csq_entries=None, converter=None):
+        """
+        Return the value of a raw entry for plugins that are not flags
+        
+        Arguments:
+            raw_entry (str): The raw entry from the vcf file
+            vcf_header (list): The vcf header line with sample ids
+            csq_format (list): The CSQ format
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual id
+            csq_entries (list): The csq entry already splitted on ',' and '|'
+            converter (Converter): Converts the values of float and integer
+                                   plugins, see converters.py
+        
+        Returns:
+            value: The value as specified by the plugin
+        """
+        value = None
+        
+        if self.record_rule:
+        
+            if self.data_type == 'string':
                 
-                    if self.record_rule == 'max':
-                        sorted_strings = sorted(
-                            self.string_rules.items(), 
-                            key=operator.itemgetter(1), 
-                            reverse=True
-                        )
-                    
-                    if self.record_rule == 'min':
-                        sorted_strings = sorted(
-                            self.string_rules.items(), 
-                            key=operator.itemgetter(1)
-                        )
-                    
-                    for string_rule in sorted_strings:
-                        if string_rule[0].lower() in raw_entry.lower():
-                            value = string_rule[0]
-                            break
+                # The strings are tested in priority order so we stop
+                # scanning as soon as the first, and best, match is found
+                lower_entry = raw_entry.lower()
+                for string, lower_string in self.sorted_strings:
+                    if lower_string in lower_entry:
+                        value = string
+                        break
+            else:
+                
+                # The values are converted and reduced as they are
+                # splitted so no lists are built
+                if self.data_type == 'float':
+                    convert = float
+                elif self.data_type == 'integer':
+                    convert = int
                 else:
-                    
-                    typed_annotations = []
-                    
-                    for value in self.get_entry(
-                        raw_entry=raw_entry,
-                        vcf_header=vcf_header, 
-                        csq_format=csq_format, 
-                        dict_key=dict_key, 
-                        individual_id=individual_id):
+                    convert = None
                 
-                        if self.data_type == 'float':
-                            try:
-                                typed_annotations.append(float(value))
-                            except ValueError:
-                                pass
+                if converter and convert:
+                    reducer = get_reducer(
+                        self.record_rule,
+                        lower_bound=self.lower_bound,
+                        upper_bound=self.upper_bound
+                    )
+                    raw_values = None
+                    if converter.single:
+                        # A Number=1 annotation is converted without being
+                        # splitted, other entries like '0.1,0.2' are
+                        # splitted as usual
+                        number = converter.convert_whole(raw_entry)
+                        if number is not None:
+                            raw_values = ()
+                            reducer.add(number)
+                    if raw_values is None:
+                        raw_values = self.iter_entry(
+                            raw_entry=raw_entry,
+                            vcf_header=vcf_header, 
+                            csq_format=csq_format, 
+                            dict_key=dict_key, 
+                            individual_id=individual_id,
+                            csq_entries=csq_entries)
                     
-                        elif self.data_type == 'integer':
-                            try:
-                                typed_annotations.append(int(value))
-                            except ValueError:
-                                pass
-                
-                    if typed_annotations:
-                        if self.record_rule == 'max':
-                            value = max(typed_annotations)
+                    # Missing values are skipped without an exception
+                    for raw_value in raw_values:
+                        number = converter(raw_value)
+                        if number is None:
+                            continue
+                        reducer.add(number)
+                        if reducer.done:
+                            break
                     
-                        elif self.record_rule == 'min':
-                            value = min(typed_annotations)
-                    else:
-                        value = None
-        
-            # If no record rule is given we return the raw annotation
-            # Here the data_type is not flag, and there is no record rule
-            # We know that there exists a raw annotation
-            else:
-                # We will just return the first annotation found
-                value = self.get_entry(
+                    value = reducer.value
+                
+                elif convert:
+                    reducer = get_reducer(
+                        self.record_rule,
+                        lower_bound=self.lower_bound,
+                        upper_bound=self.upper_bound
+                    )
+                    for raw_value in self.iter_entry(
                         raw_entry=raw_entry,
                         vcf_header=vcf_header, 
                         csq_format=csq_format, 
                         dict_key=dict_key, 
-                        individual_id=individual_id)[0]
-                
-                if self.data_type == 'float':
+                        individual_id=individual_id,
+                        csq_entries=csq_entries):
+                        
                         try:
-                            value = float(value)
+                            reducer.add(convert(raw_value))
                         except ValueError:
-                            pass
+                            continue
+                        # The result can not change, skip the rest
+                        if reducer.done:
+                            break
                     
-                elif self.data_type == 'integer':
+                    value = reducer.value
+    
+        # If no record rule is given we return the raw annotation
+        # Here the data_type is not flag, and there is no record rule
+        # We know that there exists a raw annotation
+        else:
+            # We will just return the first annotation found
+            value = next(self.iter_entry(
+                    raw_entry=raw_entry,
+                    vcf_header=vcf_header, 
+                    csq_format=csq_format, 
+                    dict_key=dict_key, 
+                    individual_id=individual_id,
+                    csq_entries=csq_entries), None)
+            
+            # The raw annotation had no values, like a CSQ without entries
+            if value is None:
+                return None
+            
+            if converter:
+                number = converter(value)
+                if number is not None:
+                    value = number
+            
+            elif self.data_type == 'float':
                     try:
-                        value = int(value)
+                        value = float(value)
                     except ValueError:
                         pass
+                
+            elif self.data_type == 'integer':
+                try:
+                    value = int(value)
+                except ValueError:
+                    pass
         
         return value
     
+    def iter_family_entries(self, variant_line=None, variant_dict=None,
+        vcf_header=None, individual_ids=None):
+        """Yield the raw gt_key entry of each individual in a family
+            
+            The line is splitted and the header is searched once for all
+            individuals, instead of once for each individual as with
+            get_raw_entry.
+            
+            Args:
+                variant_line (str): A vcf formated variant line
+                variant_dict (dict): A variant dictionary
+                vcf_header (list): A list with the vcf header line
+                individual_ids (list): The individual ids, all samples in the
+                                       vcf header if None
+            
+            Yields:
+                (individual_id, raw_entry): The raw entry is '.' if the
+                                            individual has no gt_key value
+        """
+        if self.field != 'sample_id':
+            raise IOError("Family values can only be found with 'sample_id' "
+                          "plugins")
+        if not self.gt_key:
+            raise IOError("If 'sample_id' a genotype key must be provided")
+        if individual_ids is None:
+            if not vcf_header:
+                raise IOError("The vcf header must be provided to find all "
+                              "individuals")
+            individual_ids = vcf_header[9:]
+        
+        if variant_line:
+            if not vcf_header:
+                raise IOError("If 'sample_id' the vcf header must be provided")
+            variant_line = variant_line.rstrip().split()
+            format_info = variant_line[8]
+            columns = {}
+            for i, head in enumerate(vcf_header):
+                columns[head] = i
+            try:
+                raw_gt_calls = [(individual_id, variant_line[columns[individual_id]])
+                                for individual_id in individual_ids]
+            except KeyError as error:
+                raise IOError("Individual {0} is not in the vcf header".format(
+                    error.args[0]))
+        else:
+            format_info = variant_dict['FORMAT']
+            try:
+                raw_gt_calls = [(individual_id, variant_dict[individual_id])
+                                for individual_id in individual_ids]
+            except KeyError as error:
+                raise IOError("Individual {0} is not in the variant".format(
+                    error.args[0]))
+        
+        try:
+            gt_index = format_info.split(':').index(self.gt_key)
+        except ValueError:
+            gt_index = None
+        
+        for individual_id, raw_gt_call in raw_gt_calls:
+            entry = '.'
+            if gt_index is not None:
+                # Only split as far as the gt_key
+                gt_values = raw_gt_call.split(':', gt_index + 1)
+                if len(gt_values) > gt_index:
+                    entry = gt_values[gt_index]
+            yield individual_id, entry
+    
+    def get_family_values(self, variant_line=None, variant_dict=None,
+        vcf_header=None, individual_ids=None):
+        """
+        Return the value of each individual in a family in one pass
+        
+        The values are the same as from get_value with each individual_id.
+        
+        Arguments:
+            variant_line (str): A vcf variant line
+            variant_dict (dict): A variant dictionary
+            vcf_header (list): The vcf header line with sample ids
+            individual_ids (list): The individual ids, all samples in the
+                                   vcf header if None
+        
+        Returns:
+            values (dict): The value of each individual id
+        """
+        values = {}
+        for individual_id, raw_entry in self.iter_family_entries(
+            variant_line=variant_line,
+            variant_dict=variant_dict,
+            vcf_header=vcf_header,
+            individual_ids=individual_ids):
+            
+            value = None
+            if self.data_type == 'flag':
+                if raw_entry != '.':
+                    value = True
+            elif raw_entry:
+                value = self.get_typed_value(raw_entry)
+            values[individual_id] = value
+        return values
+    
+    def get_family_value(self, family_rule, variant_line=None,
+        variant_dict=None, vcf_header=None, individual_ids=None):
+        """
+        Return one value for a family, like the smallest GQ of the family
+        
+        The value of each individual is reduced as it is found. Individuals
+        without a number are skipped, except by the 'non_ref' rule that
+        counts the raw entries with an alternative allele, like '0/1'.
+        
+        Arguments:
+            family_rule (str): A record rule or 'non_ref'
+            variant_line (str): A vcf variant line
+            variant_dict (dict): A variant dictionary
+            vcf_header (list): The vcf header line with sample ids
+            individual_ids (list): The individual ids, all samples in the
+                                   vcf header if None
+        
+        Returns:
+            value: The reduced value, None if no individual had a value
+        """
+        reducer = get_family_reducer(family_rule)
+        for individual_id, raw_entry in self.iter_family_entries(
+            variant_line=variant_line,
+            variant_dict=variant_dict,
+            vcf_header=vcf_header,
+            individual_ids=individual_ids):
+            
+            if reducer.raw_entries:
+                reducer.add(raw_entry)
+            else:
+                if self.data_type == 'flag':
+                    value = raw_entry != '.' or None
+                else:
+                    value = self.get_typed_value(raw_entry)
+                if value is None or isinstance(value, string_types):
+                    continue
+                reducer.add(value)
+            if reducer.done:
+                break
+        return reducer.value
+    
     def __repr__(self):
         return "Plugin(name={0},field={1},data_type={2},separators={3},"\
                 "record_rule={4},info_key={5},csq_key={6},category={7},"\
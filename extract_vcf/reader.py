@@ -0,0 +1,69 @@
+"""
+Functions for reading vcf files, plain text or compressed with gzip or bgzip.
+"""
+
+import gzip
+import io
+import itertools
+
+from extract_vcf.bgzf import BgzfReader, is_bgzf
+from extract_vcf.header_parser import HeaderParser
+
+
+def open_vcf(path):
+    """
+    Open a vcf file for reading text lines
+
+    Arguments:
+        path (str): Path to a vcf file, files that ends with '.gz' are
+                    decompressed
+
+    Returns:
+        handle: A file handle that iterates over the lines
+    """
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, 'rb'), encoding='utf-8')
+    return io.open(path, 'r', encoding='utf-8')
+
+
+def read_header(vcf_lines):
+    """
+    Parse the header lines at the start of a vcf
+
+    Arguments:
+        vcf_lines (iterable): An iterable with vcf lines
+
+    Returns:
+        (header, variant_lines): A HeaderParser and an iterator over the
+                                 remaining lines, from the first variant
+    """
+    header = HeaderParser()
+    vcf_lines = iter(vcf_lines)
+    for line in vcf_lines:
+        if line.startswith('#'):
+            header.parse_line(line)
+        else:
+            return header, itertools.chain([line], vcf_lines)
+    return header, iter([])
+
+
+def open_vcf_offsets(path):
+    """
+    Open a vcf for reading byte lines at offsets that can be used to seek
+
+    The offsets are byte offsets for plain text files, virtual offsets for
+    BGZF files and offsets in the uncompressed data for other gzip files.
+    Seeking in a gzip file that is not BGZF has to decompress the file up
+    to the offset.
+
+    Arguments:
+        path (str): Path to a vcf file
+
+    Returns:
+        handle: A handle with readline, tell, seek and close
+    """
+    if path.endswith('.gz'):
+        if is_bgzf(path):
+            return BgzfReader(path)
+        return gzip.open(path, 'rb')
+    return io.open(path, 'rb')
@@ -0,0 +1,205 @@
+"""
+Reducers fold the values of an entry into one value, one value at a time,
+so the values never has to be stored in a list.
+
+Each record rule has a reducer:
+
+    min, max: The smallest or largest value
+    first: The first value
+    sum: The sum of the values
+    mean: The mean of the values
+    count: The number of values
+    any: True if any value is non zero
+
+When the result can not change any more the reducer is marked as done, so
+the caller can stop adding values. This happens for 'first' after one value,
+for 'any' after a non zero value and for 'max' and 'min' when a declared
+upper or lower bound of the values is reached.
+
+NaN, like from a 'nan' value, can not be ordered so 'min' and 'max' skip it
+like a missing value.
+
+The values of the individuals in a family are reduced with the same
+reducers, see Plugin.get_family_value. Family rules also has
+
+    non_ref: The number of raw genotype calls with an alternative allele
+"""
+
+
+class Reducer(object):
+    """Base class for reducers"""
+    # A reducer is created for each plugin value, slots keep them small
+    __slots__ = ('lower_bound', 'upper_bound', 'count', 'result', 'done')
+    # If the reducer takes raw entries instead of typed values
+    raw_entries = False
+
+    def __init__(self, lower_bound=None, upper_bound=None):
+        """
+        Arguments:
+            lower_bound: The smallest possible value, if known
+            upper_bound: The largest possible value, if known
+        """
+        super(Reducer, self).__init__()
+        self.lower_bound = lower_bound
+        self.upper_bound = upper_bound
+        self.count = 0
+        self.result = None
+        self.done = False
+
+    def add(self, value):
+        """
+        Add a value to the reducer
+
+        Arguments:
+            value: A typed value
+        """
+        raise NotImplementedError
+
+    @property
+    def value(self):
+        """The reduced value or None if no values where added"""
+        return self.result
+
+
+class MaxReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        # NaN is the only value that is not equal to itself
+        if value != value:
+            return
+        if self.result is None or value > self.result:
+            self.result = value
+            if self.upper_bound is not None and value >= self.upper_bound:
+                self.done = True
+        self.count += 1
+
+
+class MinReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        if value != value:
+            return
+        if self.result is None or value < self.result:
+            self.result = value
+            if self.lower_bound is not None and value <= self.lower_bound:
+                self.done = True
+        self.count += 1
+
+
+class FirstReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        if self.count == 0:
+            self.result = value
+            self.done = True
+        self.count += 1
+
+
+class SumReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        if self.result is None:
+            self.result = value
+        else:
+            self.result += value
+        self.count += 1
+
+
+class MeanReducer(SumReducer):
+    __slots__ = ()
+
+    @property
+    def value(self):
+        if self.count == 0:
+            return None
+        return float(self.result) / self.count
+
+
+class CountReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        self.count += 1
+
+    @property
+    def value(self):
+        return self.count
+
+
+class AnyReducer(Reducer):
+    __slots__ = ()
+
+    def add(self, value):
+        self.result = bool(self.result or value)
+        self.done = self.result
+        self.count += 1
+
+
+class NonRefReducer(Reducer):
+    """Count the genotype calls, like '0/1' or '1|1', with an alternative allele"""
+    __slots__ = ()
+    raw_entries = True
+
+    def add(self, value):
+        for allele in value.replace('|', '/').split('/'):
+            if allele not in ('0', '.'):
+                self.count += 1
+                break
+
+    @property
+    def value(self):
+        return self.count
+
+
+REDUCERS = {
+    'min': MinReducer,
+    'max': MaxReducer,
+    'first': FirstReducer,
+    'sum': SumReducer,
+    'mean': MeanReducer,
+    'count': CountReducer,
+    'any': AnyReducer,
+}
+
+
+def get_reducer(record_rule, lower_bound=None, upper_bound=None):
+    """
+    Return a new reducer for a record rule
+
+    Arguments:
+        record_rule (str): Anyone of ['min', 'max', 'first', 'sum', 'mean',
+                           'count', 'any']
+        lower_bound: The smallest possible value, if known
+        upper_bound: The largest possible value, if known
+
+    Returns:
+        reducer (Reducer)
+    """
+    try:
+        return REDUCERS[record_rule](
+            lower_bound=lower_bound, upper_bound=upper_bound)
+    except KeyError:
+        raise ValueError("Unknown record rule: {0}".format(record_rule))
+
+
+FAMILY_REDUCERS = dict(REDUCERS, non_ref=NonRefReducer)
+
+
+def get_family_reducer(family_rule):
+    """
+    Return a new reducer for the values of a family
+
+    Arguments:
+        family_rule (str): A record rule or 'non_ref'
+
+    Returns:
+        reducer (Reducer)
+    """
+    try:
+        return FAMILY_REDUCERS[family_rule]()
+    except KeyError:
+        raise ValueError("Unknown family rule: {0}".format(family_rule))
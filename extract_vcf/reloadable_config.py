@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+reloadable_config.py
+
+A holder for a config that is reloaded when the config file changes, for
+long running extraction services.
+
+A watcher thread checks the modification time of the config file. When the
+file has changed the new config is parsed and validated in the watcher
+thread, and if it is ok it replaces the current config in one assignment.
+A config that fails validation is logged and the old config is kept.
+
+Each variant is extracted with one snapshot of the config, so a reload
+never happens in the middle of a variant, and each result reports the
+config that was used:
+
+    holder = ReloadableConfig("config.ini")
+    holder.start()
+    for variant_dict, values, snapshot in holder.extract(vcf_file):
+        print(snapshot.version, snapshot.generation, values)
+"""
+
+from __future__ import print_function
+
+import logging
+import os
+import threading
+
+from extract_vcf.config_parser import ConfigParser
+from extract_vcf.engine import Engine
+from extract_vcf.fingerprint import get_config_fingerprint
+from extract_vcf.get_annotations import get_variant_dict
+from extract_vcf.header_parser import HeaderParser
+
+
+class ConfigSnapshot(object):
+    """Class for holding one loaded version of a config"""
+    def __init__(self, config, generation):
+        """
+        Arguments:
+            config (ConfigParser): A parsed config
+            generation (int): Counts the number of times the config is loaded
+        """
+        super(ConfigSnapshot, self).__init__()
+        self.config = config
+        self.plugins = config.plugins
+        self.name = config.name
+        self.version = config.version
+        self.generation = generation
+        self.fingerprint = get_config_fingerprint(config.plugins)
+
+    def __repr__(self):
+        return "ConfigSnapshot(name={0},version={1},generation={2},"\
+                "fingerprint={3})".format(self.name, self.version,
+                self.generation, self.fingerprint)
+
+
+class ReloadableConfig(object):
+    """Class for holding a config that is reloaded when the file changes"""
+    def __init__(self, config_file, filters=None, interval=1.0):
+        """
+        Arguments:
+            config_file (str): Path to the config file
+            filters (str or list): A filter expression, see Engine
+            interval (float): Seconds between checks of the config file
+        """
+        super(ReloadableConfig, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        self.config_file = config_file
+        self.filters = filters
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.generation = 0
+        self.file_state = self.get_file_state()
+        self.snapshot = self.load()
+        self.failed_reloads = 0
+
+    def get_file_state(self):
+        """Return the modification time and size of the config file"""
+        stat = os.stat(self.config_file)
+        return (getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size)
+
+    def load(self):
+        """
+        Parse and validate the config file
+
+        Returns:
+            snapshot (ConfigSnapshot)
+        """
+        config = ConfigParser(self.config_file)
+        # Building an engine checks that the filter fits the plugins
+        Engine(config.plugins, filters=self.filters)
+        self.generation += 1
+        return ConfigSnapshot(config, self.generation)
+
+    def get(self):
+        """
+        Return the current snapshot of the config
+
+        Use the same snapshot for all plugins of a variant.
+        """
+        return self.snapshot
+
+    def reload(self):
+        """
+        Load the config file and replace the current config if it is ok
+
+        Returns:
+            bool: True if the config was replaced
+        """
+        with self.lock:
+            try:
+                snapshot = self.load()
+            except Exception as error:
+                self.failed_reloads += 1
+                self.logger.error("Could not reload config {0}: {1}".format(
+                    self.config_file, error))
+                return False
+
+            self.snapshot = snapshot
+            self.logger.info("Reloaded config {0}".format(snapshot))
+            return True
+
+    def check(self):
+        """
+        Reload the config if the file has changed since the last check
+
+        Returns:
+            bool: True if the config was replaced
+        """
+        try:
+            file_state = self.get_file_state()
+        except OSError as error:
+            self.logger.warning("Could not check config {0}: {1}".format(
+                self.config_file, error))
+            return False
+
+        if file_state == self.file_state:
+            return False
+        self.file_state = file_state
+        return self.reload()
+
+    def watch(self):
+        """Check the config file every interval seconds until stopped"""
+        while not self.stop_event.wait(self.interval):
+            self.check()
+
+    def start(self):
+        """Start a thread that watches the config file"""
+        if self.thread is not None:
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.watch, name='config-watcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        """Stop watching the config file"""
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def extract(self, vcf_lines, dict_key=None, individual_id=None):
+        """
+        Run the plugins of the current config on all variants in a vcf
+
+        The config is looked up once per variant, so a reload takes effect
+        from the next variant.
+
+        Arguments:
+            vcf_lines (iterable): An iterable with vcf lines
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+
+        Yields:
+            (variant_dict, values, snapshot): For each variant that passes
+                                              the filter
+        """
+        header = HeaderParser()
+        engines = {}
+        for line in vcf_lines:
+            if line.startswith('#'):
+                header.parse_line(line)
+                continue
+            if not line.strip():
+                continue
+
+            snapshot = self.snapshot
+            if snapshot.generation not in engines:
+                engines.clear()
+                engines[snapshot.generation] = Engine(
+                    snapshot.plugins, filters=self.filters, header=header)
+            engine = engines[snapshot.generation]
+
+            variant_dict = get_variant_dict(line, header.header)
+            values = engine.get_values(
+                variant_dict=variant_dict,
+                dict_key=dict_key,
+                individual_id=individual_id
+            )
+            if values is not None:
+                yield variant_dict, values, snapshot
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
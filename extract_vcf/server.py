@@ -0,0 +1,569 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+server.py
+
+A local extraction service that keeps configs loaded between requests.
+
+Clients send single variants to the service, either through the python api
+or as json over http on localhost. Requests that arrive at the same time are
+collected into batches by a batcher thread, each batch is run by the engine
+in a process pool (or in the batcher thread if no processes are used) and
+the results are sent back to each client.
+
+    python -m extract_vcf.server --config example=config.ini --port 8765
+
+    POST /extract {"config": "example", "variant_line": "1\\t879537\\t...",
+                   "vcf_header": [...], "csq_format": [...]}
+    -> {"values": {...}, "config_name": "example", "config_version": 0.1,
+        "generation": 1}
+
+    GET /stats -> {"requests": 10, "batches": 3, "latency": {"p50": ..}}
+
+The configs are ReloadableConfigs so the service picks up config changes
+without a restart.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+
+try:
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+except ImportError:
+    ThreadingHTTPServer = None
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from extract_vcf.plan import ExtractionPlan
+from extract_vcf.reloadable_config import ReloadableConfig
+
+
+# The plans that a worker process has got, by plan key
+worker_plans = {}
+
+
+def run_batch(plan, variant_lines):
+    """
+    Run the engine of a plan on a batch of variant lines
+
+    Arguments:
+        plan (ExtractionPlan): The plugins, header, dict_key and
+                               individual_id of the batch
+        variant_lines (list): Vcf variant lines
+
+    Returns:
+        results (list): The values of each variant
+    """
+    engine = plan.get_engine()
+    return [
+        engine.get_values(variant_line=line, dict_key=plan.dict_key,
+                          individual_id=plan.individual_id)
+        for line in variant_lines
+    ]
+
+
+def keep_plan(plans, key, plan):
+    """
+    Keep a plan by key and drop the plans of older config generations
+
+    Arguments:
+        plans (dict): Plans by key
+        key (tuple): (config, generation, vcf_header, csq_format, dict_key,
+                      individual_id)
+        plan (ExtractionPlan)
+    """
+    for old_key in list(plans):
+        if old_key[0] == key[0] and old_key[1] != key[1]:
+            del plans[old_key]
+    plans[key] = plan
+
+
+def run_worker_batch(key, variant_lines, plan=None):
+    """
+    Run a batch in a worker process
+
+    The plan of a key is sent to a worker only once, later batches only
+    send the variant lines. The plan is built from the config snapshot of
+    the batch, so the worker runs the same plugins as the service even if
+    the config file has changed since.
+
+    Arguments:
+        key (tuple): The plan key, see keep_plan
+        variant_lines (list): Vcf variant lines
+        plan (ExtractionPlan): The plan if the worker has not got it
+
+    Returns:
+        results (list): The values of each variant or None if the worker
+                        does not have the plan of the key
+    """
+    if plan is not None:
+        keep_plan(worker_plans, key, plan)
+    elif key not in worker_plans:
+        return None
+    return run_batch(worker_plans[key], variant_lines)
+
+
+def check_request(request, configs):
+    """
+    Check that a request can be extracted
+
+    Arguments:
+        request (dict): The request
+        configs (dict): The configs of the service
+
+    Raises:
+        KeyError: If the config is unknown
+        ValueError: If the request has no variant_line
+    """
+    if not isinstance(request, dict):
+        raise ValueError("A request must be a json object")
+    if request.get('config') not in configs:
+        raise KeyError("Unknown config: {0}".format(request.get('config')))
+    if not request.get('variant_line'):
+        raise ValueError("A variant_line must be provided")
+
+
+def to_json(content):
+    """
+    Return content with NaN values replaced by None
+
+    Arguments:
+        content: A value, list or dictionary
+
+    Returns:
+        content: The same structure, where None is written as null
+    """
+    if isinstance(content, float) and content != content:
+        return None
+    if isinstance(content, dict):
+        return dict((key, to_json(content[key])) for key in content)
+    if isinstance(content, (list, tuple)):
+        return [to_json(value) for value in content]
+    return content
+
+
+def fail_futures(items, error):
+    """
+    Set an exception on the futures of requests that are not done
+
+    Arguments:
+        items (list): A list of (start_time, request, future)
+        error (Exception): The exception to set
+    """
+    for start, request, future in items:
+        if not future.done():
+            future.set_exception(error)
+
+
+class LatencyStats(object):
+    """Class for keeping the latencies of the most recent requests"""
+    def __init__(self, size=10000):
+        super(LatencyStats, self).__init__()
+        self.latencies = deque(maxlen=size)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        with self.lock:
+            self.latencies.append(latency)
+            self.count += 1
+
+    def percentiles(self, percents=(50, 90, 99)):
+        """
+        Return latency percentiles in seconds
+
+        Arguments:
+            percents (iterable): The percentiles to compute
+
+        Returns:
+            percentiles (dict): Like {'p50': 0.001, 'p90': 0.002}
+        """
+        with self.lock:
+            latencies = sorted(self.latencies)
+        result = {}
+        for percent in percents:
+            if latencies:
+                index = min(len(latencies) - 1,
+                            int(round(percent / 100.0 * len(latencies))) - 1)
+                result['p{0}'.format(percent)] = latencies[max(index, 0)]
+            else:
+                result['p{0}'.format(percent)] = None
+        return result
+
+
+class ExtractionService(object):
+    """Class for extracting single variants with batching of requests"""
+    def __init__(self, configs, processes=0, batch_size=64, max_delay=0.005,
+                 reload_interval=1.0):
+        """
+        Arguments:
+            configs (dict): Config names as keys and config files as values
+            processes (int): Number of worker processes. If 0 the batches are
+                             run in the batcher thread
+            batch_size (int): The largest number of requests in a batch
+            max_delay (float): Seconds to wait for more requests to a batch
+            reload_interval (float): Seconds between checks of the config
+                                     files, None to never reload
+        """
+        super(ExtractionService, self).__init__()
+        self.logger = logging.getLogger(__name__)
+
+        self.configs = {}
+        for name in configs:
+            self.configs[name] = ReloadableConfig(
+                configs[name], interval=reload_interval or 1.0)
+            if reload_interval:
+                self.configs[name].start()
+
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.pool = None
+        if processes:
+            self.pool = ProcessPoolExecutor(max_workers=processes)
+
+        self.requests = queue.Queue()
+        self.latency = LatencyStats()
+        self.batch_count = 0
+        # Plans by key, the engines of a plan are kept between batches
+        self.plans = {}
+        # Batches that are run in the pool and not finished
+        self.in_flight = 0
+        self.in_flight_done = threading.Condition()
+
+        # Held while a request is queued so that close can not miss it
+        self.lock = threading.Lock()
+        self.running = True
+        self.batcher = threading.Thread(target=self.run_batcher, name='batcher')
+        self.batcher.daemon = True
+        self.batcher.start()
+
+    def submit(self, request):
+        """
+        Submit a request for one variant
+
+        Arguments:
+            request (dict): A dictionary with 'config', 'variant_line' and
+                            optionally 'vcf_header', 'csq_format', 'dict_key'
+                            and 'individual_id'
+
+        Returns:
+            future (Future): Gets the result dictionary
+        """
+        future = Future()
+        try:
+            check_request(request, self.configs)
+        except (KeyError, ValueError) as error:
+            future.set_exception(error)
+            return future
+        with self.lock:
+            if not self.running:
+                future.set_exception(RuntimeError("The service is closed"))
+                return future
+            self.requests.put((time.time(), request, future))
+        return future
+
+    def extract(self, request, timeout=None):
+        """Submit a request and wait for the result"""
+        return self.submit(request).result(timeout)
+
+    def collect_batch(self):
+        """
+        Wait for a request and collect the requests that arrive within
+        max_delay, at most batch_size
+
+        Returns:
+            batch (list): A list of (start_time, request, future)
+        """
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def run_batcher(self):
+        """Collect requests into batches and run them until closed"""
+        while self.running:
+            batch = self.collect_batch()
+            if not batch:
+                continue
+
+            # Requests that can share an engine are run together
+            groups = {}
+            for item in batch:
+                request = item[1]
+                key = (
+                    request['config'],
+                    tuple(request.get('vcf_header') or []),
+                    tuple(request.get('csq_format') or []),
+                    request.get('dict_key'),
+                    request.get('individual_id'),
+                )
+                groups.setdefault(key, []).append(item)
+
+            for key in groups:
+                try:
+                    self.run_group(key, groups[key])
+                except Exception as error:
+                    # One bad group must not stop the batcher
+                    self.logger.exception("Could not run a batch")
+                    fail_futures(groups[key], error)
+
+    def get_plan(self, key, snapshot):
+        """
+        Return the plan of a group, a new plan is built once per config
+        generation
+
+        Arguments:
+            key (tuple): (config, vcf_header, csq_format, dict_key, individual_id)
+            snapshot (ConfigSnapshot): The config snapshot of the group
+
+        Returns:
+            plan_key (tuple): The key of the plan, see keep_plan
+            plan (ExtractionPlan)
+        """
+        config_name, vcf_header, csq_format, dict_key, individual_id = key
+        plan_key = (config_name, snapshot.generation) + key[1:]
+        plan = self.plans.get(plan_key)
+        if plan is None:
+            plan = ExtractionPlan(
+                snapshot.plugins, vcf_header=vcf_header, csq_format=csq_format,
+                dict_key=dict_key, individual_id=individual_id,
+                vectorize=False)
+            keep_plan(self.plans, plan_key, plan)
+        return plan_key, plan
+
+    def run_group(self, key, items):
+        """
+        Run a group of requests that share config and header
+
+        Arguments:
+            key (tuple): (config, vcf_header, csq_format, dict_key, individual_id)
+            items (list): A list of (start_time, request, future)
+        """
+        snapshot = self.configs[key[0]].get()
+        plan_key, plan = self.get_plan(key, snapshot)
+        variant_lines = [item[1]['variant_line'] for item in items]
+        self.batch_count += 1
+
+        def finish(results=None, error=None):
+            for i, (start, request, future) in enumerate(items):
+                self.latency.add(time.time() - start)
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result({
+                        'values': results[i],
+                        'config_name': snapshot.name,
+                        'config_version': snapshot.version,
+                        'generation': snapshot.generation,
+                    })
+
+        if self.pool is None:
+            try:
+                results = run_batch(plan, variant_lines)
+            except Exception as error:
+                finish(error=error)
+            else:
+                finish(results)
+            return
+
+        def finish_in_flight(results=None, error=None):
+            finish(results, error)
+            with self.in_flight_done:
+                self.in_flight -= 1
+                self.in_flight_done.notify_all()
+
+        def submit(send_plan):
+            # Only the variant lines are sent until a worker misses the plan
+            arguments = [plan_key, variant_lines]
+            if send_plan:
+                arguments.append(plan)
+            try:
+                pool_future = self.pool.submit(run_worker_batch, *arguments)
+            except Exception as error:
+                # Like a BrokenProcessPool
+                finish_in_flight(error=error)
+                return
+            pool_future.add_done_callback(
+                lambda pool_future: done(pool_future, send_plan))
+
+        def done(pool_future, sent_plan):
+            error = pool_future.exception()
+            if error is not None:
+                finish_in_flight(error=error)
+            elif pool_future.result() is None and not sent_plan:
+                submit(True)
+            else:
+                finish_in_flight(pool_future.result())
+
+        with self.in_flight_done:
+            self.in_flight += 1
+        submit(False)
+
+    def stats(self):
+        """Return statistics of the service"""
+        return {
+            'requests': self.latency.count,
+            'batches': self.batch_count,
+            'latency': self.latency.percentiles(),
+            'configs': {
+                name: {
+                    'version': self.configs[name].get().version,
+                    'generation': self.configs[name].get().generation,
+                }
+                for name in self.configs
+            },
+        }
+
+    def close(self):
+        """Stop the batcher, the config watchers and the worker processes"""
+        with self.lock:
+            self.running = False
+        self.batcher.join()
+        # Batches in the pool finish before the pool is shut down
+        with self.in_flight_done:
+            while self.in_flight:
+                self.in_flight_done.wait()
+        # Requests that were never collected into a batch
+        pending = []
+        while True:
+            try:
+                pending.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        fail_futures(pending, RuntimeError("The service is closed"))
+        for name in self.configs:
+            self.configs[name].stop()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+def get_handler(service):
+    """Return a http request handler class for a service"""
+    class ExtractionHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, content):
+            body = json.dumps(to_json(content)).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self.send_json(200, service.stats())
+            else:
+                self.send_json(404, {'error': 'Unknown path'})
+
+        def do_POST(self):
+            if self.path != '/extract':
+                self.send_json(404, {'error': 'Unknown path'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                request = json.loads(self.rfile.read(length).decode('utf-8'))
+                check_request(request, service.configs)
+            except Exception as error:
+                # The request is malformed
+                self.send_json(400, {'error': str(error)})
+                return
+            try:
+                result = service.extract(request)
+            except Exception as error:
+                service.logger.warning("Could not extract a request: {0}".format(
+                    error))
+                self.send_json(500, {'error': str(error)})
+                return
+            self.send_json(200, result)
+
+        def log_message(self, format, *args):
+            service.logger.debug(format % args)
+
+    return ExtractionHandler
+
+
+class ExtractionServer(object):
+    """Class for serving an ExtractionService over http on localhost"""
+    def __init__(self, service, host='127.0.0.1', port=0):
+        """
+        Arguments:
+            service (ExtractionService): The service
+            host (str): The address to listen on
+            port (int): The port, 0 picks a free port
+        """
+        super(ExtractionServer, self).__init__()
+        if ThreadingHTTPServer is None:
+            raise ImportError("The extraction server needs python 3.7 or later")
+        self.service = service
+        self.httpd = ThreadingHTTPServer((host, port), get_handler(service))
+        self.host, self.port = self.httpd.server_address[:2]
+        self.thread = None
+
+    def start(self):
+        """Serve requests in a background thread"""
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name='extraction-server')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def close(self):
+        """Stop serving and close the service"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread is not None:
+            self.thread.join()
+        self.service.close()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Local extraction service")
+    parser.add_argument('--config', action='append', required=True,
+                        help="A config as name=path, can be repeated")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--processes', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.005)
+    options = parser.parse_args(args)
+
+    configs = dict(config.split('=', 1) for config in options.config)
+    service = ExtractionService(
+        configs,
+        processes=options.processes,
+        batch_size=options.batch_size,
+        max_delay=options.max_delay
+    )
+    server = ExtractionServer(service, host=options.host, port=options.port)
+    print("Serving on http://{0}:{1}".format(server.host, server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+shards.py
+
+Split the extraction of a sorted vcf into shards by contig, run the shards
+in parallel and merge the results in the order of the contigs in the
+header.
+
+The contigs are taken from the '##contig' lines of the header. A contig
+that is longer than shard_length is split into regions of at most
+shard_length bases. A variant belongs to the shard that holds its
+position, so no variant is counted twice:
+
+    extractor = ShardedExtractor(configs.plugins, workers=8,
+                                 shard_length=10000000)
+    for row in extractor.extract("file.vcf.gz"):
+        print(row)
+    print(extractor.report())
+
+If pysam is installed and the vcf has a tabix or csi index each shard only
+reads its own region. Otherwise each shard scans the file for its contig,
+which gives the same result but reads more, a warning is logged when a
+shard_length is used without an index. Install pysam with
+'pip install extract_vcf[tabix]'.
+
+Variants on contigs that are not in the header are not extracted.
+"""
+
+from __future__ import print_function
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from timeit import default_timer
+
+try:
+    import pysam
+except ImportError:
+    pysam = None
+
+from extract_vcf import plan as plan_module
+from extract_vcf.plan import ExtractionPlan, init_worker
+from extract_vcf.reader import open_vcf, read_header
+
+logger = logging.getLogger(__name__)
+
+
+class Shard(object):
+    """Class for holding a region of a contig"""
+    __slots__ = ('index', 'contig', 'start', 'end')
+
+    def __init__(self, index, contig, start=1, end=None):
+        """
+        Arguments:
+            index (int): The order of the shard in the output
+            contig (str): The contig id
+            start (int): The first position, 1 based
+            end (int): The last position, None for the end of the contig
+        """
+        super(Shard, self).__init__()
+        self.index = index
+        self.contig = contig
+        self.start = start
+        self.end = end
+
+    @property
+    def region(self):
+        """The region as a string like '1:1-1000000'"""
+        if self.end is None:
+            if self.start == 1:
+                return self.contig
+            return "{0}:{1}-".format(self.contig, self.start)
+        return "{0}:{1}-{2}".format(self.contig, self.start, self.end)
+
+    def contains(self, contig, position):
+        """Return True if a position is in the shard"""
+        if contig != self.contig or position < self.start:
+            return False
+        return self.end is None or position <= self.end
+
+    def __repr__(self):
+        return "Shard(index={0},region={1})".format(self.index, self.region)
+
+
+def get_shards(header, shard_length=None, contigs=None):
+    """
+    Return the shards of a vcf, in the order of the contigs in the header
+
+    Arguments:
+        header (HeaderParser): The parsed header of the vcf
+        shard_length (int): The largest number of bases in a shard, None to
+                            use one shard per contig
+        contigs (list): Only use these contigs
+
+    Returns:
+        shards (list): A list of Shards
+    """
+    if not header.contig_dict:
+        raise ValueError("The vcf header has no contig lines, "
+                         "they are needed to split the vcf in shards")
+    shards = []
+    for contig in header.contig_dict:
+        if contigs is not None and contig not in contigs:
+            continue
+        length = header.contig_dict[contig]
+        # A contig without a positive length gets one open shard
+        length = int(length) if length else 0
+        if not shard_length or length <= 0:
+            shards.append(Shard(len(shards), contig))
+            continue
+        for start in range(1, length + 1, shard_length):
+            end = min(start + shard_length - 1, length)
+            if end == length:
+                # Positions past the declared length still get a shard
+                end = None
+            shards.append(Shard(len(shards), contig, start, end))
+    return shards
+
+
+def get_index_file(path):
+    """Return the path to the tabix or csi index of a vcf, or None"""
+    for suffix in ['.tbi', '.csi']:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return None
+
+
+def iter_shard_lines(path, shard):
+    """
+    Yield the variant lines in a shard
+
+    Arguments:
+        path (str): Path to a sorted vcf
+        shard (Shard): The shard
+
+    Yields:
+        line (str): Vcf variant lines
+    """
+    if pysam is not None and get_index_file(path):
+        tabix_file = pysam.TabixFile(path)
+        try:
+            if shard.contig not in tabix_file.contigs:
+                return
+            for line in tabix_file.fetch(
+                    shard.contig, shard.start - 1, shard.end):
+                # Variants that start before the region can overlap it
+                if shard.contains(shard.contig, int(line.split('\t', 2)[1])):
+                    yield line
+        finally:
+            tabix_file.close()
+        return
+
+    with open_vcf(path) as vcf_handle:
+        seen_contig = False
+        for line in vcf_handle:
+            if line.startswith('#') or not line.strip():
+                continue
+            contig, position = line.split('\t', 2)[:2]
+            if contig != shard.contig:
+                if seen_contig:
+                    # The vcf is sorted so the contig is done
+                    break
+                continue
+            seen_contig = True
+            position = int(position)
+            if shard.end is not None and position > shard.end:
+                break
+            if position >= shard.start:
+                yield line
+
+
+def run_shard(plan, path, shard, chunk_size=10000):
+    """
+    Run a plan on the variants in a shard
+
+    Arguments:
+        plan (ExtractionPlan): The plan
+        path (str): Path to a sorted vcf
+        shard (Shard): The shard
+        chunk_size (int): Number of lines to run at a time
+
+    Returns:
+        (columns, stats): The columns as from ExtractionPlan.run_chunk and a
+                          dictionary with 'variants', 'passed_variants' and
+                          'elapsed' seconds
+    """
+    start = default_timer()
+    columns = [[] for field in plan.row_fields]
+    variants = 0
+    chunk = []
+
+    def run_chunk():
+        for column, values in zip(columns, plan.run_chunk(chunk)):
+            column.extend(values)
+        del chunk[:]
+
+    for line in iter_shard_lines(path, shard):
+        chunk.append(line)
+        variants += 1
+        if len(chunk) >= chunk_size:
+            run_chunk()
+    run_chunk()
+
+    return columns, {
+        'variants': variants,
+        'passed_variants': len(columns[0]),
+        'elapsed': default_timer() - start,
+    }
+
+
+def run_worker_shard(path, shard, chunk_size=10000):
+    """Run the plan of the worker on a shard, see run_shard"""
+    if plan_module.worker_plan is None:
+        raise RuntimeError("The worker has no plan, use init_worker")
+    return run_shard(plan_module.worker_plan, path, shard, chunk_size)
+
+
+class ShardedExtractor(object):
+    """Class for running plugins on the shards of a sorted vcf in parallel"""
+    def __init__(self, plugins, filters=None, workers=4, shard_length=None,
+                 contigs=None, dict_key=None, individual_id=None,
+                 progress=None):
+        """
+        Arguments:
+            plugins (dict): A dictionary with plugin names as keys and
+                            Plugin objects as values
+            filters (str or list): A filter expression, see Engine
+            workers (int): Number of processes
+            shard_length (int): The largest number of bases in a shard, None
+                                to use one shard per contig
+            contigs (list): Only extract these contigs
+            dict_key (str): The key used by dict_entry plugins
+            individual_id (str): The individual used by sample_id plugins
+            progress (callable): Called with (shard, stats) when a shard is
+                                 done
+        """
+        super(ShardedExtractor, self).__init__()
+        self.logger = logging.getLogger(__name__)
+        self.plugins = plugins
+        self.filters = filters
+        self.workers = workers
+        self.shard_length = shard_length
+        self.contigs = contigs
+        self.dict_key = dict_key
+        self.individual_id = individual_id
+        self.progress = progress
+
+        self.shards = []
+        self.shard_stats = {}
+        self.elapsed = 0.0
+
+    def get_plan(self, path):
+        """Read the header of a vcf and return the plan and the shards"""
+        with open_vcf(path) as vcf_handle:
+            header, variant_lines = read_header(vcf_handle)
+        plan = ExtractionPlan(
+            self.plugins,
+            filters=self.filters,
+            vcf_header=header.header,
+            csq_format=header.csq_format,
+            info_dict=header.info_dict,
+            dict_key=self.dict_key,
+            individual_id=self.individual_id
+        )
+        shards = get_shards(header, self.shard_length, self.contigs)
+        if self.shard_length and not (pysam is not None and get_index_file(path)):
+            self.logger.warning(
+                "{0} has no index or pysam is not installed, each of the {1} "
+                "shards scans the file for its contig".format(
+                    path, len(shards)))
+        return plan, shards
+
+    def finish_shard(self, shard, stats):
+        """Keep the statistics of a finished shard and report progress"""
+        self.shard_stats[shard.index] = stats
+        self.logger.info(
+            "Shard {0} ({1} of {2}) done: {3} variants in {4:.2f} s".format(
+                shard.region, len(self.shard_stats), len(self.shards),
+                stats['variants'], stats['elapsed']))
+        if self.progress is not None:
+            self.progress(shard, stats)
+
+    def extract_columns(self, path):
+        """
+        Run the plugins on all shards and yield the columns of each shard
+
+        Arguments:
+            path (str): Path to a sorted vcf
+
+        Yields:
+            (shard, row_fields, columns): For each shard, in header order
+        """
+        start = default_timer()
+        plan, self.shards = self.get_plan(path)
+        self.shard_stats = {}
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=init_worker, initargs=(plan,))
+        futures = {
+            executor.submit(run_worker_shard, path, shard): shard
+            for shard in self.shards
+        }
+        # Shards that are done but wait for an earlier shard
+        done = {}
+        next_index = 0
+        try:
+            for future in as_completed(futures):
+                shard = futures[future]
+                columns, stats = future.result()
+                self.finish_shard(shard, stats)
+                done[shard.index] = columns
+                while next_index in done:
+                    yield (self.shards[next_index], plan.row_fields,
+                           done.pop(next_index))
+                    next_index += 1
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown()
+            self.elapsed = default_timer() - start
+
+    def extract(self, path):
+        """
+        Run the plugins on all shards of a sorted vcf
+
+        Arguments:
+            path (str): Path to a sorted vcf
+
+        Yields:
+            row (tuple): (CHROM, POS, value, ...) for each variant that passes
+                         the filter, in header contig order
+        """
+        for shard, row_fields, columns in self.extract_columns(path):
+            for row in zip(*columns):
+                yield row
+
+    def report(self):
+        """
+        Return the statistics of the last run
+
+        Returns:
+            report (dict): The 'elapsed' seconds, the variant counts and the
+                           statistics of each shard in 'shards'
+        """
+        shards = []
+        for shard in self.shards:
+            stats = dict(self.shard_stats.get(shard.index, {}))
+            stats['region'] = shard.region
+            stats['done'] = shard.index in self.shard_stats
+            shards.append(stats)
+        return {
+            'elapsed': self.elapsed,
+            'variants': sum(
+                stats.get('variants', 0) for stats in self.shard_stats.values()),
+            'passed_variants': sum(
+                stats.get('passed_variants', 0)
+                for stats in self.shard_stats.values()),
+            'shards': shards,
+        }
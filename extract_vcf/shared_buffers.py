@@ -0,0 +1,369 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+shared_buffers.py
+
+Run plugins in worker processes that write the values straight into shared
+memory instead of sending them back as python objects.
+
+For each chunk in flight the main process has a block of shared memory with
+one fixed width numpy column per field, using the same types as the column
+store:
+
+    CHROM: int32 index into a string table
+    POS: int64
+    float: float64, missing values are NaN
+    integer: int64, missing values are the smallest int64
+    flag: bool, missing values are False
+    string: int32 index into a string table, missing is -1
+
+A worker runs the plan on a chunk of lines, writes the columns into the
+block and only returns the number of rows and the strings that the chunk
+added to the string tables. The main process copies the columns out of the
+block and reuses it for the next chunk:
+
+    for chunk in extract_shared("file.vcf.gz", configs.plugins, workers=8):
+        print(chunk.size, chunk.columns['1000G'].mean())
+        print(chunk.get_strings('Filter'))
+
+This module requires numpy and python 3.8 or later, install with
+'pip install extract_vcf[numpy]'.
+"""
+
+from __future__ import print_function
+
+import itertools
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+from six import string_types
+
+from extract_vcf import plan as plan_module
+from extract_vcf.column_store import get_dtype, StringTable
+from extract_vcf.parallel import iter_chunks
+from extract_vcf.plan import ExtractionPlan, init_worker
+from extract_vcf.reader import open_vcf, read_header
+
+logger = logging.getLogger(__name__)
+
+NUMERIC_TYPES = ['float', 'integer', 'flag']
+
+
+def check_dependencies():
+    """Raise an ImportError if numpy or shared memory is missing"""
+    if np is None:
+        raise ImportError(
+            "numpy is needed for shared memory buffers, "
+            "install with 'pip install extract_vcf[numpy]'")
+    if shared_memory is None:
+        raise ImportError("Shared memory buffers need python 3.8 or later")
+
+
+def attach_buffer(name):
+    """
+    Open a block of shared memory that the main process has created
+
+    Arguments:
+        name (str): The name of the block
+
+    Returns:
+        buffer (SharedMemory)
+    """
+    try:
+        # The main process owns the block, so the worker should not track it
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+class BufferLayout(object):
+    """Class for describing the columns in a block of shared memory"""
+    def __init__(self, plan, capacity):
+        """
+        Arguments:
+            plan (ExtractionPlan): The plan that the workers run
+            capacity (int): The largest number of rows in a block
+        """
+        super(BufferLayout, self).__init__()
+        self.fields = plan.row_fields
+        self.capacity = capacity
+
+        self.dtypes = [np.dtype('int32'), np.dtype('int64')]
+        self.missing = [-1, 0]
+        # The strings that have the same index in all chunks
+        self.fixed_strings = {'CHROM': []}
+        for name in plan.plugin_names:
+            plugin = plan.plugins[name]
+            self.dtypes.append(get_dtype(plugin.data_type))
+            if plugin.data_type in NUMERIC_TYPES:
+                self.missing.append({
+                    'float': float('nan'),
+                    'integer': int(np.iinfo(np.int64).min),
+                    'flag': False,
+                }[plugin.data_type])
+            else:
+                self.missing.append(-1)
+                self.fixed_strings[name] = sorted(plugin.string_rules)
+
+        self.offsets = []
+        offset = 0
+        for dtype in self.dtypes:
+            self.offsets.append(offset)
+            size = dtype.itemsize * capacity
+            # Keep all columns aligned to 8 bytes
+            offset += size + (-size % 8)
+        self.size = max(offset, 8)
+
+    def get_arrays(self, buffer):
+        """
+        Return numpy views of the columns in a block
+
+        Arguments:
+            buffer (memoryview): The buffer of a SharedMemory block
+
+        Returns:
+            arrays (list): One array per field
+        """
+        return [
+            np.ndarray((self.capacity,), dtype=dtype, buffer=buffer,
+                       offset=offset)
+            for dtype, offset in zip(self.dtypes, self.offsets)
+        ]
+
+    def fill(self, arrays, columns):
+        """
+        Write the columns from ExtractionPlan.run_chunk into the arrays
+
+        Strings that are not in the fixed strings get indexes after the
+        fixed strings, in the order they are first seen in the chunk.
+
+        Arguments:
+            arrays (list): From get_arrays
+            columns (list): One list of values per field
+
+        Returns:
+            new_strings (dict): The strings the chunk added, per field
+        """
+        new_strings = {}
+        for i, field in enumerate(self.fields):
+            array = arrays[i]
+            column = columns[i]
+            if field == 'POS':
+                array[:len(column)] = [int(value) for value in column]
+                continue
+
+            missing = self.missing[i]
+            array[:len(column)] = missing
+            if field in self.fixed_strings:
+                table = StringTable(self.fixed_strings[field])
+                fixed_count = len(table.strings)
+                for row, value in enumerate(column):
+                    if value is not None:
+                        array[row] = table.get_index(str(value))
+                new_strings[field] = table.strings[fixed_count:]
+                continue
+
+            for row, value in enumerate(column):
+                if value is None:
+                    continue
+                try:
+                    array[row] = value
+                except (TypeError, ValueError, OverflowError):
+                    continue
+        return new_strings
+
+
+def run_worker_chunk_shared(lines, buffer_name, capacity):
+    """
+    Run the plan of the worker on a chunk and write the values to a block
+
+    Arguments:
+        lines (list): Vcf variant lines, at most capacity
+        buffer_name (str): The name of the SharedMemory block
+        capacity (int): The capacity of the block
+
+    Returns:
+        (size, new_strings): The number of rows and the strings the chunk
+                             added to the string tables
+    """
+    plan = plan_module.worker_plan
+    if plan is None:
+        raise RuntimeError("The worker has no plan, use init_worker")
+    columns = plan.run_chunk(lines)
+
+    layout = BufferLayout(plan, capacity)
+    buffer = attach_buffer(buffer_name)
+    try:
+        arrays = layout.get_arrays(buffer.buf)
+        new_strings = layout.fill(arrays, columns)
+        del arrays
+    finally:
+        buffer.close()
+    return len(columns[0]), new_strings
+
+
+class ColumnChunk(object):
+    """Class for holding the columns of one chunk"""
+    __slots__ = ('size', 'columns', 'string_tables')
+
+    def __init__(self, size, columns, string_tables):
+        """
+        Arguments:
+            size (int): The number of rows
+            columns (dict): Field names as keys and numpy arrays as values
+            string_tables (dict): StringTables of the string fields
+        """
+        super(ColumnChunk, self).__init__()
+        self.size = size
+        self.columns = columns
+        self.string_tables = string_tables
+
+    def get_strings(self, field):
+        """
+        Return the values of a string column as strings
+
+        Arguments:
+            field (str): CHROM or the name of a string plugin
+
+        Returns:
+            strings (list): The strings, None for missing values
+        """
+        strings = self.string_tables[field].strings
+        return [
+            strings[index] if index >= 0 else None
+            for index in self.columns[field].tolist()
+        ]
+
+
+def extract_shared(source, plugins, filters=None, workers=4, chunk_size=10000,
+                   max_pending=None, dict_key=None, individual_id=None):
+    """
+    Run plugins on all variants in a vcf in worker processes that write the
+    values to shared memory
+
+    Arguments:
+        source (str or iterable): Path to a vcf or an iterable with vcf lines
+        plugins (dict): A dictionary with plugin names as keys and
+                        Plugin objects as values
+        filters (str or list): A filter expression, see Engine
+        workers (int): Number of processes
+        chunk_size (int): Number of vcf lines in each chunk
+        max_pending (int): Number of chunks, and shared memory blocks, in
+                           flight, 2 * workers if None
+        dict_key (str): The key used by dict_entry plugins
+        individual_id (str): The individual used by sample_id plugins
+
+    Yields:
+        chunk (ColumnChunk): The columns of each chunk, in the order of the
+                             vcf
+    """
+    check_dependencies()
+    if max_pending is None:
+        max_pending = 2 * workers
+
+    vcf_handle = source
+    if isinstance(source, string_types):
+        vcf_handle = open_vcf(source)
+
+    blocks = []
+    try:
+        header, variant_lines = read_header(vcf_handle)
+        plan = ExtractionPlan(
+            plugins,
+            filters=filters,
+            vcf_header=header.header,
+            csq_format=header.csq_format,
+            info_dict=header.info_dict,
+            dict_key=dict_key,
+            individual_id=individual_id
+        )
+        layout = BufferLayout(plan, chunk_size)
+        string_tables = {
+            field: StringTable(layout.fixed_strings[field])
+            for field in layout.fixed_strings
+        }
+
+        for i in range(max_pending):
+            blocks.append(shared_memory.SharedMemory(
+                create=True, size=layout.size))
+        free_blocks = deque(blocks)
+        logger.debug("Created {0} shared memory blocks of {1} bytes".format(
+            len(blocks), layout.size))
+
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=init_worker, initargs=(plan,))
+        chunks = iter_chunks(variant_lines, chunk_size)
+        pending = deque()
+
+        def submit():
+            for lines in itertools.islice(chunks, 1):
+                block = free_blocks.popleft()
+                pending.append((block, executor.submit(
+                    run_worker_chunk_shared, lines, block.name, chunk_size)))
+
+        try:
+            for block in blocks:
+                submit()
+            while pending:
+                block, future = pending.popleft()
+                size, new_strings = future.result()
+
+                arrays = layout.get_arrays(block.buf)
+                columns = {}
+                for i, field in enumerate(layout.fields):
+                    column = np.array(arrays[i][:size])
+                    if field in new_strings:
+                        column = remap_strings(
+                            column, string_tables[field],
+                            len(layout.fixed_strings[field]),
+                            new_strings[field])
+                    columns[field] = column
+                del arrays
+
+                free_blocks.append(block)
+                submit()
+                yield ColumnChunk(size, columns, string_tables)
+        finally:
+            for block, future in pending:
+                future.cancel()
+            executor.shutdown()
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+        if vcf_handle is not source:
+            vcf_handle.close()
+
+
+def remap_strings(column, table, fixed_count, new_strings):
+    """
+    Change the chunk indexes of new strings to indexes in a string table
+
+    Arguments:
+        column (numpy.ndarray): The string indexes of a chunk
+        table (StringTable): The string table of the field
+        fixed_count (int): Number of fixed strings, they have the same index
+                           in the chunk and in the table
+        new_strings (list): The strings the chunk added
+
+    Returns:
+        column (numpy.ndarray)
+    """
+    if not new_strings:
+        return column
+    mapping = np.array(
+        [table.get_index(string) for string in new_strings], dtype=column.dtype)
+    new = column >= fixed_count
+    column[new] = mapping[column[new] - fixed_count]
+    return column
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+vectorized.py
+
+Convert and reduce the values of numeric plugins for a whole chunk of
+variants with numpy, instead of calling float or int on each value.
+
+For each plugin the raw annotations of all variants in the chunk are joined
+into one text, with 'nan' for missing values, and the number of values of
+each variant is counted. The text is parsed with one numpy call and the
+'min' or 'max' record rule is applied per variant as a segmented
+reduction:
+
+    values     '0.1,0.3'  '.'   '0.2,.,0.5'
+    text       0.1,0.3,nan,0.2,nan,0.5
+    counts     2          1     3
+    max        0.3        None  0.5
+
+Float and integer plugins with a 'min' or 'max' record rule on an INFO
+annotation, or on a CSQ column, are vectorized. The values are the same as
+from Plugin.get_value:
+
+    - 'nan' values are skipped by both, like missing values.
+    - A plugin with an upper bound for 'max', or a lower bound for 'min',
+      is not vectorized since Plugin.get_value stops at the bound, and
+      does not convert or count the values after it.
+    - The numbers are parsed as 64 bit floats, which hold integers up to
+      2**53 exactly. A chunk of an integer plugin with a value of 16 digits
+      or more gets its values from Plugin.get_value.
+
+If a chunk has a malformed value the plugin falls back to converting the
+values of that chunk one at a time, so the malformed values are counted as
+usual.
+
+ExtractionPlan.run_chunk uses this module when numpy is installed, install
+with 'pip install extract_vcf[numpy]'.
+"""
+
+from __future__ import print_function
+
+import re
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from extract_vcf.converters import Converter, MISSING_VALUES
+
+VECTOR_RULES = ('min', 'max')
+# Vcf values can not hold tabs, so values without separators are joined
+# with tabs
+JOIN_SEPARATOR = '\t'
+MISSING_NUMBER = 'nan'
+# The characters of integers and missing values
+INTEGER_CHARACTERS = '0123456789+-. \t'
+# Integers with this many digits may not be exact as floats
+LONG_INTEGER = re.compile(r'\d{16}')
+
+
+def can_vectorize(plugin, csq_format=None):
+    """
+    Return True if the values of a plugin can be reduced with numpy
+
+    Arguments:
+        plugin (Plugin): A plugin
+        csq_format (list): The CSQ format of the vcf
+
+    Returns:
+        bool
+    """
+    if np is None:
+        return False
+    if plugin.data_type not in ('float', 'integer'):
+        return False
+    if plugin.record_rule not in VECTOR_RULES:
+        return False
+    # The per value reduction stops at a bound
+    if plugin.record_rule == 'max' and plugin.upper_bound is not None:
+        return False
+    if plugin.record_rule == 'min' and plugin.lower_bound is not None:
+        return False
+    if plugin.field != 'INFO' or plugin.dict_entry:
+        return False
+    if plugin.info_key == 'CSQ':
+        return bool(csq_format) and plugin.csq_key in csq_format
+    return True
+
+
+def get_text(plugin, variant_dicts, csq_column=None, get_csq_entries=None):
+    """
+    Join the values of a plugin for a chunk of variants
+
+    Arguments:
+        plugin (Plugin): A plugin that can be vectorized
+        variant_dicts (list): The variant dictionaries of the chunk
+        csq_column (int): The column of the csq_key in the CSQ format
+        get_csq_entries (callable): Returns the splitted CSQ annotation of a
+                                    variant, like Engine.get_csq_entries
+
+    Returns:
+        (texts, counts, separator): The values of each variant joined with
+                                    the separator, '' if the annotation is
+                                    missing, and the number of values of
+                                    each variant
+    """
+    separators = plugin.separators
+    if separators:
+        separator = separators[0]
+    else:
+        separator = JOIN_SEPARATOR
+    other_separators = separators[1:]
+    info_key = plugin.info_key
+    csq = info_key == 'CSQ'
+
+    texts = []
+    counts = []
+    for variant_dict in variant_dicts:
+        if csq:
+            csq_entries = get_csq_entries(variant_dict) or ()
+            text = separator.join(
+                [csq_entry[csq_column] for csq_entry in csq_entries])
+        else:
+            text = variant_dict.get('info_dict', {}).get(info_key)
+            # Flags are annotated as empty lists
+            if not text:
+                text = ''
+        for other_separator in other_separators:
+            text = text.replace(other_separator, separator)
+        texts.append(text)
+        counts.append(text.count(separator) + 1)
+    return texts, counts, separator
+
+
+def parse_numbers(texts, counts, separator, data_type, converter=None):
+    """
+    Parse the values of a chunk with one numpy call
+
+    Arguments:
+        texts (list): The values of each variant from get_text
+        counts (list): The number of values of each variant
+        separator (str): The separator of the values
+        data_type (str): 'float' or 'integer'
+        converter (Converter): Used to convert and count the values one at a
+                               time if some value is malformed
+
+    Returns:
+        numbers (numpy.array): The numbers as floats, NaN where a value is
+                               missing or malformed
+    """
+    # Whole missing annotations are replaced per variant and missing values
+    # in lists in the joined text
+    raw_joined = separator.join(texts)
+    joined = separator.join(
+        [MISSING_NUMBER if text in MISSING_VALUES else text for text in texts])
+    joined = separator + joined + separator
+    for missing in MISSING_VALUES:
+        missing = separator + missing + separator
+        while missing in joined:
+            joined = joined.replace(
+                missing, separator + MISSING_NUMBER + separator)
+    joined = joined[1:-1]
+
+    numbers = None
+    valid = True
+    if data_type == 'integer':
+        # Python int does not take decimals, exponents or 'nan', a '.' that
+        # is left after the missing values are replaced is a decimal point
+        valid = '.' not in joined and not raw_joined.translate(
+            dict.fromkeys(map(ord, INTEGER_CHARACTERS + separator)))
+    if valid:
+        try:
+            numbers = np.array(joined.split(separator), dtype=np.float64)
+        except ValueError:
+            numbers = None
+    if numbers is not None and numbers.size == sum(counts):
+        return numbers
+
+    # Some value is malformed
+    if converter is None:
+        converter = Converter(float if data_type == 'float' else int)
+    numbers = []
+    for text in texts:
+        for token in text.split(separator):
+            number = converter(token)
+            numbers.append(np.nan if number is None else number)
+    return np.array(numbers, dtype=np.float64)
+
+
+def reduce_segments(numbers, counts, record_rule, data_type='float'):
+    """
+    Reduce the numbers of each variant with a record rule
+
+    Arguments:
+        numbers (numpy.array): The numbers of all variants, NaN if missing
+        counts (list): The number of numbers of each variant, at least one
+        record_rule (str): 'min' or 'max'
+        data_type (str): 'float' or 'integer'
+
+    Returns:
+        values (list): The value of each variant, None if all numbers of the
+                       variant are missing
+    """
+    if not counts:
+        return []
+    starts = np.zeros(len(counts), dtype=np.intp)
+    np.cumsum(counts[:-1], out=starts[1:])
+
+    # fmax and fmin skip NaN unless all numbers are NaN
+    if record_rule == 'max':
+        reduced = np.fmax.reduceat(numbers, starts)
+    elif record_rule == 'min':
+        reduced = np.fmin.reduceat(numbers, starts)
+    else:
+        raise ValueError("Record rule can not be vectorized: {0}".format(
+            record_rule))
+
+    if data_type == 'integer':
+        return [None if value != value else int(value)
+                for value in reduced.tolist()]
+    return [None if value != value else value for value in reduced.tolist()]
+
+
+def get_vectorized_values(plugin, variant_dicts, csq_format=None,
+                          get_csq_entries=None, converter=None):
+    """
+    Return the values of a plugin for a chunk of variants
+
+    Arguments:
+        plugin (Plugin): A plugin that can be vectorized
+        variant_dicts (list): The variant dictionaries of the chunk
+        csq_format (list): The CSQ format of the vcf
+        get_csq_entries (callable): Returns the splitted CSQ annotation of a
+                                    variant, like Engine.get_csq_entries
+        converter (Converter): The converter of the plugin, counts the
+                               malformed values
+
+    Returns:
+        values (list): The same values as from Plugin.get_value, one for
+                       each variant
+    """
+    csq_column = None
+    if plugin.info_key == 'CSQ':
+        csq_column = list(csq_format).index(plugin.csq_key)
+    # Annotations declared with Number=1 are splitted too, so that a list
+    # like '0.1,0.2' is reduced as by Plugin.get_value
+    texts, counts, separator = get_text(
+        plugin, variant_dicts, csq_column=csq_column,
+        get_csq_entries=get_csq_entries)
+
+    if plugin.data_type == 'integer' and any(
+            LONG_INTEGER.search(text) for text in texts):
+        return [
+            plugin.get_value(
+                variant_dict=variant_dict,
+                csq_format=csq_format,
+                csq_entries=get_csq_entries(variant_dict)
+                if csq_column is not None else None,
+                converter=converter)
+            for variant_dict in variant_dicts
+        ]
+    numbers = parse_numbers(texts, counts, separator, plugin.data_type,
+                            converter)
+    return reduce_segments(numbers, counts, plugin.record_rule,
+                           plugin.data_type)
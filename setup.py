@@ -48,7 +48,13 @@ setup(
   zip_safe=False,
   install_requires=[
       'configobj',
+      'futures; python_version < "3"',
   ],
+  extras_require={
+      'arrow': ['pyarrow'],
+      'numpy': ['numpy'],
+      'tabix': ['pysam'],
+  },
   # test_suite='tests',
   classifiers=[
     'Intended Audience :: Developers',
@@ -0,0 +1,134 @@
+from extract_vcf import Plugin
+
+import pytest
+
+HEADER_LINES = [
+    '##fileformat=VCFv4.1\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+]
+
+VARIANT_LINES = [
+    '1\t879537\t.\tT\tC\t100\tPASS\tMQ=1;1000G=0.02;DB\n',
+    '1\t879538\t.\tT\tA\t100\tLowQual\tMQ=1;1000G=0.001\n',
+    '2\t879539\t.\tT\tG\t100\tPASS\t1000G=.\n',
+]
+
+PLUGIN_ARGUMENTS = {
+    '1000G': dict(
+        field='INFO',
+        info_key='1000G',
+        data_type='float',
+        separators=[','],
+        record_rule='max',
+        category='allele_frequencies'
+    ),
+    'MQ': dict(
+        field='INFO',
+        info_key='MQ',
+        data_type='integer',
+        separators=[','],
+        record_rule='max'
+    ),
+    'DB': dict(
+        field='INFO',
+        info_key='DB',
+        data_type='flag',
+    ),
+    'Filter': dict(
+        field='FILTER',
+        data_type='string',
+        separators=[';'],
+        record_rule='max',
+        string_rules={'PASS': 2, 'LowQual': 1}
+    ),
+    'FilterText': dict(
+        field='FILTER',
+        data_type='string',
+        separators=[';'],
+    ),
+    'SIFT': dict(
+        field='INFO',
+        info_key='CSQ',
+        csq_key='SIFT',
+        data_type='float',
+        separators=[','],
+        record_rule='min'
+    ),
+}
+
+def get_plugins(names=('1000G',), record_rules=None, plugin_class=Plugin):
+    """Return a dictionary with the shared plugins
+
+        Arguments:
+            names(iterable): Names of plugins in PLUGIN_ARGUMENTS
+            record_rules(dict): Record rules that replace the defaults,
+                                by plugin name
+            plugin_class(class): Plugin or a subclass of it
+
+        Returns:
+            plugins(dict): A dictionary with plugin names as keys
+    """
+    record_rules = record_rules or {}
+    plugins = {}
+    for name in names:
+        arguments = dict(PLUGIN_ARGUMENTS[name])
+        if name in record_rules:
+            arguments['record_rule'] = record_rules[name]
+        plugins[name] = plugin_class(name=name, **arguments)
+    return plugins
+
+def get_variant_line(i, filters=('PASS',), info='1000G={frequency}'):
+    """Return the variant line with number i
+
+        The variant is at position 1000 + i with a 1000G frequency of i/100.
+
+        Arguments:
+            i(int): The number of the variant
+            filters(tuple): Filters that are used in turn
+            info(str): The INFO field, formatted with the frequency
+
+        Returns:
+            variant_line(str)
+    """
+    return '1\t{0}\t.\tT\tC\t100\t{1}\t{2}\n'.format(
+        1000 + i, filters[i % len(filters)], info.format(frequency=i / 100.0))
+
+def get_vcf_lines(variants=10, **kwargs):
+    """Return the header lines and a number of variant lines
+
+        Arguments:
+            variants(int): The number of variants
+            kwargs: Passed to get_variant_line
+
+        Returns:
+            vcf_lines(list)
+    """
+    lines = list(HEADER_LINES)
+    for i in range(variants):
+        lines.append(get_variant_line(i, **kwargs))
+    return lines
+
+@pytest.fixture
+def make_plugins():
+    """Return the function that builds the shared plugins"""
+    return get_plugins
+
+@pytest.fixture
+def make_variant_line():
+    """Return the function that builds a variant line"""
+    return get_variant_line
+
+@pytest.fixture
+def make_vcf_lines():
+    """Return the function that builds vcf lines"""
+    return get_vcf_lines
+
+@pytest.fixture
+def vcf_lines():
+    """Return a small vcf with an INFO float, integer and flag"""
+    return HEADER_LINES + VARIANT_LINES
+
+@pytest.fixture
+def header_lines():
+    """Return the header lines of a vcf without meta data"""
+    return list(HEADER_LINES)
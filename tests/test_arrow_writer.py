@@ -0,0 +1,39 @@
+from extract_vcf import Engine, ArrowWriter
+
+import pytest
+
+pyarrow = pytest.importorskip('pyarrow')
+import pyarrow.parquet
+
+PLUGIN_NAMES = ('1000G', 'MQ', 'DB', 'Filter')
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_write(tmpdir, file_format, make_plugins, vcf_lines):
+    """Test to write plugin values in small batches"""
+    plugins = make_plugins(PLUGIN_NAMES)
+    path = str(tmpdir.join('values.{0}'.format(file_format)))
+    
+    with ArrowWriter(path, plugins, file_format=file_format, batch_size=2) as writer:
+        writer.write_variants(Engine(plugins).extract(vcf_lines))
+    
+    assert writer.batches == 2
+    
+    if file_format == 'parquet':
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.ipc.open_file(path).read_all()
+    
+    assert table.column('CHROM').to_pylist() == ['1', '1', '2']
+    assert table.column('POS').to_pylist() == [879537, 879538, 879539]
+    assert table.column('1000G').to_pylist() == [0.02, 0.001, None]
+    assert table.column('MQ').to_pylist() == [1, 1, None]
+    assert table.column('DB').to_pylist() == [True, None, None]
+    assert table.column('Filter').to_pylist() == ['PASS', 'LowQual', 'PASS']
+    assert pyarrow.types.is_dictionary(table.schema.field('Filter').type)
+    assert table.schema.field('1000G').metadata[b'category'] == b'allele_frequencies'
+
+def test_wrong_format(tmpdir, make_plugins):
+    """Test that a unknown file format raises exception"""
+    with pytest.raises(ValueError):
+        ArrowWriter(str(tmpdir.join('values.csv')), make_plugins(PLUGIN_NAMES),
+                    file_format='csv')
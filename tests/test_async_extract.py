@@ -0,0 +1,91 @@
+from extract_vcf import Engine, aextract
+
+import asyncio
+import gzip
+import time
+
+def collect(source, plugins, **kwargs):
+    """Return all batches from aextract"""
+    async def run():
+        return [batch async for batch in aextract(source, plugins, **kwargs)]
+    return asyncio.run(run())
+
+def test_same_as_engine(make_plugins, make_vcf_lines):
+    """Test that the batches have the same values as the engine"""
+    lines = make_vcf_lines(10)
+    batches = collect(lines, make_plugins(), chunk_size=4)
+    
+    assert [len(batch) for batch in batches] == [2, 4, 4]
+    assert [values for batch in batches for variant, values in batch] == [
+        values for variant, values in Engine(make_plugins()).extract(lines)]
+
+def test_filter(make_plugins, make_vcf_lines):
+    """Test that the filter is used"""
+    batches = collect(make_vcf_lines(10), make_plugins(), chunk_size=100,
+                      filters="1000G < 0.05")
+    
+    assert len(batches[0]) == 5
+
+def test_interleaved_files(tmpdir, make_plugins, make_vcf_lines):
+    """Test that two gzipped files can be extracted on one loop"""
+    paths = []
+    for variants in [5, 7]:
+        path = str(tmpdir.join('test_{0}.vcf.gz'.format(variants)))
+        with gzip.open(path, 'wt') as vcf_file:
+            vcf_file.writelines(make_vcf_lines(variants))
+        paths.append(path)
+    
+    async def count(path):
+        variants = 0
+        async for batch in aextract(path, make_plugins(), chunk_size=2):
+            variants += len(batch)
+        return variants
+    
+    async def run():
+        return await asyncio.gather(*[count(path) for path in paths])
+    
+    assert asyncio.run(run()) == [5, 7]
+
+def test_early_stop(make_plugins, make_vcf_lines):
+    """Test that the consumer can stop before the end"""
+    async def run():
+        async for batch in aextract(make_vcf_lines(100), make_plugins(),
+                                    chunk_size=10, max_pending=1):
+            return batch
+    
+    assert len(asyncio.run(run())) == 8
+
+class SlowHandle(object):
+    """A vcf handle that reads slowly and records reads after close"""
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.closed = False
+        self.read_after_close = False
+    
+    def __iter__(self):
+        return self
+    
+    def __next__(self):
+        time.sleep(0.001)
+        if self.closed:
+            self.read_after_close = True
+        return next(self.lines)
+    
+    next = __next__
+    
+    def close(self):
+        self.closed = True
+
+def test_early_stop_waits_for_read(make_plugins, make_vcf_lines):
+    """Test that the handle is not closed while a chunk is read"""
+    handle = SlowHandle(make_vcf_lines(200))
+    async def run():
+        batches = aextract(handle, make_plugins(), chunk_size=50,
+                           max_pending=1)
+        batch = await batches.__anext__()
+        await batches.aclose()
+        return batch
+    
+    assert len(asyncio.run(run())) == 48
+    assert handle.closed
+    assert not handle.read_after_close
@@ -0,0 +1,53 @@
+from extract_vcf.bgzf import BgzfReader, BgzfWriter, is_bgzf
+from extract_vcf.reader import open_vcf
+
+import gzip
+
+def write_lines(path, lines, block_lines=3):
+    """Write lines to a BGZF file with a few lines in each block"""
+    with BgzfWriter(path) as writer:
+        for i, line in enumerate(lines):
+            writer.write(line.encode('utf-8'))
+            if (i + 1) % block_lines == 0:
+                writer.flush()
+
+def test_read_lines(tmpdir):
+    """Test that the lines are the same as from gzip"""
+    path = str(tmpdir.join('test.vcf.gz'))
+    lines = ['line {0}\n'.format(i) for i in range(10)]
+    write_lines(path, lines)
+    
+    assert is_bgzf(path)
+    with gzip.open(path, 'rt') as handle:
+        assert handle.readlines() == lines
+    with BgzfReader(path) as reader:
+        read_lines = iter(reader.readline, b'')
+        assert [line.decode('utf-8') for line in read_lines] == lines
+    assert list(open_vcf(path)) == lines
+
+def test_seek(tmpdir):
+    """Test to seek to the virtual offset of each line"""
+    path = str(tmpdir.join('test.vcf.gz'))
+    lines = ['line {0}\n'.format(i) for i in range(10)]
+    write_lines(path, lines)
+    
+    offsets = []
+    with BgzfReader(path) as reader:
+        while True:
+            offsets.append(reader.tell())
+            if not reader.readline():
+                break
+    
+    assert len(set(offset >> 16 for offset in offsets)) > 1
+    with BgzfReader(path) as reader:
+        for i in [7, 2, 9, 0]:
+            reader.seek(offsets[i])
+            assert reader.readline().decode('utf-8') == lines[i]
+
+def test_not_bgzf(tmpdir):
+    """Test that a plain gzip file is not BGZF"""
+    path = str(tmpdir.join('test.vcf.gz'))
+    with gzip.open(path, 'wt') as handle:
+        handle.write('line\n')
+    
+    assert not is_bgzf(path)
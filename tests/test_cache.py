@@ -0,0 +1,82 @@
+from extract_vcf import Plugin, ExtractionCache
+from extract_vcf.fingerprint import get_plugin_fingerprint
+
+import gzip
+
+vcf_lines = [
+    '##fileformat=VCFv4.1\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    '1\t879537\t.\tT\tC\t100\tPASS\tMQ=1;1000G=0.02\n',
+    '1\t879538\t.\tT\tA\t100\tLowQual\tMQ=3;1000G=0.001\n',
+]
+
+def get_plugin(name, info_key, record_rule='max'):
+    """Return a float INFO plugin"""
+    return Plugin(
+        name=name,
+        field='INFO',
+        info_key=info_key,
+        data_type='float',
+        separators=[','],
+        record_rule=record_rule
+    )
+
+def write_vcf(tmpdir, lines=vcf_lines):
+    """Write a gzipped vcf and return its path"""
+    path = str(tmpdir.join('test.vcf.gz'))
+    with gzip.open(path, 'wt') as vcf_file:
+        vcf_file.writelines(lines)
+    return path
+
+def test_plugin_fingerprint():
+    """Test that the fingerprint depends on the definition, not the name"""
+    assert get_plugin_fingerprint(get_plugin('a', 'MQ')) == \
+        get_plugin_fingerprint(get_plugin('b', 'MQ'))
+    assert get_plugin_fingerprint(get_plugin('a', 'MQ')) != \
+        get_plugin_fingerprint(get_plugin('a', 'MQ', 'min'))
+    assert get_plugin_fingerprint(get_plugin('a', 'MQ')) != \
+        get_plugin_fingerprint(get_plugin('a', 'MQ'), individual_id='proband')
+
+def test_cache_hit(tmpdir):
+    """Test that a repeated run returns the stored values"""
+    vcf_path = write_vcf(tmpdir)
+    plugins = {'1000G': get_plugin('1000G', '1000G')}
+    cache = ExtractionCache(str(tmpdir.join('cache')))
+    
+    first = list(cache.extract(vcf_path, plugins))
+    assert cache.misses == 1
+    
+    second = list(cache.extract(vcf_path, plugins))
+    assert cache.hits == 1
+    assert second == first
+    assert second[1] == ({'CHROM': '1', 'POS': 879538}, {'1000G': 0.001})
+
+def test_new_plugin(tmpdir):
+    """Test that only a new plugin is extracted"""
+    vcf_path = write_vcf(tmpdir)
+    cache = ExtractionCache(str(tmpdir.join('cache')))
+    list(cache.extract(vcf_path, {'1000G': get_plugin('1000G', '1000G')}))
+    cache.close()
+    
+    cache = ExtractionCache(str(tmpdir.join('cache')))
+    plugins = {
+        '1000G': get_plugin('1000G', '1000G'),
+        'MQ': get_plugin('MQ', 'MQ'),
+    }
+    chroms, positions, columns = cache.get_columns(vcf_path, plugins)
+    
+    assert cache.hits == 1
+    assert cache.misses == 1
+    assert columns == {'1000G': [0.02, 0.001], 'MQ': [1.0, 3.0]}
+
+def test_changed_vcf(tmpdir):
+    """Test that a changed vcf is extracted again"""
+    plugins = {'1000G': get_plugin('1000G', '1000G')}
+    cache = ExtractionCache(str(tmpdir.join('cache')))
+    list(cache.extract(write_vcf(tmpdir), plugins))
+    
+    vcf_path = write_vcf(tmpdir, vcf_lines[:3])
+    results = list(cache.extract(vcf_path, plugins))
+    
+    assert cache.misses == 2
+    assert len(results) == 1
@@ -0,0 +1,99 @@
+from extract_vcf import Plugin
+from extract_vcf import engine as engine_module
+from extract_vcf.bgzf import BgzfWriter
+from extract_vcf.checkpoint import CheckpointedExtractor, read_checkpoint
+
+import gzip
+import io
+
+import pytest
+
+FILTERS = ('PASS', 'LowQual')
+
+def write_vcf(tmpdir, lines, compression):
+    """Write the vcf plain, with gzip or with bgzip"""
+    if compression == 'bgzf':
+        path = str(tmpdir.join('test.vcf.gz'))
+        with BgzfWriter(path) as writer:
+            for i, line in enumerate(lines):
+                writer.write(line.encode('utf-8'))
+                if i % 4 == 0:
+                    writer.flush()
+    elif compression == 'gzip':
+        path = str(tmpdir.join('test.vcf.gz'))
+        with gzip.open(path, 'wt') as vcf_file:
+            vcf_file.writelines(lines)
+    else:
+        path = str(tmpdir.join('test.vcf'))
+        with open(path, 'w') as vcf_file:
+            vcf_file.writelines(lines)
+    return path
+
+def read(path):
+    with io.open(path, 'rb') as handle:
+        return handle.read()
+
+@pytest.mark.parametrize('compression', ['plain', 'gzip', 'bgzf'])
+def test_resume_same_output(tmpdir, monkeypatch, compression, make_plugins,
+                            make_vcf_lines):
+    """Test that a resumed run gives the same output as a full run"""
+    vcf_path = write_vcf(tmpdir, make_vcf_lines(20, filters=FILTERS), compression)
+    full_path = str(tmpdir.join('full.tsv'))
+    output_path = str(tmpdir.join('values.tsv'))
+    filters = "Filter == PASS"
+    plugins = make_plugins()
+    plugins['Filter'] = Plugin(name='Filter', field='FILTER',
+                               data_type='string', separators=[';'],
+                               record_rule='max', string_rules={'PASS': 1})
+    
+    CheckpointedExtractor(plugins, filters=filters, interval=3).run(
+        vcf_path, full_path)
+    
+    original_get_values = engine_module.Engine.get_values
+    calls = []
+    def crashing_get_values(self, *args, **kwargs):
+        calls.append(1)
+        if len(calls) > 13:
+            raise RuntimeError("Crash")
+        return original_get_values(self, *args, **kwargs)
+    monkeypatch.setattr(engine_module.Engine, 'get_values', crashing_get_values)
+    
+    with pytest.raises(RuntimeError):
+        CheckpointedExtractor(plugins, filters=filters, interval=3).run(
+            vcf_path, output_path)
+    checkpoint = read_checkpoint(output_path + '.checkpoint')
+    assert checkpoint['records'] == 12
+    assert not checkpoint['done']
+    
+    monkeypatch.setattr(engine_module.Engine, 'get_values', original_get_values)
+    report = CheckpointedExtractor(plugins, filters=filters, interval=3).run(
+        vcf_path, output_path)
+    
+    assert report['resumed_from'] == 12
+    assert report['records'] == 20
+    assert report['passed_variants'] == 10
+    assert read(output_path) == read(full_path)
+    assert read_checkpoint(output_path + '.checkpoint')['done']
+
+def test_other_config(tmpdir, make_plugins, make_vcf_lines):
+    """Test that a checkpoint from another config is refused"""
+    vcf_path = write_vcf(tmpdir, make_vcf_lines(20, filters=FILTERS), 'plain')
+    output_path = str(tmpdir.join('values.tsv'))
+    CheckpointedExtractor(make_plugins(), interval=3).run(vcf_path, output_path)
+    
+    with pytest.raises(ValueError):
+        CheckpointedExtractor(
+            make_plugins(), filters="1000G > 0.1", interval=3).run(
+                vcf_path, output_path)
+
+def test_no_resume(tmpdir, make_plugins, make_vcf_lines):
+    """Test to start over"""
+    vcf_path = write_vcf(tmpdir, make_vcf_lines(20, filters=FILTERS), 'plain')
+    output_path = str(tmpdir.join('values.tsv'))
+    extractor = CheckpointedExtractor(make_plugins(), interval=3)
+    extractor.run(vcf_path, output_path)
+    
+    report = extractor.run(vcf_path, output_path, resume=False)
+    
+    assert report['resumed_from'] == 0
+    assert len(read(output_path).splitlines()) == 21
@@ -0,0 +1,144 @@
+from extract_vcf import (Plugin, Engine, ColumnStoreWriter, ColumnStore,
+    update_column_store, diff_plugins)
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+PLUGIN_NAMES = ('1000G', 'MQ', 'DB', 'Filter')
+
+def test_write_and_read(tmpdir, make_plugins, vcf_lines):
+    """Test to write a store in small chunks and memory map the columns"""
+    plugins = make_plugins(PLUGIN_NAMES)
+    path = str(tmpdir.join('store'))
+    
+    with ColumnStoreWriter(path, plugins, name='example', version=0.1,
+                           chunk_size=2) as writer:
+        writer.write_variants(Engine(plugins).extract(vcf_lines))
+    
+    store = ColumnStore(path)
+    
+    assert store.name == 'example'
+    assert store.version == 0.1
+    assert store.manifest['variants'] == 3
+    assert [store.contigs[i] for i in store.chrom] == ['1', '1', '2']
+    assert list(store.pos) == [879537, 879538, 879539]
+    
+    frequencies = store.column('1000G')
+    assert isinstance(frequencies, np.memmap)
+    assert list(frequencies[:2]) == [0.02, 0.001]
+    assert np.isnan(frequencies[2])
+    
+    missing = store.manifest['columns']['MQ']['missing']
+    assert list(store.column('MQ')) == [1, 1, missing]
+    assert list(store.column('DB')) == [True, False, False]
+    
+    strings = store.strings('Filter')
+    assert [strings[i] for i in store.column('Filter')] == ['PASS', 'LowQual', 'PASS']
+    assert store.manifest['columns']['1000G']['category'] == 'allele_frequencies'
+
+def write_store(tmpdir, plugins, vcf_lines):
+    """Write a vcf and a column store, return their paths"""
+    vcf_path = str(tmpdir.join('test.vcf'))
+    with open(vcf_path, 'w') as vcf_file:
+        vcf_file.writelines(vcf_lines)
+    path = str(tmpdir.join('store'))
+    with ColumnStoreWriter(path, plugins, name='example', version=0.1) as writer:
+        writer.write_variants(Engine(plugins).extract(vcf_lines))
+    return vcf_path, path
+
+def test_diff_plugins(make_plugins):
+    """Test to compare two sets of plugins"""
+    old_plugins = make_plugins(PLUGIN_NAMES)
+    new_plugins = make_plugins(PLUGIN_NAMES)
+    new_plugins['Filter'] = Plugin(
+        name='Filter',
+        field='FILTER',
+        data_type='string',
+        separators=[';'],
+        record_rule='max',
+        string_rules={'PASS': 1, 'LowQual': 2}
+    )
+    new_plugins.pop('DB')
+    new_plugins['QUAL'] = Plugin(name='QUAL', field='QUAL', data_type='float')
+    
+    diff = diff_plugins(old_plugins, new_plugins)
+    
+    assert diff['added'] == ['QUAL']
+    assert diff['changed'] == ['Filter']
+    assert diff['removed'] == ['DB']
+    assert sorted(diff['unchanged']) == ['1000G', 'MQ']
+
+def test_update_column_store(tmpdir, monkeypatch, make_plugins, vcf_lines):
+    """Test that only added and changed plugins are extracted"""
+    vcf_path, path = write_store(tmpdir, make_plugins(PLUGIN_NAMES), vcf_lines)
+    
+    new_plugins = make_plugins(PLUGIN_NAMES)
+    new_plugins['Filter'] = Plugin(
+        name='Filter',
+        field='FILTER',
+        data_type='string',
+        separators=[';'],
+        record_rule='min',
+        string_rules={'PASS': 2, 'LowQual': 1}
+    )
+    new_plugins.pop('DB')
+    new_plugins['QUAL'] = Plugin(name='QUAL', field='QUAL', data_type='float')
+    
+    calls = []
+    original_get_value = Plugin.get_value
+    def counting_get_value(plugin, *args, **kwargs):
+        calls.append(plugin.name)
+        return original_get_value(plugin, *args, **kwargs)
+    monkeypatch.setattr(Plugin, 'get_value', counting_get_value)
+    
+    diff = update_column_store(path, vcf_path, new_plugins, version=0.2)
+    
+    assert set(calls) == set(['Filter', 'QUAL'])
+    assert diff['removed'] == ['DB']
+    
+    store = ColumnStore(path)
+    assert store.version == 0.2
+    assert sorted(store.plugins) == ['1000G', 'Filter', 'MQ', 'QUAL']
+    assert list(store.column('QUAL')) == [100.0, 100.0, 100.0]
+    assert list(store.column('1000G')[:2]) == [0.02, 0.001]
+    assert not tmpdir.join('store', 'plugin_DB.npy').exists()
+    
+    # Nothing changed the second time
+    calls[:] = []
+    diff = update_column_store(path, vcf_path, new_plugins)
+    assert calls == []
+    assert sorted(diff['unchanged']) == ['1000G', 'Filter', 'MQ', 'QUAL']
+
+def test_update_other_vcf(tmpdir, make_plugins, vcf_lines):
+    """Test that a store can not be updated from another vcf"""
+    vcf_path, path = write_store(tmpdir, make_plugins(PLUGIN_NAMES), vcf_lines)
+    with open(vcf_path, 'w') as vcf_file:
+        vcf_file.writelines(vcf_lines[:3])
+    
+    new_plugins = make_plugins(PLUGIN_NAMES)
+    new_plugins['QUAL'] = Plugin(name='QUAL', field='QUAL', data_type='float')
+    
+    with pytest.raises(ValueError):
+        update_column_store(path, vcf_path, new_plugins)
+
+def test_column_files_do_not_collide(tmpdir, vcf_lines):
+    """Test that plugin names that give the same file name get own files"""
+    plugins = {
+        name: Plugin(name=name, field='INFO', info_key=info_key,
+                     data_type='integer', separators=[','], record_rule='max')
+        for name, info_key in [('MQ 1', 'MQ'), ('MQ_1', '1000G')]
+    }
+    vcf_path, path = write_store(tmpdir, plugins, vcf_lines)
+    store = ColumnStore(path)
+    files = [store.manifest['columns'][name]['file'] for name in plugins]
+    assert len(set(files)) == 2
+    assert list(store.column('MQ 1')[:2]) == [1, 1]
+    
+    # An added plugin does not overwrite the column of a kept plugin
+    plugins['MQ-1'] = plugins.pop('MQ_1')
+    plugins['MQ_1'] = Plugin(name='MQ_1', field='QUAL', data_type='float')
+    update_column_store(path, vcf_path, plugins)
+    store = ColumnStore(path)
+    assert list(store.column('MQ 1')[:2]) == [1, 1]
+    assert list(store.column('MQ_1')) == [100.0, 100.0, 100.0]
@@ -16,7 +16,7 @@ def setup_config_file(name = None, version = None, config_lines = []):
     Returns:
         str : Path to config file
     """
-    config_file = NamedTemporaryFile(delete=False)
+    config_file = NamedTemporaryFile(mode='w', delete=False)
     if config_lines:
         for line in config_lines:
             config_file.write(line)
@@ -60,7 +60,7 @@ def test_no_version_section():
     config_name = 'example'
     config_version = '0.1'
     
-    config_file = NamedTemporaryFile(delete=False)
+    config_file = NamedTemporaryFile(mode='w', delete=False)
     config_file.write("name = {0}\n".format(config_name))
     config_file.write("version = {0}\n".format(config_version))
     config_file.close()
@@ -358,7 +358,7 @@ def test_plugin_separators():
     
     parser = ConfigParser(config_file)
     
-    assert parser.plugins['Plugin'].separators == [',',':']
+    assert parser.plugins['Plugin'].separators == (',',':')
 
 def test_plugin_string_dict():
     """
@@ -515,3 +515,90 @@ def test_string_plugin_no_string_defined():
     
     with pytest.raises(ValidateError):
         parser = ConfigParser(config_file)
+
+def test_new_record_rules():
+    """
+    Test that the folding record rules are accepted
+    """
+    for record_rule in ['first', 'sum', 'mean', 'count', 'any']:
+        config_lines = [
+            "[Version]\n"
+            "  name = example\n",
+            "  version = 0.1\n",
+            "[Plugin]\n",
+            "  field = INFO\n"
+            "  info_key = MQ\n"
+            "  data_type = integer\n"
+            "  separators = ','\n"
+            "  record_rule = {0}\n".format(record_rule)
+        ]
+        config_file = setup_config_file(config_lines=config_lines)
+        parser = ConfigParser(config_file)
+        
+        assert parser.plugins['Plugin'].record_rule == record_rule
+
+def test_string_plugin_wrong_record_rule():
+    """
+    Test if raise error when a string plugin uses a numeric record rule
+    """
+    config_lines = [
+        "[Version]\n"
+        "  name = example\n",
+        "  version = 0.1\n",
+        "[Plugin]\n",
+        "  field = INFO\n"
+        "  info_key = MQ\n"
+        "  data_type = string\n",
+        "  separators = ','\n",
+        "  record_rule = sum\n",
+        "  [[AD]]\n",
+        "    string = AD\n",
+        "    priority = 2\n",
+    ]
+    config_file = setup_config_file(config_lines=config_lines)
+    
+    with pytest.raises(ValidateError):
+        parser = ConfigParser(config_file)
+
+def test_bounds():
+    """
+    Test that bounds are read with the data type of the plugin
+    """
+    config_lines = [
+        "[Version]\n"
+        "  name = example\n",
+        "  version = 0.1\n",
+        "[Plugin]\n",
+        "  field = INFO\n"
+        "  info_key = AF\n"
+        "  data_type = float\n"
+        "  separators = ','\n"
+        "  record_rule = max\n"
+        "  upper_bound = 1\n"
+        "  lower_bound = 0\n"
+    ]
+    config_file = setup_config_file(config_lines=config_lines)
+    parser = ConfigParser(config_file)
+    
+    assert parser.plugins['Plugin'].upper_bound == 1.0
+    assert parser.plugins['Plugin'].lower_bound == 0.0
+
+def test_wrong_bound():
+    """
+    Test if raise error when a bound is not a number
+    """
+    config_lines = [
+        "[Version]\n"
+        "  name = example\n",
+        "  version = 0.1\n",
+        "[Plugin]\n",
+        "  field = INFO\n"
+        "  info_key = AF\n"
+        "  data_type = float\n"
+        "  separators = ','\n"
+        "  upper_bound = high\n"
+    ]
+    config_file = setup_config_file(config_lines=config_lines)
+    
+    with pytest.raises(ValidateError):
+        parser = ConfigParser(config_file)
@@ -0,0 +1,100 @@
+from extract_vcf import Plugin, Engine, HeaderParser
+from extract_vcf.converters import Converter, get_converter
+
+import logging
+
+info_dict = {
+    'AF': {'Number': '1', 'Type': 'Float', 'Description': ''},
+    'AC': {'Number': 'A', 'Type': 'Integer', 'Description': ''},
+    'Gene': {'Number': '1', 'Type': 'String', 'Description': ''},
+}
+
+def get_plugin(info_key, data_type='float', record_rule='max'):
+    return Plugin(
+        name=info_key,
+        field='INFO',
+        info_key=info_key,
+        data_type=data_type,
+        separators=[','],
+        record_rule=record_rule
+    )
+
+def test_converter_missing_values():
+    converter = Converter(float)
+    assert converter('.') is None
+    assert converter('') is None
+    assert converter('0.5') == 0.5
+    assert converter.malformed == 0
+
+def test_converter_malformed_values():
+    converter = Converter(int)
+    assert converter('abc') is None
+    assert converter('0.5') is None
+    assert converter.malformed == 2
+
+def test_get_converter():
+    converter = get_converter(get_plugin('AC', 'integer'), info_dict)
+    assert converter.convert is int
+    assert not converter.single
+    assert get_converter(get_plugin('AF'), info_dict).single
+    assert get_converter(get_plugin('AF', 'string'), info_dict) is None
+
+def test_get_converter_without_header():
+    converter = get_converter(get_plugin('AF'))
+    assert converter.convert is float
+    assert not converter.single
+
+def test_get_converter_wrong_type(caplog):
+    with caplog.at_level(logging.WARNING):
+        get_converter(get_plugin('Gene'), info_dict)
+    assert 'declared as String' in caplog.text
+
+def test_same_values_with_converter():
+    """Test that the values are the same as without a converter"""
+    raw_entries = ['0.1,0.3', '.', '.,0.2', 'abc', '0.4,abc']
+    for record_rule in ['max', 'min', 'mean', 'count', None]:
+        plugin = get_plugin('AC', record_rule=record_rule)
+        for raw_entry in raw_entries:
+            variant_dict = {'info_dict': {'AC': raw_entry}}
+            assert plugin.get_value(
+                variant_dict=variant_dict,
+                converter=get_converter(plugin, info_dict)
+            ) == plugin.get_value(variant_dict=variant_dict)
+
+def test_single_value_not_splitted():
+    plugin = get_plugin('AF')
+    converter = get_converter(plugin, info_dict)
+    assert plugin.get_value(
+        variant_dict={'info_dict': {'AF': '0.25'}}, converter=converter) == 0.25
+    # A list in a Number=1 annotation is splitted as without the header
+    for raw_entry in ['0.25,0.5', '0.25,abc', 'abc', '.', '1e-3']:
+        variant_dict = {'info_dict': {'AF': raw_entry}}
+        assert plugin.get_value(
+            variant_dict=variant_dict, converter=converter) == plugin.get_value(
+                variant_dict=variant_dict, converter=get_converter(plugin))
+    assert converter.malformed == 2
+
+def test_single_only_with_safe_separators():
+    """Test that separators that can be part of a number are always splitted"""
+    plugin = Plugin(name='AF', field='INFO', info_key='AF', data_type='integer',
+                    separators=['_'], record_rule='max')
+    converter = get_converter(plugin, info_dict)
+    assert not converter.single
+    assert plugin.get_value(variant_dict={'info_dict': {'AF': '1_2'}},
+                            converter=converter) == 2
+
+def test_engine_counts_malformed():
+    header = HeaderParser()
+    for line in [
+        '##INFO=<ID=AF,Number=1,Type=Float,Description="Frequency">',
+        '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO',
+    ]:
+        header.parse_line(line)
+    lines = [
+        '1\t{0}\t.\tT\tC\t100\tPASS\tAF={1}\n'.format(1000 + i, value)
+        for i, value in enumerate(['0.1', '.', 'NA', '.', 'high', '0.2'])
+    ]
+    engine = Engine({'AF': get_plugin('AF')}, header=header)
+    values = [values['AF'] for variant_dict, values in engine.extract(lines)]
+    assert values == [0.1, None, None, None, None, 0.2]
+    assert engine.malformed_values() == {'AF': 2}
@@ -0,0 +1,83 @@
+from extract_vcf import Plugin, Engine, HeaderParser, get_variant_dict
+import pytest
+
+vcf_header = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+
+variant_line = "1\t879537\t.\tT\tC\t100\tPASS\t"\
+               "RankScore=1:12,2:11,3:-2;GeneticModels=1:AD|AD_dn,2:AR_hom"
+
+def get_plugin(info_key='RankScore', separators=[',', ':'], name=None):
+    return Plugin(
+        name=name or info_key,
+        field='INFO',
+        info_key=info_key,
+        separators=separators,
+        dict_entry=True
+    )
+
+def test_get_dict_entries():
+    plugin = get_plugin()
+    variant_dict = get_variant_dict(variant_line, vcf_header)
+    expected = {'1': '12', '2': '11', '3': '-2'}
+    assert plugin.get_dict_entries(variant_dict=variant_dict) == expected
+    assert plugin.get_dict_entries(variant_line=variant_line) == expected
+
+def test_dict_entries_parsed_once(monkeypatch):
+    """Test that the engine parses an annotation once for all plugins"""
+    parsed = []
+    original_parse_dict_entry = Plugin.parse_dict_entry
+    def parse_dict_entry(self, entry):
+        parsed.append(entry)
+        return original_parse_dict_entry(self, entry)
+    monkeypatch.setattr(Plugin, 'parse_dict_entry', parse_dict_entry)
+    header = HeaderParser()
+    header.header = vcf_header
+    plugins = {
+        'RankScore': get_plugin(),
+        'OtherRankScore': get_plugin(name='OtherRankScore'),
+        'GeneticModels': get_plugin('GeneticModels', [',', ':', '|']),
+    }
+    engine = Engine(plugins, header=header)
+    other_line = variant_line.replace('1:12', '1:13')
+    
+    assert engine.get_values(variant_line=variant_line, dict_key='1') == {
+        'RankScore': '12', 'OtherRankScore': '12', 'GeneticModels': 'AD'}
+    assert engine.get_values(variant_line=other_line, dict_key='1') == {
+        'RankScore': '13', 'OtherRankScore': '13', 'GeneticModels': 'AD'}
+    # The unchanged GeneticModels annotation is not parsed again
+    assert sorted(parsed) == sorted([
+        '1:12,2:11,3:-2', '1:AD|AD_dn,2:AR_hom', '1:13,2:11,3:-2'])
+
+def test_dict_entries_from_line():
+    """Test that a variant line is only splitted up to INFO"""
+    line = variant_line + '\tGT\t0/1'
+    plugin = get_plugin()
+    assert plugin.get_dict_entries(variant_line=line) == {
+        '1': '12', '2': '11', '3': '-2'}
+    for dict_key, value in [('1', '12'), ('3', '-2'), ('4', '1:12,2:11,3:-2')]:
+        assert plugin.get_raw_entry(variant_line=line, dict_key=dict_key) == value
+
+def test_dict_entries_immutable():
+    variant_dict = get_variant_dict(variant_line, vcf_header)
+    dict_entries = get_plugin().get_dict_entries(variant_dict=variant_dict)
+    with pytest.raises(TypeError):
+        dict_entries['1'] = '0'
+
+def test_dict_entries_value_with_separators():
+    """Test that the value is splitted by the plugin, not by the cache"""
+    plugin = get_plugin('GeneticModels', [',', ':', '|'])
+    variant_dict = get_variant_dict(variant_line, vcf_header)
+    assert plugin.get_dict_entries(variant_dict=variant_dict) == {
+        '1': 'AD|AD_dn', '2': 'AR_hom'}
+    assert plugin.get_entry(variant_dict=variant_dict, dict_key='1') == [
+        'AD', 'AD_dn']
+
+def test_dict_entries_no_annotation():
+    plugin = get_plugin('Missing')
+    variant_dict = get_variant_dict(variant_line, vcf_header)
+    assert plugin.get_dict_entries(variant_dict=variant_dict) == {}
+
+def test_dict_entries_not_dict_entry():
+    plugin = Plugin(name='DP', field='INFO', info_key='DP')
+    with pytest.raises(IOError):
+        plugin.get_dict_entries(variant_line=variant_line)
@@ -0,0 +1,134 @@
+from extract_vcf.distributed import main, read_manifest, get_shard_files
+
+import io
+import os
+
+vcf_lines = [
+    '##fileformat=VCFv4.1\n',
+    '##contig=<ID=1,length=1000>\n',
+    '##contig=<ID=2,length=500>\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    '1\t10\t.\tT\tC\t100\tPASS\t1000G=0.1;DB\n',
+    '1\t400\t.\tT\tC\t100\tPASS\t1000G=0.2\n',
+    '1\t999\t.\tT\tC\t100\tLowQual\tMQ=3\n',
+    '2\t5\t.\tT\tC\t100\tPASS\t1000G=0.5\n',
+]
+
+config_lines = [
+    "[Version]\n",
+    "  name = example\n",
+    "  version = 0.1\n",
+    "[1000G]\n",
+    "  field = INFO\n",
+    "  info_key = 1000G\n",
+    "  data_type = float\n",
+    "  record_rule = max\n",
+    "  separators = ','\n",
+    "[DB]\n",
+    "  field = INFO\n",
+    "  info_key = DB\n",
+    "  data_type = flag\n",
+]
+
+def write_files(tmpdir):
+    """Write the vcf and the config, return their paths"""
+    vcf_path = str(tmpdir.join('test.vcf'))
+    with open(vcf_path, 'w') as vcf_file:
+        vcf_file.writelines(vcf_lines)
+    config_path = str(tmpdir.join('config.ini'))
+    with open(config_path, 'w') as config_file:
+        config_file.writelines(config_lines)
+    return vcf_path, config_path
+
+def test_plan_worker_merge(tmpdir):
+    """Test to run the shards in two processes and merge them"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    output = str(tmpdir.join('values.tsv'))
+    
+    assert main(['plan', vcf_path, manifest_path, '--shard-length', '400']) == 0
+    manifest = read_manifest(manifest_path)
+    assert [entry['region'] for entry in manifest['shards']] == [
+        '1:1-400', '1:401-800', '1:801-', '2:1-400', '2:401-']
+    
+    assert main(['worker', manifest_path, config_path, out_dir,
+                 '--processes', '2']) == 0
+    assert main(['merge', manifest_path, out_dir, output]) == 0
+    
+    with io.open(output, encoding='utf-8') as merged:
+        lines = merged.read().splitlines()
+    assert lines[0].split('\t')[:2] == ['CHROM', 'POS']
+    fields = lines[0].split('\t')
+    rows = [dict(zip(fields, line.split('\t'))) for line in lines[1:]]
+    assert [(row['CHROM'], row['POS']) for row in rows] == [
+        ('1', '10'), ('1', '400'), ('1', '999'), ('2', '5')]
+    assert [row['1000G'] for row in rows] == ['0.1', '0.2', '.', '0.5']
+    assert [row['DB'] for row in rows] == ['1', '.', '.', '.']
+
+def test_merge_missing_shard(tmpdir):
+    """Test that merge fails if a shard is not done"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    
+    main(['plan', vcf_path, manifest_path])
+    main(['worker', manifest_path, config_path, out_dir, '--shard', '0'])
+    
+    assert main(['merge', manifest_path, out_dir,
+                 str(tmpdir.join('values.tsv'))]) == 1
+    assert not os.path.exists(str(tmpdir.join('values.tsv')))
+
+def test_merge_other_config(tmpdir):
+    """Test that merge fails if the shards were run with different configs"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    
+    main(['plan', vcf_path, manifest_path])
+    main(['worker', manifest_path, config_path, out_dir, '--shard', '0'])
+    main(['worker', manifest_path, config_path, out_dir, '--shard', '1',
+          '--filter', 'DB'])
+    
+    assert main(['merge', manifest_path, out_dir,
+                 str(tmpdir.join('values.tsv'))]) == 1
+
+def test_worker_skips_done_shards(tmpdir):
+    """Test that a worker without --shard only runs the shards not done"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    
+    main(['plan', vcf_path, manifest_path])
+    main(['worker', manifest_path, config_path, out_dir, '--shard', '1'])
+    done_path = get_shard_files(out_dir, 1)[1]
+    modified = os.path.getmtime(done_path)
+    os.utime(done_path, (modified - 100, modified - 100))
+    main(['worker', manifest_path, config_path, out_dir])
+    
+    assert os.path.getmtime(done_path) == modified - 100
+    assert os.path.exists(get_shard_files(out_dir, 0)[1])
+
+def test_worker_changed_vcf(tmpdir):
+    """Test that a vcf rewritten with the same size is detected"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    
+    main(['plan', vcf_path, manifest_path])
+    with open(vcf_path, 'w') as vcf_file:
+        vcf_file.writelines(vcf_lines[:-1] + [vcf_lines[-1].replace('5', '6')])
+    mtime = os.path.getmtime(vcf_path) + 10
+    os.utime(vcf_path, (mtime, mtime))
+    
+    assert main(['worker', manifest_path, config_path, out_dir]) == 1
+
+def test_worker_bad_filter(tmpdir):
+    """Test that a malformed filter is reported as an error"""
+    vcf_path, config_path = write_files(tmpdir)
+    manifest_path = str(tmpdir.join('manifest.json'))
+    out_dir = str(tmpdir.join('out'))
+    
+    main(['plan', vcf_path, manifest_path])
+    assert main(['worker', manifest_path, config_path, out_dir,
+                 '--filter', 'Unknown > 1']) == 1
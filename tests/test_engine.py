@@ -0,0 +1,197 @@
+from extract_vcf import Plugin, Engine, HeaderParser, split_csq
+from extract_vcf import engine as engine_module
+from extract_vcf.engine import group_plugins
+from validate import ValidateError
+
+import logging
+
+import pytest
+
+vcf_lines = [
+    '##fileformat=VCFv4.1\n',
+    '##contig=<ID=1,length=249250621,assembly=b37>\n',
+    '##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence type as '\
+    'predicted by VEP. Format: Allele|Gene|Consequence|SIFT">\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tproband\n',
+    '1\t879537\t.\tT\tC\t100\tPASS\tMQ=1;1000G=0.02;CSQ=C|ADK|missense|0.1,'\
+    'C|ADK|intron|0.3\tGT:GQ\t1/1:60\n',
+    '1\t879538\t.\tT\tA\t100\tPASS\tMQ=1;1000G=0.001;CSQ=A|ADK|intron|0.05'\
+    '\tGT:GQ\t0/1:30\n',
+    '1\t879539\t.\tT\tG\t100\tLowQual\tMQ=1;CSQ=G|ADK|intron|0.2\tGT:GQ\t0/1:20\n',
+]
+
+class CountingPlugin(Plugin):
+    """Plugin that counts how many times it is evaluated"""
+    def __init__(self, *args, **kwargs):
+        super(CountingPlugin, self).__init__(*args, **kwargs)
+        self.calls = 0
+    
+    def get_value(self, *args, **kwargs):
+        self.calls += 1
+        return super(CountingPlugin, self).get_value(*args, **kwargs)
+
+@pytest.fixture
+def make_counting_plugins(make_plugins):
+    """Return the function that builds counting plugins"""
+    return lambda: make_plugins(('1000G', 'Filter', 'SIFT'),
+                                plugin_class=CountingPlugin)
+
+def test_extract_no_filter(make_counting_plugins):
+    """Test that all plugins are evaluated without a filter"""
+    plugins = make_counting_plugins()
+    engine = Engine(plugins)
+    results = [values for variant, values in engine.extract(vcf_lines)]
+    
+    assert len(results) == 3
+    assert results[0] == {'1000G': 0.02, 'Filter': 'PASS', 'SIFT': 0.1}
+    assert results[2] == {'1000G': None, 'Filter': 'LowQual', 'SIFT': 0.2}
+    assert plugins['SIFT'].calls == 3
+
+def test_extract_with_filter(make_counting_plugins):
+    """Test that plugins are only evaluated for variants that pass"""
+    plugins = make_counting_plugins()
+    engine = Engine(plugins, filters="1000G <= 0.01 and Filter == PASS")
+    results = [values for variant, values in engine.extract(vcf_lines)]
+    
+    assert results == [{'1000G': 0.001, 'Filter': 'PASS', 'SIFT': 0.05}]
+    assert plugins['SIFT'].calls == 1
+    assert engine.variants == 3
+    assert engine.passed_variants == 1
+
+def test_extract_rows(make_counting_plugins):
+    """Test that rows have the same values as the value dictionaries"""
+    engine = Engine(make_counting_plugins(),
+                    filters="1000G <= 0.01 and Filter == PASS")
+    rows = list(engine.extract_rows(vcf_lines))
+    
+    assert len(rows) == 1
+    assert dict(zip(engine.row_fields, rows[0]))['SIFT'] == 0.05
+    assert rows[0][:2] == ('1', '879538')
+
+def test_filter_order(make_counting_plugins):
+    """Test that the cheapest predicate is evaluated first"""
+    plugins = make_counting_plugins()
+    engine = Engine(plugins, filters="1000G <= 0.01 and Filter == PASS")
+    
+    assert [p.plugin_name for p in engine.predicates] == ['Filter', '1000G']
+    
+    list(engine.extract(vcf_lines))
+    # The third variant fails the FILTER predicate so 1000G is never checked
+    assert plugins['Filter'].calls == 3
+    assert plugins['1000G'].calls == 2
+
+def test_same_values_as_plugins(make_counting_plugins):
+    """Test that the engine returns the same values as the plugins"""
+    plugins = make_counting_plugins()
+    header = HeaderParser()
+    for line in vcf_lines:
+        if line.startswith('#'):
+            header.parse_line(line)
+    
+    engine = Engine(plugins, header=header)
+    for line in vcf_lines[4:]:
+        values = engine.get_values(variant_line=line)
+        for name in plugins:
+            assert values[name] == plugins[name].get_value(
+                variant_line=line,
+                vcf_header=header.header,
+                csq_format=header.csq_format
+            )
+
+def test_filter_unknown_plugin(make_counting_plugins):
+    """Test that a filter on a non existing plugin raises exception"""
+    with pytest.raises(ValidateError):
+        Engine(make_counting_plugins(), filters="CADD > 10")
+
+def test_sampling_same_values(make_counting_plugins):
+    """Test that sampling and reordering gives the same values"""
+    expression = "1000G <= 0.01 and Filter == PASS"
+    engine = Engine(make_counting_plugins(), filters=expression)
+    sampling_engine = Engine(make_counting_plugins(), filters=expression,
+                             sample_size=2)
+    
+    lines = vcf_lines + vcf_lines[4:] * 3
+    
+    assert list(sampling_engine.extract(lines)) == list(engine.extract(lines))
+    assert sampling_engine.sampling == False
+    assert len(sampling_engine.report()) == 3
+
+def test_reorder(make_counting_plugins):
+    """Test that predicates that remove many variants cheaply goes first"""
+    engine = Engine(make_counting_plugins(),
+                    filters="Filter == PASS and 1000G <= 0.01")
+    assert [p.plugin_name for p in engine.predicates] == ['Filter', '1000G']
+    
+    engine.plugin_stats['Filter'] = {'calls': 10, 'time': 1.0}
+    engine.plugin_stats['1000G'] = {'calls': 10, 'time': 1.0}
+    # Filter removes 1 of 10 variants and 1000G removes 9 of 10 variants
+    engine.predicate_stats = [
+        {'evaluated': 10, 'passed': 9},
+        {'evaluated': 10, 'passed': 1},
+    ]
+    engine.reorder()
+    
+    assert [p.plugin_name for p in engine.predicates] == ['1000G', 'Filter']
+    assert engine.predicate_stats[0]['passed'] == 1
+
+def test_group_plugins(make_counting_plugins):
+    """Test that plugins reading the same entry are grouped"""
+    plugins = make_counting_plugins()
+    plugins['Gene'] = Plugin(
+        name='Gene',
+        field='INFO',
+        info_key='CSQ',
+        csq_key='Gene',
+        data_type='string',
+        separators=[','],
+    )
+    groups = group_plugins(plugins)
+    
+    assert sorted(groups[('INFO', 'CSQ')]) == ['Gene', 'SIFT']
+    assert groups[('FILTER', None)] == ['Filter']
+
+def test_engine_logs_summary_once(caplog, make_counting_plugins):
+    """Test that extract on each chunk does not log the summary"""
+    lines = [
+        '1\t{0}\t.\tT\tC\t100\tPASS\t1000G={1}\n'.format(1000 + i, value)
+        for i, value in enumerate(['0.1', 'high'])
+    ]
+    engine = Engine(make_counting_plugins())
+    with caplog.at_level(logging.INFO):
+        for chunk in [lines[:1], lines[1:]]:
+            list(engine.extract(chunk))
+        assert 'malformed' not in caplog.text
+        engine.log_summary()
+    assert '1 malformed values in plugin 1000G' in caplog.text
+    assert caplog.text.count('passed the filter') == 1
+
+def test_csq_splitted_once(monkeypatch, make_counting_plugins):
+    """Test that the CSQ annotation is splitted once per variant"""
+    splits = []
+    def counting_split_csq(raw_entry):
+        splits.append(raw_entry)
+        return split_csq(raw_entry)
+    monkeypatch.setattr(engine_module, 'split_csq', counting_split_csq)
+    
+    plugins = make_counting_plugins()
+    plugins['Max_SIFT'] = Plugin(
+        name='Max_SIFT',
+        field='INFO',
+        info_key='CSQ',
+        csq_key='SIFT',
+        data_type='float',
+        separators=[','],
+        record_rule='max'
+    )
+    engine = Engine(plugins)
+    results = [values for variant, values in engine.extract(vcf_lines)]
+    
+    assert len(splits) == 3
+    assert results[0]['SIFT'] == 0.1
+    assert results[0]['Max_SIFT'] == 0.3
+
+def test_csq_entries_not_added_to_variant(make_counting_plugins):
+    engine = Engine(make_counting_plugins())
+    for variant_dict, values in engine.extract(vcf_lines):
+        assert 'csq_entries' not in variant_dict
+    assert engine.last_csq[0] == 'G|ADK|intron|0.2'
@@ -0,0 +1,63 @@
+from extract_vcf import Predicate, parse_filter
+from validate import ValidateError
+
+import pytest
+
+def test_predicate_compare():
+    """Test that a predicate compares values"""
+    predicate = Predicate('1000G', '<=', 0.01)
+    
+    assert predicate.evaluate(0.001) == True
+    assert predicate.evaluate(0.01) == True
+    assert predicate.evaluate(0.2) == False
+
+def test_predicate_missing():
+    """Test how a predicate treats missing values"""
+    assert Predicate('1000G', '<=', 0.01).evaluate(None) == False
+    assert Predicate('1000G', '<=', 0.01, keep_missing=True).evaluate(None) == True
+
+def test_predicate_flag():
+    """Test a predicate without operator"""
+    predicate = Predicate('DB')
+    
+    assert predicate.evaluate(True) == True
+    assert predicate.evaluate(None) == False
+
+def test_predicate_wrong_operator():
+    """Test that a wrong operator raises exception"""
+    with pytest.raises(ValidateError):
+        Predicate('1000G', '=<', 0.01)
+
+def test_parse_filter():
+    """Test to parse a filter expression"""
+    predicates = parse_filter(
+        "1000G <= 0.01 and Filter == PASS AND DB", keep_missing=['1000G'])
+    
+    assert [predicate.plugin_name for predicate in predicates] == [
+        '1000G', 'Filter', 'DB']
+    assert predicates[0].value == 0.01
+    assert predicates[0].keep_missing == True
+    assert predicates[1].op == '=='
+    assert predicates[1].value == 'PASS'
+    assert predicates[2].op == None
+
+def test_parse_filter_quoted():
+    """Test that quoted values are kept as strings"""
+    predicates = parse_filter("ID != '1'")
+    
+    assert predicates[0].value == '1'
+
+def test_parse_filter_quoted_and():
+    """Test that an 'and' in a quoted value does not split the clause"""
+    predicates = parse_filter(
+        'Consequence == "splice and intron" and Filter == \'PASS AND LowQual\'')
+    
+    assert [predicate.value for predicate in predicates] == [
+        'splice and intron', 'PASS AND LowQual']
+
+def test_parse_malformed_filter():
+    """Test that a malformed clause raises exception"""
+    with pytest.raises(ValidateError):
+        parse_filter("1000G <= 0.01 and")
+    with pytest.raises(ValidateError):
+        parse_filter("1000G is small")
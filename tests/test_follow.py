@@ -0,0 +1,184 @@
+from extract_vcf.bgzf import BgzfWriter
+from extract_vcf.follow import VcfFollower
+
+import gzip
+import threading
+
+import pytest
+
+def get_positions(variants):
+    return [variant_dict['POS'] for variant_dict, values in variants]
+
+def test_only_complete_lines(tmpdir, make_plugins, make_variant_line,
+                             header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        vcf_file.write(make_variant_line(0))
+        # Half of a line that is still being written
+        vcf_file.write(make_variant_line(1)[:10])
+
+    with VcfFollower(path, make_plugins()) as follower:
+        variants = follower.poll()
+        assert get_positions(variants) == ['1000']
+        assert variants[0][1]['1000G'] == 0.0
+        assert follower.poll() == []
+
+        with open(path, 'a') as vcf_file:
+            vcf_file.write(make_variant_line(1)[10:])
+            vcf_file.write(make_variant_line(2))
+        variants = follower.poll()
+        assert get_positions(variants) == ['1001', '1002']
+        assert variants[1][1]['1000G'] == 0.02
+        assert follower.records == 3
+
+def test_header_written_later(tmpdir, make_plugins, make_variant_line,
+                              header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    follower = VcfFollower(path, make_plugins())
+    # The file does not exist yet
+    assert follower.poll() == []
+    with open(path, 'w') as vcf_file:
+        vcf_file.write(header_lines[0])
+    assert follower.poll() == []
+    with open(path, 'a') as vcf_file:
+        vcf_file.write(header_lines[1])
+        vcf_file.write(make_variant_line(0))
+    assert get_positions(follower.poll()) == ['1000']
+    follower.close()
+
+def test_resume_from_saved_offset(tmpdir, make_plugins, make_variant_line,
+                                  header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        for i in range(3):
+            vcf_file.write(make_variant_line(i))
+
+    with VcfFollower(path, make_plugins()) as follower:
+        assert len(follower.poll()) == 3
+
+    with open(path, 'a') as vcf_file:
+        for i in range(3, 5):
+            vcf_file.write(make_variant_line(i))
+
+    # A new follower, like after a restart, only sees the new variants
+    with VcfFollower(path, make_plugins()) as follower:
+        variants = follower.poll()
+        assert get_positions(variants) == ['1003', '1004']
+        assert variants[0][1]['1000G'] == 0.03
+        assert follower.records == 5
+
+def test_truncated_file(tmpdir, make_plugins, make_variant_line, header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        vcf_file.write(make_variant_line(0))
+    with VcfFollower(path, make_plugins()) as follower:
+        follower.poll()
+    with open(path, 'w') as vcf_file:
+        vcf_file.write(header_lines[0])
+    with pytest.raises(ValueError):
+        VcfFollower(path, make_plugins()).poll()
+
+def test_follow_bgzf(tmpdir, make_plugins, make_variant_line, header_lines):
+    path = str(tmpdir.join('growing.vcf.gz'))
+    writer = BgzfWriter(path)
+    for line in header_lines + [make_variant_line(0)]:
+        writer.write(line.encode('utf-8'))
+    writer.flush()
+
+    follower = VcfFollower(path, make_plugins())
+    assert get_positions(follower.poll()) == ['1000']
+
+    # A line that is split over two blocks
+    line = make_variant_line(1).encode('utf-8')
+    writer.write(line[:10])
+    writer.flush()
+    assert follower.poll() == []
+    writer.write(line[10:])
+    writer.close()
+    assert get_positions(follower.poll()) == ['1001']
+    follower.close()
+
+    with BgzfWriter(path, mode='ab') as writer:
+        writer.write(make_variant_line(2).encode('utf-8'))
+    with VcfFollower(path, make_plugins()) as follower:
+        assert get_positions(follower.poll()) == ['1002']
+
+def test_gzip_refused(tmpdir, make_plugins, header_lines):
+    path = str(tmpdir.join('growing.vcf.gz'))
+    with gzip.open(path, 'wt') as vcf_file:
+        vcf_file.writelines(header_lines)
+    with pytest.raises(ValueError):
+        VcfFollower(path, make_plugins()).poll()
+
+def test_follow_until_idle(tmpdir, make_plugins, make_variant_line,
+                           header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+
+    def write_variants():
+        with open(path, 'a') as vcf_file:
+            for i in range(3):
+                vcf_file.write(make_variant_line(i))
+                vcf_file.flush()
+
+    timer = threading.Timer(0.05, write_variants)
+    timer.start()
+    follower = VcfFollower(path, make_plugins(), poll_interval=0.01)
+    variants = list(follower.follow(idle_timeout=0.5))
+    timer.join()
+    follower.close()
+    assert get_positions(variants) == ['1000', '1001', '1002']
+
+def test_follow_stop_event(tmpdir, make_plugins, make_variant_line,
+                           header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        vcf_file.write(make_variant_line(0))
+    stop_event = threading.Event()
+    follower = VcfFollower(path, make_plugins(), poll_interval=0.01)
+    variants = []
+    for variant in follower.follow(stop_event=stop_event):
+        variants.append(variant)
+        stop_event.set()
+    follower.close()
+    assert get_positions(variants) == ['1000']
+
+def test_offset_saved_after_delivery(tmpdir, make_plugins, make_variant_line,
+                                     header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        for i in range(5):
+            vcf_file.write(make_variant_line(i))
+
+    follower = VcfFollower(path, make_plugins(), batch_size=4)
+    # The two header lines and two variants
+    assert get_positions(follower.poll()) == ['1000', '1001']
+    assert not tmpdir.join('growing.vcf.offset').exists()
+    assert get_positions(follower.poll()) == ['1002', '1003', '1004']
+    # A restart before the last batch was delivered reads it again
+    assert get_positions(
+        VcfFollower(path, make_plugins()).poll()) == ['1002', '1003', '1004']
+    follower.close()
+    assert VcfFollower(path, make_plugins()).poll() == []
+
+def test_follow_stopped_in_batch(tmpdir, make_plugins, make_variant_line,
+                                 header_lines):
+    path = str(tmpdir.join('growing.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(header_lines)
+        for i in range(3):
+            vcf_file.write(make_variant_line(i))
+    follower = VcfFollower(path, make_plugins(), poll_interval=0.01)
+    variants = follower.follow()
+    next(variants)
+    variants.close()
+    follower.close()
+    # The batch was not delivered so it is followed again
+    with VcfFollower(path, make_plugins()) as follower:
+        assert get_positions(follower.poll()) == ['1000', '1001', '1002']
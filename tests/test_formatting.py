@@ -0,0 +1,8 @@
+from extract_vcf.formatting import format_value, MISSING
+
+def test_format_value():
+    assert format_value(None) == MISSING
+    assert format_value(True) == '1'
+    assert format_value(0.25) == '0.25'
+    assert format_value(3) == '3'
+    assert format_value('PASS') == 'PASS'
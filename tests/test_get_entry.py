@@ -1,4 +1,4 @@
-from extract_vcf import Plugin
+from extract_vcf import Plugin, split_csq
 import pytest
 
 csq_format = ["Allele", "Gene", "Feature", "Feature_type", "Consequence", 
@@ -375,3 +375,25 @@ def test_dict_three_separators_with_key():
 #     with pytest.raises(IOError):
 #         plugin.get_raw_entry(variant, individual_id='ADM1003A3')
 #
+
+def test_csq_entries():
+    """Test to get a csq entry from an already splitted annotation"""
+    plugin = Plugin(
+        name='Consequence',
+        field='INFO',
+        info_key='CSQ',
+        csq_key='Consequence',
+        separators=[','],
+    )
+    variant_line = get_variant_line()
+    raw_entry = plugin.get_raw_entry(variant_line=variant_line)
+    csq_entries = split_csq(raw_entry)
+    
+    assert plugin.get_entry(
+        raw_entry=raw_entry,
+        csq_format=csq_format,
+        csq_entries=csq_entries
+    ) == plugin.get_entry(
+        raw_entry=raw_entry,
+        csq_format=csq_format,
+    )
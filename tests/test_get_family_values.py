@@ -0,0 +1,93 @@
+from extract_vcf import Plugin, get_variant_dict
+import pytest
+
+vcf_header = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO',
+              'FORMAT', 'father', 'mother', 'child']
+
+variant_line = "1\t879537\t.\tT\tC\t100\tPASS\tDP=35\tGT:AD:GQ:DP\t"\
+               "0/0:10,0:60:10\t0/1:5,6:30:11\t1|1:0,14:99:14"
+
+def get_plugin(gt_key='GQ', data_type='integer', record_rule=None):
+    return Plugin(
+        name=gt_key,
+        field='sample_id',
+        gt_key=gt_key,
+        data_type=data_type,
+        separators=[','],
+        record_rule=record_rule
+    )
+
+def test_family_values():
+    """Test that the family values are the same as one at a time"""
+    plugin = get_plugin()
+    values = plugin.get_family_values(
+        variant_line=variant_line, vcf_header=vcf_header)
+    assert values == {'father': 60, 'mother': 30, 'child': 99}
+    for individual_id in values:
+        assert values[individual_id] == plugin.get_value(
+            variant_line=variant_line,
+            vcf_header=vcf_header,
+            individual_id=individual_id
+        )
+
+def test_family_values_dict():
+    """Test to get the family values from a variant dictionary"""
+    plugin = get_plugin(gt_key='AD', record_rule='max')
+    variant_dict = get_variant_dict(variant_line, vcf_header)
+    values = plugin.get_family_values(
+        variant_dict=variant_dict, individual_ids=['mother', 'child'])
+    assert values == {'mother': 6, 'child': 14}
+
+def test_family_values_missing_key():
+    """Test individuals without the gt_key"""
+    plugin = get_plugin(gt_key='PL')
+    values = plugin.get_family_values(
+        variant_line=variant_line, vcf_header=vcf_header)
+    assert values == {'father': '.', 'mother': '.', 'child': '.'}
+
+def test_family_values_not_sample_id():
+    """Test that only sample_id plugins have family values"""
+    plugin = Plugin(name='DP', field='INFO', info_key='DP')
+    with pytest.raises(IOError):
+        plugin.get_family_values(
+            variant_line=variant_line, vcf_header=vcf_header)
+
+def test_family_values_unknown_individual():
+    plugin = get_plugin()
+    with pytest.raises(IOError):
+        plugin.get_family_values(
+            variant_line=variant_line,
+            vcf_header=vcf_header,
+            individual_ids=['grandmother']
+        )
+
+def test_family_min_gq():
+    plugin = get_plugin()
+    assert plugin.get_family_value(
+        'min', variant_line=variant_line, vcf_header=vcf_header) == 30
+
+def test_family_max_dp():
+    plugin = get_plugin(gt_key='DP')
+    assert plugin.get_family_value(
+        'max',
+        variant_line=variant_line,
+        vcf_header=vcf_header,
+        individual_ids=['father', 'mother']
+    ) == 11
+
+def test_family_non_ref():
+    plugin = get_plugin(gt_key='GT', data_type='string')
+    assert plugin.get_family_value(
+        'non_ref', variant_line=variant_line, vcf_header=vcf_header) == 2
+
+def test_family_rule_skips_missing():
+    """Test that individuals without a number are skipped"""
+    plugin = get_plugin(gt_key='PL')
+    assert plugin.get_family_value(
+        'min', variant_line=variant_line, vcf_header=vcf_header) is None
+
+def test_unknown_family_rule():
+    plugin = get_plugin()
+    with pytest.raises(ValueError):
+        plugin.get_family_value(
+            'median', variant_line=variant_line, vcf_header=vcf_header)
@@ -317,3 +317,47 @@ def test_rank_models():
 
     assert dict_entry == 'AD'
     assert line_entry == 'AD'
+
+def test_new_record_rules():
+    """Test the record rules that fold all values"""
+    info = "1000GAF=0.1,0.3,.,0.2;AC=2;AF=1.00;AN=2"
+    variant_line = get_variant_line(info=info)
+    variant_dict = get_variant_dict(info=info)
+    
+    expected = {
+        'first': 0.1,
+        'sum': 0.1 + 0.3 + 0.2,
+        'mean': (0.1 + 0.3 + 0.2) / 3,
+        'count': 3,
+        'any': True,
+    }
+    for record_rule in expected:
+        plugin = Plugin(
+            name='thousand_g',
+            field='INFO',
+            info_key="1000GAF",
+            separators=[','],
+            data_type='float',
+            record_rule=record_rule,
+            )
+        assert plugin.get_value(variant_line=variant_line) == expected[record_rule]
+        assert plugin.get_value(variant_dict=variant_dict) == expected[record_rule]
+
+def test_upper_bound():
+    """Test that a bounded record rule gives the same value"""
+    info = "1000GAF=0.5,1.0,0.7,.;AC=2;AF=1.00;AN=2"
+    variant_line = get_variant_line(info=info)
+    variant_dict = get_variant_dict(info=info)
+    
+    plugin = Plugin(
+        name='thousand_g',
+        field='INFO',
+        info_key="1000GAF",
+        separators=[','],
+        data_type='float',
+        record_rule='max',
+        upper_bound=1.0
+        )
+    
+    assert plugin.get_value(variant_line=variant_line) == 1.0
+    assert plugin.get_value(variant_dict=variant_dict) == 1.0
@@ -0,0 +1,38 @@
+from extract_vcf import HeaderParser
+from extract_vcf.header_parser import parse_structured_line
+
+import logging
+
+def test_parse_structured_line():
+    line = ('##INFO=<ID=AF,Number=A,Type=Float,Source="gnomAD",Version=2,'
+            'Description="Allele \\"frequency\\", from gnomAD">')
+    assert parse_structured_line(line) == {
+        'ID': 'AF', 'Number': 'A', 'Type': 'Float', 'Source': 'gnomAD',
+        'Version': '2', 'Description': 'Allele "frequency", from gnomAD'}
+    assert parse_structured_line('##INFO=<ID=AF,Number=1') is None
+
+def test_parse_info_and_contig_lines():
+    header = HeaderParser()
+    for line in [
+        '##INFO=<ID=AF,Number=A,Type=Float,Source="gnomAD",'
+        'Description="Allele \\"frequency\\"">',
+        '##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence '
+        'annotations from VEP. Format: Allele|Gene|SIFT">',
+        '##contig=<ID=1,assembly=b37,length=249250621>',
+        '##contig=<ID=MT>',
+    ]:
+        header.parse_line(line)
+    assert header.info_dict['AF'] == {
+        'Number': 'A', 'Type': 'Float', 'Description': 'Allele "frequency"'}
+    assert header.csq_format == ['Allele', 'Gene', 'SIFT']
+    assert header.contig_dict == {'1': '249250621', 'MT': None}
+
+def test_malformed_lines_skipped(caplog):
+    header = HeaderParser()
+    with caplog.at_level(logging.WARNING):
+        header.parse_line('##INFO=<ID=AF,Description="No number or type">')
+        header.parse_line('##contig=<length=100>')
+        header.parse_line('##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">')
+    assert list(header.info_dict) == ['DP']
+    assert header.contig_dict == {}
+    assert caplog.text.count('Skipping a malformed') == 2
@@ -0,0 +1,55 @@
+from extract_vcf import Engine
+from extract_vcf.parallel import extract_parallel
+
+import pytest
+
+FILTERS = ('PASS', 'LowQual')
+INFO = '1000G={frequency},0.5'
+RECORD_RULES = {'1000G': 'min'}
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_same_as_engine(mode, make_plugins, make_vcf_lines):
+    """Test that the pool gives the same values, in order, as the engine"""
+    lines = make_vcf_lines(100, filters=FILTERS, info=INFO)
+    plugins = make_plugins(('1000G', 'Filter'), RECORD_RULES)
+    
+    result = list(extract_parallel(
+        lines, plugins, workers=3, mode=mode, chunk_size=7))
+    
+    assert result == list(Engine(plugins).extract_rows(lines))
+
+def test_filter(tmpdir, make_plugins, make_vcf_lines):
+    """Test to run threads with a filter on a vcf file"""
+    path = str(tmpdir.join('test.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(make_vcf_lines(20, filters=FILTERS, info=INFO))
+    
+    result = list(extract_parallel(
+        path, make_plugins(('1000G', 'Filter'), RECORD_RULES),
+        filters="Filter == PASS", workers=2, chunk_size=3))
+    
+    assert len(result) == 10
+
+def test_unknown_mode(make_plugins, make_vcf_lines):
+    """Test that an unknown mode raises an error"""
+    with pytest.raises(ValueError):
+        list(extract_parallel(make_vcf_lines(filters=FILTERS, info=INFO),
+                              make_plugins(('1000G', 'Filter'), RECORD_RULES),
+                              mode='fiber'))
+
+@pytest.mark.parametrize('mode', ['thread', 'process'])
+def test_number_one_header(mode, make_plugins, make_vcf_lines):
+    """Test that the workers use the INFO lines like the serial engine"""
+    lines = make_vcf_lines(30, filters=FILTERS, info=INFO)
+    lines.insert(1, '##INFO=<ID=1000G,Number=1,Type=Float,'
+                    'Description="Frequency">\n')
+    # Lists, a malformed and a single value under a Number=1 header
+    lines[6] = lines[6].replace('1000G=0.03,0.5', '1000G=abc')
+    lines[7] = lines[7].replace('1000G=0.04,0.5', '1000G=0.04')
+    plugins = make_plugins(('1000G', 'Filter'), RECORD_RULES)
+    
+    result = list(extract_parallel(
+        lines, plugins, workers=2, mode=mode, chunk_size=4))
+    
+    assert result == list(Engine(plugins).extract_rows(lines))
+    assert [row[2] for row in result[2:6]] == [0.02, None, 0.04, 0.05]
@@ -0,0 +1,50 @@
+from extract_vcf import Engine, Pipeline
+
+import gzip
+
+import pytest
+
+def test_same_as_engine(make_plugins, make_vcf_lines):
+    """Test that the pipeline gives the same values as the engine"""
+    lines = make_vcf_lines(50)
+    batches = []
+    pipeline = Pipeline(make_plugins(), chunk_size=7, queue_size=1)
+    report = pipeline.run(lines, batches.append)
+    
+    assert [values for batch in batches for variant, values in batch] == [
+        values for variant, values in Engine(make_plugins()).extract(lines)]
+    assert report['variants'] == 50
+    assert report['stages']['reader']['chunks'] == 8
+    assert report['stages']['writer']['chunks'] == 8
+    assert report['queues']['lines']['max'] <= 1
+    assert report['bottleneck'] in ['reader', 'extraction', 'writer']
+    for name in report['stages']:
+        assert 0 <= report['stages'][name]['occupancy'] <= 1
+
+def test_gzipped_file_with_filter(tmpdir, make_plugins, make_vcf_lines):
+    """Test to run the pipeline on a gzipped file with a filter"""
+    path = str(tmpdir.join('test.vcf.gz'))
+    with gzip.open(path, 'wt') as vcf_file:
+        vcf_file.writelines(make_vcf_lines(20))
+    variants = []
+    pipeline = Pipeline(make_plugins(), filters="1000G < 0.05", chunk_size=4)
+    report = pipeline.run(path, variants.extend)
+    
+    assert len(variants) == 5
+    assert report['passed_variants'] == 5
+
+def test_writer_error(make_plugins, make_vcf_lines):
+    """Test that an error in the writer stops the pipeline"""
+    def write(batch):
+        raise IOError("Disk full")
+    pipeline = Pipeline(make_plugins(), chunk_size=2, queue_size=1)
+    
+    with pytest.raises(IOError):
+        pipeline.run(make_vcf_lines(100), write)
+
+def test_wrong_sizes(make_plugins):
+    """Test that chunk and queue sizes must be positive"""
+    with pytest.raises(ValueError):
+        Pipeline(make_plugins(), chunk_size=0)
+    with pytest.raises(ValueError):
+        Pipeline(make_plugins(), queue_size=0)
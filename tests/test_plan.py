@@ -0,0 +1,82 @@
+from extract_vcf import Engine, ConfigParser
+from extract_vcf.plan import ExtractionPlan, init_worker, run_worker_chunk
+from extract_vcf.reader import read_header
+
+import pickle
+
+PLUGIN_NAMES = ('1000G', 'SIFT')
+
+vcf_lines = [
+    '##fileformat=VCFv4.1\n',
+    '##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence type as '\
+    'predicted by VEP. Format: Allele|Gene|Consequence|SIFT">\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    '1\t879537\t.\tT\tC\t100\tPASS\t1000G=0.02;CSQ=C|ADK|missense|0.1\n',
+    '1\t879538\t.\tT\tA\t100\tLowQual\t1000G=0.001;CSQ=A|ADK|missense|0.05\n',
+]
+
+def get_plan(plugins, **kwargs):
+    """Return a plan with the header of vcf_lines"""
+    header, variant_lines = read_header(vcf_lines)
+    return ExtractionPlan(plugins, vcf_header=header.header,
+                          csq_format=header.csq_format,
+                          info_dict=header.info_dict, **kwargs)
+
+def test_read_header():
+    """Test that the header is parsed and the variant lines are kept"""
+    header, variant_lines = read_header(vcf_lines)
+    
+    assert header.csq_format == ['Allele', 'Gene', 'Consequence', 'SIFT']
+    assert list(variant_lines) == vcf_lines[3:]
+
+def test_run_chunk(make_plugins):
+    """Test that the columns have the same values as the engine"""
+    plan = get_plan(make_plugins(PLUGIN_NAMES), filters="1000G < 0.01")
+    columns = plan.run_chunk(vcf_lines[3:])
+    
+    assert plan.row_fields == ('CHROM', 'POS', '1000G', 'SIFT')
+    assert list(zip(*columns)) == list(
+        Engine(make_plugins(PLUGIN_NAMES),
+               filters="1000G < 0.01").extract_rows(vcf_lines))
+
+def test_pickle(make_plugins):
+    """Test that an unpickled plan gives the same values"""
+    plan = get_plan(make_plugins(PLUGIN_NAMES))
+    unpickled = pickle.loads(pickle.dumps(plan))
+    
+    assert unpickled.row_fields == plan.row_fields
+    assert unpickled.plugins['1000G'].category == 'allele_frequencies'
+    assert unpickled.info_dict == plan.info_dict
+    assert 'CSQ' in unpickled.get_engine().header.info_dict
+    assert unpickled.run_chunk(vcf_lines[3:]) == plan.run_chunk(vcf_lines[3:])
+
+def test_worker(make_plugins):
+    """Test to run a chunk with the plan of the worker"""
+    init_worker(pickle.loads(pickle.dumps(get_plan(make_plugins(PLUGIN_NAMES)))))
+    
+    columns = run_worker_chunk(vcf_lines[3:])
+    
+    assert columns[2] == [0.02, 0.001]
+    assert columns[3] == [0.1, 0.05]
+
+def test_from_config(tmpdir):
+    """Test that a plan is smaller than the config it is compiled from"""
+    config_lines = [
+        "[Version]\n",
+        "  name = example\n",
+        "  version = 0.1\n",
+        "[1000G]\n",
+        "  field = INFO\n",
+        "  info_key = 1000G\n",
+        "  data_type = float\n",
+        "  record_rule = max\n",
+        "  separators = ','\n",
+    ]
+    path = str(tmpdir.join('config.ini'))
+    with open(path, 'w') as config_file:
+        config_file.writelines(config_lines)
+    config = ConfigParser(path)
+    plan = ExtractionPlan.from_config(config)
+    
+    assert pickle.loads(pickle.dumps(plan)).plugin_names == ('1000G',)
+    assert len(pickle.dumps(plan)) < len(pickle.dumps(config))
@@ -0,0 +1,80 @@
+from extract_vcf import Plugin
+from extract_vcf.plugin import FrozenDict
+
+import pickle
+
+import pytest
+
+def get_plugin():
+    """Return a string plugin"""
+    return Plugin(
+        name='Filter',
+        field='FILTER',
+        data_type='string',
+        separators=[';'],
+        record_rule='max',
+        string_rules={'PASS': 2, 'LowQual': 1}
+    )
+
+def test_plugin_can_not_be_changed():
+    """Test that the attributes of a plugin can not be set"""
+    plugin = get_plugin()
+    
+    with pytest.raises(AttributeError):
+        plugin.record_rule = 'min'
+    with pytest.raises(TypeError):
+        plugin.string_rules['PASS'] = 0
+    string_rules = plugin.string_rules
+    with pytest.raises(TypeError):
+        string_rules |= {'PASS': 0}
+    assert plugin.string_rules['PASS'] != 0
+    assert plugin.separators == (';',)
+
+def test_no_shared_defaults():
+    """Test that plugins do not share the default arguments"""
+    first = Plugin(name='first', field='QUAL')
+    second = Plugin(name='second', field='QUAL')
+    
+    assert first.separators == ()
+    assert first.string_rules == {}
+    with pytest.raises(TypeError):
+        first.string_rules['PASS'] = 1
+    assert second.string_rules == {}
+
+def test_arguments_are_copied():
+    """Test that changing the arguments does not change the plugin"""
+    separators = [';']
+    string_rules = {'PASS': 2}
+    plugin = Plugin(name='Filter', field='FILTER', data_type='string',
+                    separators=separators, record_rule='max',
+                    string_rules=string_rules)
+    separators.append(',')
+    string_rules['LowQual'] = 3
+    
+    assert plugin.separators == (';',)
+    assert plugin.string_rules == {'PASS': 2}
+
+def test_pickle():
+    """Test that a plugin can be sent to another process"""
+    plugin = pickle.loads(pickle.dumps(get_plugin()))
+    
+    assert isinstance(plugin.string_rules, FrozenDict)
+    variant_line = '1\t1\t.\tA\tC\t10\tLowQual;PASS\t.'
+    assert plugin.get_value(variant_line=variant_line) == 'PASS'
+
+def test_slots():
+    """Test that plugins keep their attributes in slots"""
+    plugin = get_plugin()
+    
+    assert not hasattr(plugin, '__dict__')
+    assert plugin.sorted_strings == (('PASS', 'pass'), ('LowQual', 'lowqual'))
+
+def test_no_rule_without_values():
+    """Test that a plugin without record rule returns None for no values"""
+    plugin = Plugin(name='SIFT', field='INFO', info_key='CSQ', csq_key='SIFT',
+                    data_type='float', separators=[','])
+    
+    assert plugin.get_typed_value(
+        raw_entry='C|0.1', csq_format=['Allele', 'SIFT'], csq_entries=[]) is None
+    assert plugin.get_typed_value(
+        raw_entry='C|0.1', csq_format=['Allele', 'SIFT']) == 0.1
@@ -0,0 +1,81 @@
+from extract_vcf.reducers import get_reducer
+
+import pytest
+
+def reduce_values(record_rule, values):
+    """Add values to a reducer and return the reduced value"""
+    reducer = get_reducer(record_rule)
+    for value in values:
+        reducer.add(value)
+    return reducer.value
+
+def test_min_max():
+    """Test the min and max reducers"""
+    assert reduce_values('min', [3, 1, 2]) == 1
+    assert reduce_values('max', [3, 1, 2]) == 3
+
+def test_min_max_skip_nan():
+    """Test that NaN does not depend on the order of the values"""
+    nan = float('nan')
+    for values in [[nan, 1, 2], [1, nan, 2], [1, 2, nan]]:
+        assert reduce_values('min', values) == 1
+        assert reduce_values('max', values) == 2
+    assert reduce_values('max', [nan]) is None
+
+def test_first():
+    """Test the first reducer"""
+    assert reduce_values('first', [3, 1, 2]) == 3
+
+def test_sum_mean():
+    """Test the sum and mean reducers"""
+    assert reduce_values('sum', [3, 1, 2]) == 6
+    assert reduce_values('mean', [3, 1, 2]) == 2.0
+
+def test_count():
+    """Test the count reducer"""
+    assert reduce_values('count', [3, 1, 2]) == 3
+    assert reduce_values('count', []) == 0
+
+def test_any():
+    """Test the any reducer"""
+    assert reduce_values('any', [0, 0, 2]) == True
+    assert reduce_values('any', [0, 0.0]) == False
+
+def test_no_values():
+    """Test that reducers without values returns None"""
+    for record_rule in ['min', 'max', 'first', 'sum', 'mean', 'any']:
+        assert reduce_values(record_rule, []) == None
+
+def test_unknown_rule():
+    """Test that a unknown record rule raises exception"""
+    with pytest.raises(ValueError):
+        get_reducer('medium')
+
+def test_max_upper_bound():
+    """Test that a max reducer is done when the upper bound is reached"""
+    reducer = get_reducer('max', upper_bound=1.0)
+    reducer.add(0.5)
+    assert reducer.done == False
+    reducer.add(1.0)
+    assert reducer.done == True
+    assert reducer.value == 1.0
+
+def test_min_lower_bound():
+    """Test that a min reducer is done when the lower bound is reached"""
+    reducer = get_reducer('min', lower_bound=0)
+    reducer.add(3)
+    assert reducer.done == False
+    reducer.add(0)
+    assert reducer.done == True
+
+def test_first_and_any_done():
+    """Test that first and any are done without bounds"""
+    reducer = get_reducer('first')
+    reducer.add(2)
+    assert reducer.done == True
+    
+    reducer = get_reducer('any')
+    reducer.add(0)
+    assert reducer.done == False
+    reducer.add(1)
+    assert reducer.done == True
@@ -0,0 +1,95 @@
+from extract_vcf import ReloadableConfig
+from validate import ValidateError
+
+import time
+
+import pytest
+
+config_lines = [
+    "[Version]\n",
+    "  name = example\n",
+    "  version = {version}\n",
+    "[1000G]\n",
+    "  field = INFO\n",
+    "  info_key = 1000G\n",
+    "  data_type = float\n",
+    "  separators = ','\n",
+    "  record_rule = {record_rule}\n",
+]
+
+vcf_lines = [
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    '1\t879537\t.\tT\tC\t100\tPASS\t1000G=0.02,0.5\n',
+    '1\t879538\t.\tT\tA\t100\tPASS\t1000G=0.001,0.3\n',
+]
+
+def write_config(path, version='0.1', record_rule='max', lines=config_lines):
+    """Write a config file"""
+    with open(path, 'w') as config_file:
+        for line in lines:
+            config_file.write(line.format(version=version, record_rule=record_rule))
+
+def test_check_reloads(tmpdir):
+    """Test that a changed config file is reloaded"""
+    path = str(tmpdir.join('config.ini'))
+    write_config(path)
+    holder = ReloadableConfig(path)
+    
+    assert holder.get().generation == 1
+    assert holder.check() == False
+    
+    write_config(path, version='0.25', record_rule='min')
+    assert holder.check() == True
+    
+    snapshot = holder.get()
+    assert snapshot.generation == 2
+    assert snapshot.version == 0.25
+    assert snapshot.plugins['1000G'].record_rule == 'min'
+
+def test_invalid_config_kept(tmpdir):
+    """Test that a config that fails validation does not replace the old"""
+    path = str(tmpdir.join('config.ini'))
+    write_config(path)
+    holder = ReloadableConfig(path)
+    
+    write_config(path, record_rule='medium')
+    assert holder.check() == False
+    assert holder.failed_reloads == 1
+    assert holder.get().generation == 1
+
+def test_invalid_first_config(tmpdir):
+    """Test that the first config has to be valid"""
+    path = str(tmpdir.join('config.ini'))
+    write_config(path, record_rule='medium')
+    with pytest.raises(ValidateError):
+        ReloadableConfig(path)
+
+def test_extract_reports_snapshot(tmpdir):
+    """Test that a reload takes effect from the next variant"""
+    path = str(tmpdir.join('config.ini'))
+    write_config(path)
+    holder = ReloadableConfig(path)
+    
+    results = holder.extract(vcf_lines)
+    first_variant, first_values, first_snapshot = next(results)
+    
+    write_config(path, version='0.25', record_rule='min')
+    holder.check()
+    second_variant, second_values, second_snapshot = next(results)
+    
+    assert (first_values['1000G'], first_snapshot.version) == (0.5, 0.1)
+    assert (second_values['1000G'], second_snapshot.version) == (0.001, 0.25)
+
+def test_watcher_thread(tmpdir):
+    """Test that the watcher thread reloads the config"""
+    path = str(tmpdir.join('config.ini'))
+    write_config(path)
+    
+    with ReloadableConfig(path, interval=0.01) as holder:
+        write_config(path, version='0.25')
+        deadline = time.time() + 5
+        while holder.get().generation == 1 and time.time() < deadline:
+            time.sleep(0.01)
+    
+    assert holder.get().version == 0.25
+    assert holder.thread is None
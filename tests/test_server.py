@@ -0,0 +1,265 @@
+from extract_vcf.engine import Engine
+from extract_vcf.server import (ExtractionService, ExtractionServer,
+    LatencyStats, to_json)
+
+import json
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+try:
+    from urllib.request import urlopen, Request
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, Request, HTTPError
+
+config_lines = [
+    "[Version]\n",
+    "  name = example\n",
+    "  version = 0.1\n",
+    "[1000G]\n",
+    "  field = INFO\n",
+    "  info_key = 1000G\n",
+    "  data_type = float\n",
+    "  separators = ','\n",
+    "  record_rule = max\n",
+]
+
+vcf_header = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+
+def get_request(frequency):
+    """Return a request for a variant with a 1000G frequency"""
+    return {
+        'config': 'example',
+        'variant_line': "1\t879537\t.\tT\tC\t100\tPASS\t1000G={0}".format(frequency),
+        'vcf_header': vcf_header,
+    }
+
+@pytest.fixture
+def config_file(tmpdir):
+    path = str(tmpdir.join('config.ini'))
+    with open(path, 'w') as config:
+        config.writelines(config_lines)
+    return path
+
+def test_latency_stats():
+    """Test the latency percentiles"""
+    stats = LatencyStats()
+    assert stats.percentiles()['p50'] == None
+    for latency in range(1, 101):
+        stats.add(latency)
+    
+    assert stats.percentiles() == {'p50': 50, 'p90': 90, 'p99': 99}
+
+def test_to_json():
+    """Test that NaN values are replaced by None"""
+    assert to_json({'values': {'AF': float('nan'), 'AC': 2}, 'rows': [
+        (1.0, float('nan'))]}) == {'values': {'AF': None, 'AC': 2},
+                                    'rows': [[1.0, None]]}
+
+def test_batched_requests(config_file):
+    """Test that concurrent requests are batched"""
+    service = ExtractionService(
+        {'example': config_file}, max_delay=0.05, reload_interval=None)
+    try:
+        futures = [service.submit(get_request(i / 100.0)) for i in range(20)]
+        results = [future.result(5) for future in futures]
+    finally:
+        service.close()
+    
+    assert [result['values']['1000G'] for result in results] == [
+        i / 100.0 for i in range(20)]
+    assert results[0]['config_version'] == 0.1
+    assert results[0]['generation'] == 1
+    assert service.batch_count < 20
+    assert service.stats()['requests'] == 20
+
+def test_unknown_config(config_file):
+    """Test that a request for an unknown config fails"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    try:
+        request = get_request(0.1)
+        request['config'] = 'other'
+        with pytest.raises(KeyError):
+            service.extract(request, 5)
+    finally:
+        service.close()
+
+def test_process_pool(config_file):
+    """Test that batches can be run in worker processes"""
+    service = ExtractionService(
+        {'example': config_file}, processes=1, reload_interval=None)
+    try:
+        result = service.extract(get_request(0.25), 30)
+    finally:
+        service.close()
+    
+    assert result['values'] == {'1000G': 0.25}
+
+def test_process_pool_uses_snapshot(config_file):
+    """Test that the workers do not read a changed config file"""
+    service = ExtractionService(
+        {'example': config_file}, processes=1, reload_interval=None)
+    try:
+        with open(config_file, 'w') as config:
+            config.writelines(config_lines[:-1] + ["  record_rule = min\n"])
+        request = get_request('0.25,0.5')
+        result = service.extract(request, 30)
+    finally:
+        service.close()
+    
+    assert result['values'] == {'1000G': 0.5}
+
+def test_broken_pool(config_file):
+    """Test that a failing pool fails the batch and not the batcher"""
+    service = ExtractionService(
+        {'example': config_file}, processes=1, reload_interval=None)
+    pool = service.pool
+    class BrokenPool(object):
+        def submit(self, *args):
+            raise RuntimeError("Broken pool")
+        def shutdown(self):
+            pool.shutdown()
+    service.pool = BrokenPool()
+    try:
+        with pytest.raises(RuntimeError):
+            service.extract(get_request(0.25), 5)
+        assert service.batcher.is_alive()
+        service.pool = pool
+        assert service.extract(get_request(0.25), 30)['values'] == {
+            '1000G': 0.25}
+    finally:
+        service.close()
+
+def test_close_fails_queued_requests(config_file):
+    """Test that requests that were never run get an exception"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    # Stop the batcher so that the request stays in the queue
+    service.running = False
+    service.batcher.join()
+    future = Future()
+    service.requests.put((0, get_request(0.25), future))
+    service.close()
+    
+    with pytest.raises(RuntimeError):
+        future.result(1)
+    with pytest.raises(RuntimeError):
+        service.extract(get_request(0.25), 1)
+
+def test_http(config_file):
+    """Test to extract a variant over http"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    server = ExtractionServer(service)
+    server.start()
+    try:
+        url = "http://{0}:{1}".format(server.host, server.port)
+        request = Request(
+            url + '/extract',
+            data=json.dumps(get_request(0.3)).encode('utf-8'),
+            headers={'Content-Type': 'application/json'}
+        )
+        result = json.loads(urlopen(request, timeout=5).read().decode('utf-8'))
+        stats = json.loads(urlopen(url + '/stats', timeout=5).read().decode('utf-8'))
+    finally:
+        server.close()
+    
+    assert result['values'] == {'1000G': 0.3}
+    assert stats['requests'] == 1
+    assert stats['latency']['p50'] is not None
+
+def post(server, request):
+    """Post a request and return the status and the json response"""
+    url = "http://{0}:{1}/extract".format(server.host, server.port)
+    request = Request(url, data=json.dumps(request).encode('utf-8'),
+                      headers={'Content-Type': 'application/json'})
+    try:
+        response = urlopen(request, timeout=5)
+    except HTTPError as error:
+        return error.code, json.loads(error.read().decode('utf-8'))
+    return response.getcode(), json.loads(response.read().decode('utf-8'))
+
+def test_http_errors(config_file, monkeypatch):
+    """Test that a bad request gives 400 and a failing engine 500"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    server = ExtractionServer(service)
+    server.start()
+    try:
+        request = get_request(0.3)
+        request['config'] = 'other'
+        assert post(server, request)[0] == 400
+        
+        def failing_get_values(self, *args, **kwargs):
+            raise RuntimeError("Engine failed")
+        monkeypatch.setattr(Engine, 'get_values', failing_get_values)
+        status, result = post(server, get_request(0.3))
+    finally:
+        server.close()
+    
+    assert status == 500
+    assert result == {'error': 'Engine failed'}
+
+def test_http_nan(config_file, monkeypatch):
+    """Test that NaN values are sent as null"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    server = ExtractionServer(service)
+    server.start()
+    monkeypatch.setattr(Engine, 'get_values',
+                        lambda self, *args, **kwargs: {'1000G': float('nan')})
+    try:
+        status, result = post(server, get_request(0.3))
+    finally:
+        server.close()
+    
+    assert status == 200
+    assert result['values'] == {'1000G': None}
+
+def test_engine_kept_between_batches(config_file):
+    """Test that batches of a config generation share the engine"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    try:
+        service.extract(get_request(0.1), 5)
+        plans = dict(service.plans)
+        assert service.extract(get_request(0.2), 5)['values'] == {'1000G': 0.2}
+    finally:
+        service.close()
+    
+    assert len(plans) == 1
+    assert all(service.plans[key] is plans[key] for key in plans)
+
+def test_process_pool_plan_sent_once(config_file):
+    """Test that the plan is sent to a worker once per config generation"""
+    service = ExtractionService(
+        {'example': config_file}, processes=1, reload_interval=None)
+    pool = service.pool
+    sent = []
+    class CountingPool(object):
+        def submit(self, function, *args):
+            sent.append(len(args) == 3)
+            return pool.submit(function, *args)
+        def shutdown(self):
+            pool.shutdown()
+    service.pool = CountingPool()
+    try:
+        results = [service.extract(get_request(i / 10.0), 30) for i in range(3)]
+    finally:
+        service.close()
+    
+    assert [result['values'] for result in results] == [
+        {'1000G': 0.0}, {'1000G': 0.1}, {'1000G': 0.2}]
+    # The first batch misses the plan and is sent again with it
+    assert sent == [False, True, False, False]
+
+def test_submit_while_closing(config_file):
+    """Test that every submitted request is done after close"""
+    service = ExtractionService({'example': config_file}, reload_interval=None)
+    futures = []
+    def submit():
+        for i in range(200):
+            futures.append(service.submit(get_request(0.1)))
+    thread = threading.Thread(target=submit)
+    thread.start()
+    service.close()
+    thread.join()
+    
+    assert all(future.done() for future in futures)
@@ -0,0 +1,92 @@
+from extract_vcf import Engine, HeaderParser
+from extract_vcf.shards import Shard, ShardedExtractor, get_shards, iter_shard_lines
+
+import pytest
+
+vcf_lines = [
+    '##fileformat=VCFv4.1\n',
+    '##contig=<ID=1,length=1000>\n',
+    '##contig=<ID=2,length=500>\n',
+    '##contig=<ID=X,length=100>\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+    '1\t10\t.\tT\tC\t100\tPASS\t1000G=0.1\n',
+    '1\t400\t.\tT\tC\t100\tPASS\t1000G=0.2\n',
+    '1\t401\t.\tT\tC\t100\tPASS\t1000G=0.3\n',
+    '1\t999\t.\tT\tC\t100\tPASS\t1000G=0.4\n',
+    '2\t5\t.\tT\tC\t100\tLowQual\t1000G=0.5\n',
+    'X\t50\t.\tT\tC\t100\tPASS\t1000G=0.6\n',
+    'X\t150\t.\tT\tC\t100\tPASS\t1000G=0.7\n',
+]
+
+def get_header():
+    """Return the parsed header of vcf_lines"""
+    header = HeaderParser()
+    for line in vcf_lines:
+        if line.startswith('#'):
+            header.parse_line(line)
+    return header
+
+@pytest.fixture
+def vcf_path(tmpdir):
+    path = str(tmpdir.join('test.vcf'))
+    with open(path, 'w') as vcf_file:
+        vcf_file.writelines(vcf_lines)
+    return path
+
+def test_get_shards():
+    """Test that long contigs are split in regions"""
+    shards = get_shards(get_header(), shard_length=400)
+    
+    assert [shard.region for shard in shards] == [
+        '1:1-400', '1:401-800', '1:801-', '2:1-400', '2:401-', 'X']
+    assert [shard.index for shard in shards] == list(range(6))
+
+def test_get_shards_without_length():
+    """Test that contigs without a length get one open shard"""
+    header = HeaderParser()
+    for line in ['##contig=<ID=1,length=0>', '##contig=<ID=2>',
+                 '##contig=<ID=3,length=-1>',
+                 '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO']:
+        header.parse_line(line)
+    shards = get_shards(header, shard_length=400)
+    
+    assert [shard.region for shard in shards] == ['1', '2', '3']
+    assert shards[0].contains('1', 10)
+
+def test_get_shards_no_contigs():
+    """Test that a header without contigs can not be sharded"""
+    with pytest.raises(ValueError):
+        get_shards(HeaderParser())
+
+def test_iter_shard_lines(vcf_path):
+    """Test that a shard only has the variants in its region"""
+    lines = list(iter_shard_lines(vcf_path, Shard(0, '1', 401, 800)))
+    
+    assert lines == [vcf_lines[7]]
+    assert len(list(iter_shard_lines(vcf_path, Shard(0, 'X')))) == 2
+
+def test_extract(vcf_path, caplog, make_plugins):
+    """Test that the merged rows are the same as from the engine"""
+    finished = []
+    extractor = ShardedExtractor(
+        make_plugins(), workers=2, shard_length=400,
+        progress=lambda shard, stats: finished.append(shard.region))
+    rows = list(extractor.extract(vcf_path))
+    # Without an index each shard scans the file
+    assert 'scans the file' in caplog.text
+    
+    assert rows == list(Engine(make_plugins()).extract_rows(vcf_lines))
+    assert sorted(finished) == sorted(
+        ['1:1-400', '1:401-800', '1:801-', '2:1-400', '2:401-', 'X'])
+    report = extractor.report()
+    assert report['variants'] == 7
+    assert report['shards'][0]['variants'] == 2
+    assert all(shard['done'] for shard in report['shards'])
+
+def test_extract_with_filter(vcf_path, make_plugins):
+    """Test to extract some contigs with a filter"""
+    extractor = ShardedExtractor(
+        make_plugins(), filters="1000G > 0.25", workers=1, contigs=['1', '2'])
+    rows = list(extractor.extract(vcf_path))
+    
+    assert [row[2] for row in rows] == [0.3, 0.4, 0.5]
@@ -0,0 +1,75 @@
+from extract_vcf import Engine
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from extract_vcf.shared_buffers import extract_shared
+
+PLUGIN_NAMES = ('1000G', 'MQ', 'DB', 'Filter', 'FilterText')
+
+header_lines = [
+    '##fileformat=VCFv4.1\n',
+    '#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n',
+]
+
+def get_vcf_lines(variants=10):
+    """Return vcf lines with a number of variants"""
+    lines = list(header_lines)
+    for i in range(variants):
+        info = 'MQ={0};1000G={1}'.format(i, i / 100.0)
+        if i % 3 == 0:
+            info = 'MQ={0};DB'.format(i)
+        lines.append('{0}\t{1}\t.\tT\tC\t100\t{2}\t{3}\n'.format(
+            ['1', '2', 'X'][i % 3 // 2], 1000 + i,
+            ['PASS', 'LowQual', 'q10'][i % 3], info))
+    return lines
+
+def test_same_values_as_engine(make_plugins):
+    """Test that the columns have the same values as the engine"""
+    lines = get_vcf_lines(50)
+    chunks = list(extract_shared(lines, make_plugins(PLUGIN_NAMES), workers=2,
+                                 chunk_size=8))
+    rows = list(Engine(make_plugins(PLUGIN_NAMES)).extract_rows(lines))
+    
+    assert [chunk.size for chunk in chunks] == [8, 8, 8, 8, 8, 8, 2]
+    assert sum(chunk.size for chunk in chunks) == len(rows)
+    
+    chrom = [value for chunk in chunks for value in chunk.get_strings('CHROM')]
+    assert chrom == [row[0] for row in rows]
+    pos = np.concatenate([chunk.columns['POS'] for chunk in chunks])
+    assert pos.tolist() == [int(row[1]) for row in rows]
+    
+    engine = Engine(make_plugins(PLUGIN_NAMES))
+    expected = {name: [] for name in engine.plugin_names}
+    for row in rows:
+        for name, value in zip(engine.row_fields[2:], row[2:]):
+            expected[name].append(value)
+    
+    frequencies = np.concatenate([chunk.columns['1000G'] for chunk in chunks])
+    assert [None if np.isnan(value) else value
+            for value in frequencies.tolist()] == expected['1000G']
+    mq = np.concatenate([chunk.columns['MQ'] for chunk in chunks])
+    assert mq.tolist() == expected['MQ']
+    db = np.concatenate([chunk.columns['DB'] for chunk in chunks])
+    assert db.tolist() == [bool(value) for value in expected['DB']]
+    for name in ['Filter', 'FilterText']:
+        strings = [
+            value for chunk in chunks for value in chunk.get_strings(name)]
+        assert strings == expected[name]
+
+def test_fixed_strings(make_plugins):
+    """Test that the strings from the rules have fixed indexes"""
+    chunks = list(extract_shared(
+        get_vcf_lines(6), make_plugins(PLUGIN_NAMES), workers=1, chunk_size=3))
+    
+    assert chunks[0].string_tables['Filter'].strings == ['LowQual', 'PASS']
+    assert chunks[0].columns['Filter'].tolist() == [1, 0, -1]
+
+def test_filter(make_plugins):
+    """Test that only variants that pass the filter are written"""
+    chunks = list(extract_shared(
+        get_vcf_lines(30), make_plugins(PLUGIN_NAMES), filters="DB", workers=1))
+    
+    assert chunks[0].size == 10
+    assert chunks[0].columns['DB'].all()
@@ -0,0 +1,185 @@
+from extract_vcf import Plugin, get_variant_dict
+from extract_vcf.converters import Converter
+from extract_vcf.plan import ExtractionPlan
+
+import random
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from extract_vcf.vectorized import (can_vectorize, get_text, parse_numbers,
+    reduce_segments, get_vectorized_values)
+
+vcf_header = ['CHROM', 'POS', 'ID', 'REF', 'ALT', 'QUAL', 'FILTER', 'INFO']
+csq_format = ['Allele', 'Gene', 'SIFT']
+
+def get_plugins():
+    """Return a dictionary with plugins"""
+    return {
+        'AF': Plugin(
+            name='AF',
+            field='INFO',
+            info_key='AF',
+            data_type='float',
+            separators=[','],
+            record_rule='max'
+        ),
+        'AC': Plugin(
+            name='AC',
+            field='INFO',
+            info_key='AC',
+            data_type='integer',
+            separators=[',', '|'],
+            record_rule='min'
+        ),
+        'SIFT': Plugin(
+            name='SIFT',
+            field='INFO',
+            info_key='CSQ',
+            csq_key='SIFT',
+            data_type='float',
+            separators=[','],
+            record_rule='min'
+        ),
+        'DP': Plugin(
+            name='DP',
+            field='INFO',
+            info_key='DP',
+            data_type='integer',
+            separators=[','],
+            record_rule='mean'
+        ),
+    }
+
+def get_vcf_lines(variants=300, malformed=False):
+    """Return vcf variant lines with missing values"""
+    random.seed(variants)
+    numbers = ['.', '', '0.5', '0.25', '1e-3', '7']
+    integers = ['.', '', '3', '12', '-4']
+    if malformed:
+        numbers.append('abc')
+        integers.append('1.5')
+    lines = []
+    for i in range(variants):
+        info = [
+            'AF=' + ','.join(random.choice(numbers)
+                             for j in range(random.randint(1, 4))),
+            'AC=' + ','.join(random.choice(integers) + '|' +
+                             random.choice(integers) for j in range(2)),
+            'DP={0}'.format(i),
+            'CSQ=' + ','.join('C|ADK|' + random.choice(numbers)
+                              for j in range(random.randint(1, 3))),
+        ]
+        # Leave out some annotations
+        info = [entry for entry in info if random.random() > 0.2] or ['DB']
+        lines.append('1\t{0}\t.\tT\tC\t100\tPASS\t{1}\n'.format(
+            1000 + i, ';'.join(info)))
+    return lines
+
+def test_can_vectorize():
+    plugins = get_plugins()
+    assert can_vectorize(plugins['AF'])
+    assert can_vectorize(plugins['AC'])
+    assert can_vectorize(plugins['SIFT'], csq_format)
+    assert not can_vectorize(plugins['SIFT'])
+    assert not can_vectorize(plugins['DP'])
+
+def test_get_text():
+    plugin = get_plugins()['AC']
+    variant_dicts = [
+        {'info_dict': {'AC': '1|2,3'}},
+        {'info_dict': {}},
+        {'info_dict': {'AC': '.'}},
+    ]
+    texts, counts, separator = get_text(plugin, variant_dicts)
+    assert texts == ['1,2,3', '', '.']
+    assert counts == [3, 1, 1]
+    assert separator == ','
+
+def test_parse_numbers():
+    numbers = parse_numbers(['0.5,.,,2', '', '.', '3'], [4, 1, 1, 1], ',',
+                            'float')
+    assert numbers[0] == 0.5
+    assert numbers[3] == 2.0
+    assert numbers[6] == 3.0
+    assert np.isnan(numbers).tolist() == [
+        False, True, True, False, True, True, False]
+
+def test_parse_malformed_numbers():
+    converter = Converter(int)
+    numbers = parse_numbers(['3,abc', '.', '1.5'], [2, 1, 1], ',', 'integer',
+                            converter)
+    assert numbers[0] == 3
+    assert np.isnan(numbers).tolist() == [False, True, True, True]
+    assert converter.malformed == 2
+
+def test_reduce_segments():
+    numbers = np.array([1.0, 3.0, np.nan, 2.0, np.nan, 5.0])
+    assert reduce_segments(numbers, [2, 1, 3], 'max') == [3.0, None, 5.0]
+    assert reduce_segments(numbers, [2, 1, 3], 'min') == [1.0, None, 2.0]
+    assert reduce_segments(numbers, [2, 1, 3], 'min', 'integer') == [
+        1, None, 2]
+
+def test_can_not_vectorize_bound():
+    plugin = Plugin(name='AF', field='INFO', info_key='AF', data_type='float',
+                    separators=[','], record_rule='max', upper_bound=1)
+    assert not can_vectorize(plugin)
+
+@pytest.mark.parametrize('data_type', ['float', 'integer'])
+@pytest.mark.parametrize('record_rule', ['min', 'max'])
+def test_nan_and_long_integers(data_type, record_rule):
+    """Test values that numpy and python parse differently"""
+    plugin = Plugin(name='AC', field='INFO', info_key='AC',
+                    data_type=data_type, separators=[','],
+                    record_rule=record_rule)
+    variant_dicts = [{'info_dict': {'AC': text}} for text in [
+        'nan,2', '3,nan', 'nan', '-nan,.', '9007199254740993,1', '0x10']]
+    converters = [Converter(float if data_type == 'float' else int)
+                  for i in range(2)]
+    values = get_vectorized_values(plugin, variant_dicts,
+                                   converter=converters[0])
+    assert values == [
+        plugin.get_value(variant_dict=variant_dict, converter=converters[1])
+        for variant_dict in variant_dicts]
+    assert values[:4] == [2, 3, None, None]
+    assert converters[0].malformed == converters[1].malformed
+    if data_type == 'integer':
+        assert values[4] == (9007199254740993 if record_rule == 'max' else 1)
+
+def test_same_values_as_get_value():
+    plugins = get_plugins()
+    variant_dicts = [get_variant_dict(line, vcf_header)
+                     for line in get_vcf_lines(malformed=True)]
+    for name in ['AF', 'AC']:
+        plugin = plugins[name]
+        values = get_vectorized_values(plugin, variant_dicts)
+        assert values == [plugin.get_value(variant_dict=variant_dict)
+                          for variant_dict in variant_dicts]
+        assert [type(value) for value in values] == [
+            type(plugin.get_value(variant_dict=variant_dict))
+            for variant_dict in variant_dicts]
+
+@pytest.mark.parametrize('malformed', [False, True])
+def test_run_chunk_vectorized(malformed):
+    """Test that a vectorized plan gives the same columns and counts"""
+    lines = get_vcf_lines(malformed=malformed)
+    plans = [
+        ExtractionPlan(get_plugins(), filters='AF > 0.1',
+                       vcf_header=vcf_header, csq_format=csq_format,
+                       vectorize=vectorize)
+        for vectorize in [False, True]
+    ]
+    columns = [plan.run_chunk(lines) for plan in plans]
+    assert columns[0] == columns[1]
+    assert len(columns[0][0]) > 0
+    malformed_values = [plan.get_engine().malformed_values() for plan in plans]
+    assert malformed_values[0] == malformed_values[1]
+    assert bool(malformed_values[0]) == malformed
+    assert plans[1].local.vector_plugins
+
+def test_pickled_plan_keeps_vectorize():
+    import pickle
+    plan = ExtractionPlan(get_plugins(), vcf_header=vcf_header,
+                          csq_format=csq_format, vectorize=False)
+    assert pickle.loads(pickle.dumps(plan)).vectorize is False